@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+#
+# Benchmark for websocket masking.
+#
+# Compares the pure-Python fallback with the C extension (if
+# tornado.speedups has been built) for a range of payload sizes.
+
+from __future__ import print_function
+
+import os
+from timeit import Timer
+
+from tornado.options import options, define, parse_command_line
+from tornado.util import _websocket_mask_python, _websocket_mask_into_python
+
+try:
+    from tornado import speedups
+except ImportError:
+    speedups = None
+
+define('sizes', default='16,1024,65536,1048576', help='payload sizes in bytes')
+define('num', default=20, help='number of runs per test')
+
+
+def run(name, func, mask, data):
+    duration = min(Timer(lambda: func(mask, data)).repeat(3, options.num))
+    print('%-22s %10d bytes %10.1f us %8.1f MB/s' % (
+        name, len(data), duration * 1e6 / options.num,
+        len(data) * options.num / duration / 1e6))
+
+
+def main():
+    parse_command_line()
+    mask = os.urandom(4)
+    funcs = [('python', _websocket_mask_python, False),
+             ('python (into)', _websocket_mask_into_python, True)]
+    if speedups is not None:
+        funcs.append(('speedups', speedups.websocket_mask, False))
+        funcs.append(('speedups (into)', speedups.websocket_mask_into, True))
+    else:
+        print('tornado.speedups not available; only testing python version')
+    for size in options.sizes.split(','):
+        data = os.urandom(int(size))
+        for name, func, into in funcs:
+            run(name, func, mask, bytearray(data) if into else data)
+
+
+if __name__ == '__main__':
+    main()
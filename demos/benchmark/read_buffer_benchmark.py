@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+#
+# Benchmark for the IOStream read buffer.
+#
+# The stream used here never touches a socket: read_from_fd hands out
+# fixed-size chunks from memory, so all of the time is spent appending
+# to and consuming from the read buffer.  The buffer is replaced with a
+# bytearray subclass that counts every byte copied into it, moved
+# within it or copied out of it, which is reported per MB received.
+
+from __future__ import print_function
+
+import time
+
+from tornado.iostream import BaseIOStream
+from tornado.options import options, define, parse_command_line
+
+define('total_mb', default=64, help='MB of data fed through each test')
+define('chunk_size', default=65536, help='bytes returned by each "recv"')
+
+
+class CountingBuffer(bytearray):
+    copied = 0
+
+    def __iadd__(self, other):
+        CountingBuffer.copied += len(other)
+        return bytearray.__iadd__(self, other)
+
+    def __delitem__(self, key):
+        if isinstance(key, slice):
+            # Deleting a prefix moves everything after it.
+            CountingBuffer.copied += len(self) - (key.stop or 0)
+        bytearray.__delitem__(self, key)
+
+
+class MemoryStream(BaseIOStream):
+    def __init__(self, data, chunk_size):
+        super(MemoryStream, self).__init__(max_buffer_size=len(data) * 2)
+        self._read_buffer = CountingBuffer()
+        self._data = data
+        self._offset = 0
+        self._recv_size = chunk_size
+
+    def fileno(self):
+        return -1
+
+    def close_fd(self):
+        pass
+
+    def read_from_fd(self):
+        if self._offset >= len(self._data):
+            return None
+        chunk = self._data[self._offset:self._offset + self._recv_size]
+        self._offset += len(chunk)
+        return chunk
+
+    def _consume(self, loc):
+        CountingBuffer.copied += loc
+        return super(MemoryStream, self)._consume(loc)
+
+
+def one_big_read(stream, total):
+    stream.read_bytes(total).result()
+
+
+def partial_reads(stream, total):
+    while total:
+        total -= len(stream.read_bytes(min(total, 65536),
+                                       partial=True).result())
+
+
+def line_reads(stream, total):
+    for i in range(total // 100):
+        stream.read_until(b"\r\n").result()
+
+
+def header_reads(stream, total):
+    for i in range(total // 1000):
+        stream.read_until_regex(b"\r?\n\r?\n").result()
+
+
+def make_data(total, unit):
+    return unit * (total // len(unit))
+
+
+def run(name, func, data):
+    CountingBuffer.copied = 0
+    stream = MemoryStream(data, options.chunk_size)
+    start = time.time()
+    func(stream, len(data))
+    elapsed = time.time() - start
+    mb = len(data) / (1024.0 * 1024.0)
+    print('%-14s %8.1f MB/s  %8.2f MB copied per MB received' % (
+        name, mb / elapsed, CountingBuffer.copied / (1024.0 * 1024.0) / mb))
+
+
+def main():
+    parse_command_line()
+    total = options.total_mb * 1024 * 1024
+    run('read_bytes', one_big_read, make_data(total, b'a'))
+    run('partial', partial_reads, make_data(total, b'a'))
+    run('read_until', line_reads, make_data(total, b'a' * 98 + b'\r\n'))
+    run('regex', header_reads,
+        make_data(total, b'a' * 996 + b'\r\n\r\n'))
+
+
+if __name__ == '__main__':
+    main()
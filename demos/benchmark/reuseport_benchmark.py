@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#
+# Shows how new connections are spread across the worker processes of
+# a multi-process HTTPServer.
+#
+# By default all workers share the one listening socket that was bound
+# before the fork; with --reuse_port each worker binds its own
+# SO_REUSEPORT socket and the kernel balances accepts between them.
+# Every request uses a new connection, and the handler responds with
+# the task id of the worker that accepted it.
+#
+# demos/benchmark/reuseport_benchmark.py --processes=4
+# demos/benchmark/reuseport_benchmark.py --processes=4 --reuse_port
+
+from __future__ import print_function
+
+import collections
+import os
+import random
+import signal
+import time
+
+from tornado import gen
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.options import options, define, parse_command_line
+from tornado.process import task_id
+from tornado.simple_httpclient import SimpleAsyncHTTPClient
+from tornado.web import RequestHandler, Application
+
+# choose a random port to avoid colliding with TIME_WAIT sockets left over
+# from previous runs.
+define('min_port', type=int, default=8000)
+define('max_port', type=int, default=9000)
+
+define('processes', type=int, default=4, help='number of worker processes')
+define('reuse_port', type=bool, default=False,
+       help='give each worker its own SO_REUSEPORT socket')
+define('n', type=int, default=4000, help='number of connections')
+define('c', type=int, default=50, help='concurrent connections')
+
+
+class TaskIdHandler(RequestHandler):
+    def get(self):
+        self.write(str(task_id()))
+
+    def _log(self):
+        pass
+
+
+def run_server(port):
+    server = HTTPServer(Application([('/', TaskIdHandler)]))
+    server.bind(port, address='127.0.0.1', reuse_port=options.reuse_port)
+    server.start(options.processes)
+    IOLoop.current().start()
+
+
+@gen.coroutine
+def run_client(port):
+    url = 'http://127.0.0.1:%d/' % port
+    # max_idle_connections_per_host defaults to 0, so each request
+    # opens a new connection.
+    client = SimpleAsyncHTTPClient(force_instance=True, max_clients=options.c)
+    counts = collections.Counter()
+
+    # Wait for the workers to start listening.
+    deadline = time.time() + 10
+    while True:
+        try:
+            yield client.fetch(url)
+            break
+        except Exception:
+            if time.time() > deadline:
+                raise
+            yield gen.sleep(0.1)
+
+    start = time.time()
+    responses = yield [client.fetch(url) for i in range(options.n)]
+    duration = time.time() - start
+    for response in responses:
+        counts[int(response.body)] += 1
+    client.close()
+    raise gen.Return((counts, duration))
+
+
+def main():
+    parse_command_line()
+    port = random.randrange(options.min_port, options.max_port)
+    pid = os.fork()
+    if pid == 0:
+        # Put the server processes in their own group so they can all
+        # be killed at once.
+        os.setpgid(0, 0)
+        run_server(port)
+        os._exit(0)
+    os.setpgid(pid, pid)
+    try:
+        counts, duration = IOLoop.current().run_sync(
+            lambda: run_client(port), timeout=300)
+    finally:
+        os.killpg(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+    mode = 'SO_REUSEPORT' if options.reuse_port else 'shared socket'
+    print('%s: %d connections in %.2fs (%.0f/s)' % (
+        mode, options.n, duration, options.n / duration))
+    for worker in range(options.processes):
+        count = counts[worker]
+        print('  worker %d: %6d (%5.1f%%)' % (
+            worker, count, 100.0 * count / options.n))
+
+
+if __name__ == '__main__':
+    main()
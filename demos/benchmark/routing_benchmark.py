@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+# Benchmark for Application URL routing.
+#
+# Builds an application-sized route table and compares the trie-based
+# router used by Application with trying every URLSpec's regex in
+# order (which is what Tornado did before).  The "app" test includes
+# the per-request work Application does to find the router for the
+# request's host.
+
+from __future__ import print_function
+
+import random
+from timeit import Timer
+
+from tornado.httputil import HTTPServerRequest
+from tornado.options import options, define, parse_command_line
+from tornado.web import Application, RequestHandler, URLSpec, _URLRouter
+
+define('routes', default=1000, help='number of routes')
+define('num', default=20000, help='number of lookups per test')
+
+
+def make_specs(count):
+    specs = []
+    for i in range(count // 4):
+        prefix = '/api/v1/resource%d' % i
+        specs.append(URLSpec(prefix, RequestHandler))
+        specs.append(URLSpec(prefix + '/([0-9]+)', RequestHandler))
+        specs.append(URLSpec(prefix + '/(?P<id>[0-9]+)/(?P<field>[a-z_]+)',
+                             RequestHandler))
+        specs.append(URLSpec(prefix + r'/search\.json', RequestHandler))
+    specs.append(URLSpec('/(.*)', RequestHandler))
+    return specs
+
+
+def make_paths(count):
+    paths = []
+    for i in range(1000):
+        n = random.randrange(count // 4)
+        paths.append(random.choice([
+            '/api/v1/resource%d' % n,
+            '/api/v1/resource%d/%d' % (n, i),
+            '/api/v1/resource%d/%d/name' % (n, i),
+            '/api/v1/resource%d/search.json' % n,
+            '/not/routed/%d' % i,
+        ]))
+    return paths
+
+
+def linear_find(specs, path):
+    for spec in specs:
+        match = spec.regex.match(path)
+        if match:
+            return spec, match
+    return None, None
+
+
+def app_find(app, request):
+    for router in app._get_host_handlers(request):
+        spec, match = router.find(request.path)
+        if match:
+            return spec, match
+    return None, None
+
+
+def run(name, find, paths):
+    def lookups():
+        for path in paths:
+            find(path)
+    loops = max(1, options.num // len(paths))
+    duration = min(Timer(lookups).repeat(3, loops))
+    print('%-8s %8.2f us per lookup' % (
+        name, duration * 1e6 / (loops * len(paths))))
+
+
+def main():
+    parse_command_line()
+    random.seed(0)
+    specs = make_specs(options.routes)
+    paths = make_paths(options.routes)
+    router = _URLRouter(specs)
+    for path in paths:
+        assert router.find(path)[0] is linear_find(specs, path)[0]
+    print('%d routes' % len(specs))
+    run('linear', lambda path: linear_find(specs, path), paths)
+    run('trie', router.find, paths)
+    app = Application(specs)
+    requests = dict((path, HTTPServerRequest(uri=path, host='localhost'))
+                    for path in paths)
+    run('app', lambda path: app_find(app, requests[path]), paths)
+
+
+if __name__ == '__main__':
+    main()
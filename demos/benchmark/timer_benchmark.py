@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+#
+# Benchmark for the PollIOLoop timeout queues.
+#
+# Simulates a server with many keep-alive connections: each connection
+# has an idle timeout that is removed and added again every time a
+# request arrives on it, so almost no timeout ever runs.  The clock is
+# simulated, and the queues are driven the same way PollIOLoop drives
+# them, so only the cost of the timeout bookkeeping is measured.  Also
+# reports how many removed timeouts each queue is still holding on to.
+
+from __future__ import print_function
+
+import itertools
+import random
+import time
+
+from tornado.ioloop import _Timeout, _TimeoutHeap, _TimerWheel
+from tornado.options import options, define, parse_command_line
+
+define('connections', default=100000, help='number of connections')
+define('requests', default=500000, help='number of requests to simulate')
+define('idle_timeout', default=60.0, help='seconds')
+define('rate', default=20000, help='requests per simulated second')
+define('requests_per_iteration', default=100,
+       help='requests handled per IOLoop iteration')
+
+
+class FakeLoop(object):
+    def __init__(self):
+        self._timeout_counter = itertools.count()
+
+
+def noop():
+    pass
+
+
+def make_workload(now):
+    # Create all the timeouts up front so that only the queue
+    # operations are timed.
+    loop = FakeLoop()
+    random.seed(0)
+    initial = [_Timeout(now + options.idle_timeout, noop, loop)
+               for i in range(options.connections)]
+    requests = []
+    for i in range(options.requests):
+        now += 1.0 / options.rate
+        requests.append((now, random.randrange(options.connections),
+                         _Timeout(now + options.idle_timeout, noop, loop)))
+    return initial, requests
+
+
+def run(name, queue, initial, requests):
+    timeouts = list(initial)
+    per_iteration = options.requests_per_iteration
+    held = 0
+    start = time.time()
+    for timeout in timeouts:
+        queue.add(timeout)
+    for i, (now, conn, timeout) in enumerate(requests):
+        queue.remove(timeouts[conn])
+        timeouts[conn] = timeout
+        queue.add(timeout)
+        if i % per_iteration == 0:
+            queue.pop_due(now)
+            queue.next_deadline()
+            held = max(held, len(queue) - len(timeouts))
+    elapsed = time.time() - start
+    print('%-6s %8.0f requests/s  %8d removed timeouts held at most' % (
+        name, len(requests) / elapsed, held))
+
+
+def main():
+    parse_command_line()
+    now = 1000000.0
+    initial, requests = make_workload(now)
+    run('heap', _TimeoutHeap(), initial, requests)
+    initial, requests = make_workload(now)
+    run('wheel', _TimerWheel(now), initial, requests)
+
+
+if __name__ == '__main__':
+    main()
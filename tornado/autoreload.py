@@ -80,6 +80,7 @@ if __name__ == "__main__":
     if sys.path[0] == os.path.dirname(__file__):
         del sys.path[0]
 
+import errno
 import functools
 import logging
 import os
@@ -100,6 +101,11 @@ try:
 except ImportError:
     signal = None
 
+try:
+    from tornado.platform import inotify
+except ImportError:
+    inotify = None
+
 # os.execv is broken on Windows and can't properly parse command line
 # arguments and executable name if they contain whitespaces. subprocess
 # fixes that behavior.
@@ -118,8 +124,18 @@ _io_loops = weakref.WeakKeyDictionary()
 def start(io_loop=None, check_time=500):
     """Begins watching source files for changes.
 
+    On Linux, files are watched with inotify: each file is registered
+    once and changes are noticed as soon as they happen.  Every
+    ``check_time`` milliseconds newly imported modules and `watch`\ed
+    files are registered.  On other platforms (or if inotify cannot be
+    used) every file is checked with ``os.stat`` every ``check_time``
+    milliseconds instead.
+
     .. versionchanged:: 4.1
        The ``io_loop`` argument is deprecated.
+
+    .. versionchanged:: 4.4
+       Use inotify when available.
     """
     io_loop = io_loop or ioloop.IOLoop.current()
     if io_loop in _io_loops:
@@ -129,8 +145,18 @@ def start(io_loop=None, check_time=500):
         gen_log.warning("tornado.autoreload started more than once in the same process")
     if _has_execv:
         add_reload_hook(functools.partial(io_loop.close, all_fds=True))
-    modify_times = {}
-    callback = functools.partial(_reload_on_update, modify_times)
+    watcher = None
+    if inotify is not None:
+        try:
+            watcher = _InotifyWatcher(io_loop)
+        except (IOError, OSError) as e:
+            gen_log.warning("Cannot use inotify (%s); polling for changes", e)
+    if watcher is not None:
+        watcher.update()
+        callback = watcher.update
+    else:
+        modify_times = {}
+        callback = functools.partial(_reload_on_update, modify_times)
     scheduler = ioloop.PeriodicCallback(callback, check_time, io_loop=io_loop)
     scheduler.start()
 
@@ -166,15 +192,19 @@ def add_reload_hook(fn):
     _reload_hooks.append(fn)
 
 
-def _reload_on_update(modify_times):
+def _can_reload():
     if _reload_attempted:
         # We already tried to reload and it didn't work, so don't try again.
-        return
+        return False
     if process.task_id() is not None:
         # We're in a child process created by fork_processes.  If child
         # processes restarted themselves, they'd all restart and then
         # all call fork_processes again.
-        return
+        return False
+    return True
+
+
+def _module_paths():
     for module in list(sys.modules.values()):
         # Some modules play games with sys.modules (e.g. email/__init__.py
         # in the standard library), and occasionally this can cause strange
@@ -187,6 +217,13 @@ def _reload_on_update(modify_times):
             continue
         if path.endswith(".pyc") or path.endswith(".pyo"):
             path = path[:-1]
+        yield path
+
+
+def _reload_on_update(modify_times):
+    if not _can_reload():
+        return
+    for path in _module_paths():
         _check_file(modify_times, path)
     for path in _watched_files:
         _check_file(modify_times, path)
@@ -205,6 +242,92 @@ def _check_file(modify_times, path):
         _reload()
 
 
+class _InotifyWatcher(object):
+    """Reloads when inotify reports a change to a watched file.
+
+    The parent directory of each file is watched rather than the file
+    itself so that editors which save by writing a new file and
+    renaming it over the old one are noticed too.
+    """
+    def __init__(self, io_loop):
+        self.io_loop = io_loop
+        self.inotify = inotify.Inotify()
+        self._paths = set()
+        self._dirs = {}  # directory -> watch descriptor
+        self._names = {}  # watch descriptor -> {file name: path}
+        self._modify_times = None  # set if we fall back to polling
+        io_loop.add_handler(self.inotify, self._handle_events, io_loop.READ)
+
+    def update(self):
+        """Registers files that are not being watched yet."""
+        if self._modify_times is not None:
+            _reload_on_update(self._modify_times)
+            return
+        try:
+            # Compare paths rather than the number of modules, which
+            # stays the same when one module replaces another.
+            for path in set(_module_paths()) - self._paths:
+                self.add(path)
+            for path in _watched_files:
+                self.add(path)
+        except (IOError, OSError) as e:
+            # Most likely the inotify watch limit has been reached.
+            gen_log.warning("Cannot use inotify (%s); polling for changes", e)
+            self.close()
+            self._modify_times = {}
+            _reload_on_update(self._modify_times)
+
+    def add(self, path):
+        if path in self._paths:
+            return
+        self._paths.add(path)
+        dirname, name = os.path.split(os.path.abspath(path))
+        wd = self._dirs.get(dirname)
+        if wd is None:
+            try:
+                wd = self.inotify.add_watch(
+                    dirname, inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO |
+                    inotify.IN_ATTRIB | inotify.IN_ONLYDIR)
+            except (IOError, OSError) as e:
+                # Files that cannot be stat'ed are skipped when polling,
+                # too.
+                if e.errno in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    return
+                raise
+            self._dirs[dirname] = wd
+        if not isinstance(name, bytes):
+            name = name.encode(sys.getfilesystemencoding() or "utf-8")
+        self._names.setdefault(wd, {})[name] = path
+
+    def changed_paths(self):
+        """Returns the watched paths named in the pending events."""
+        paths = []
+        for wd, mask, cookie, name in self.inotify.read_events():
+            if mask & inotify.IN_Q_OVERFLOW:
+                # Events were lost, so assume that something changed.
+                paths.append("(inotify queue overflow)")
+            elif mask & inotify.IN_IGNORED:
+                # The directory was removed.
+                names = self._names.pop(wd, {})
+                for dirname, dir_wd in list(self._dirs.items()):
+                    if dir_wd == wd:
+                        del self._dirs[dirname]
+                self._paths.difference_update(names.values())
+            elif name in self._names.get(wd, ()):
+                paths.append(self._names[wd][name])
+        return paths
+
+    def _handle_events(self, fd, events):
+        paths = self.changed_paths()
+        if paths and _can_reload():
+            gen_log.info("%s modified; restarting server", paths[0])
+            _reload()
+
+    def close(self):
+        self.io_loop.remove_handler(self.inotify)
+        self.inotify.close()
+
+
 def _reload():
     global _reload_attempted
     _reload_attempted = True
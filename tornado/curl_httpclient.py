@@ -37,8 +37,9 @@ curl_log = logging.getLogger('tornado.curl_httpclient')
 
 
 class CurlAsyncHTTPClient(AsyncHTTPClient):
-    def initialize(self, io_loop, max_clients=10, defaults=None):
-        super(CurlAsyncHTTPClient, self).initialize(io_loop, defaults=defaults)
+    def initialize(self, io_loop, max_clients=10, defaults=None, cache=None):
+        super(CurlAsyncHTTPClient, self).initialize(io_loop, defaults=defaults,
+                                                    cache=cache)
         self._multi = pycurl.CurlMulti()
         self._multi.setopt(pycurl.M_TIMERFUNCTION, self._set_timeout)
         self._multi.setopt(pycurl.M_SOCKETFUNCTION, self._handle_socket)
@@ -259,6 +260,9 @@ class CurlAsyncHTTPClient(AsyncHTTPClient):
             total=curl.getinfo(pycurl.TOTAL_TIME),
             redirect=curl.getinfo(pycurl.REDIRECT_TIME),
         )
+        if hasattr(pycurl, "APPCONNECT_TIME"):
+            # Only available with libcurl 7.19.0 or newer.
+            time_info["appconnect"] = curl.getinfo(pycurl.APPCONNECT_TIME)
         try:
             info["callback"](HTTPResponse(
                 request=info["request"], code=code, headers=info["headers"],
@@ -21,6 +21,7 @@
 
 from __future__ import absolute_import, division, print_function, with_statement
 
+import collections
 import re
 
 from tornado.concurrent import Future
@@ -55,6 +56,47 @@ class _ExceptionLoggingContext(object):
             raise _QuietException
 
 
+def _format_header_line(name, value):
+    line = utf8(name) + b": " + utf8(value)
+    if b'\n' in line:
+        raise ValueError('Newline in header: ' + repr(line))
+    return line
+
+
+class _HeaderLineCache(dict):
+    """Cached mapping of ``(name, value)`` pairs to encoded header lines.
+
+    Like `.httputil._NormalizedHeaderCache`, this is a dict subclass so
+    that cache hits cost no more than a dict lookup.  Lines are validated
+    when they are first encoded.
+    """
+    def __init__(self, size):
+        super(_HeaderLineCache, self).__init__()
+        self.size = size
+        self.queue = collections.deque()
+
+    def __missing__(self, key):
+        line = _format_header_line(*key)
+        self[key] = line
+        self.queue.append(key)
+        if len(self.queue) > self.size:
+            old_key = self.queue.popleft()
+            del self[old_key]
+        return line
+
+_header_lines = _HeaderLineCache(1000)
+
+# Headers whose values are usually different for every message are
+# encoded directly instead of evicting reusable lines from the cache.
+# Credentials and cookies are never cached so that they are not kept
+# alive in process-wide state after the message has been written.
+_UNCACHED_HEADERS = frozenset([
+    "Authorization", "Content-Length", "Content-Range", "Cookie", "Date",
+    "Etag", "Expires", "Last-Modified", "Location", "Proxy-Authorization",
+    "Set-Cookie",
+])
+
+
 class HTTP1ConnectionParameters(object):
     """Parameters for `.HTTP1Connection` and `.HTTP1ServerConnection`.
     """
@@ -209,7 +251,12 @@ class HTTP1Connection(httputil.HTTPConnection):
                             "Response code %d cannot have body" % code)
                     # TODO: client delegates will get headers_received twice
                     # in the case of a 100-continue.  Document or change?
-                    yield self._read_message(delegate)
+                    ret = yield self._read_message(delegate)
+                    # The nested call has read (and finished) the real
+                    # response; there is no body after the 1xx response
+                    # itself, so don't fall through to read-until-close.
+                    need_delegate_close = False
+                    raise gen.Return(ret)
             else:
                 if (headers.get("Expect") == "100-continue" and
                         not self._write_finished):
@@ -372,10 +419,13 @@ class HTTP1Connection(httputil.HTTPConnection):
             self._expected_content_remaining = int(headers['Content-Length'])
         else:
             self._expected_content_remaining = None
-        lines.extend([utf8(n) + b": " + utf8(v) for n, v in headers.get_all()])
-        for line in lines:
-            if b'\n' in line:
-                raise ValueError('Newline in header: ' + repr(line))
+        if b'\n' in lines[0]:
+            raise ValueError('Newline in header: ' + repr(lines[0]))
+        for name, value in headers.get_all():
+            if name in _UNCACHED_HEADERS:
+                lines.append(_format_header_line(name, value))
+            else:
+                lines.append(_header_lines[(name, value)])
         future = None
         if self.stream.closed():
             future = self._write_future = Future()
@@ -393,14 +443,17 @@ class HTTP1Connection(httputil.HTTPConnection):
             self._pending_write.add_done_callback(self._on_write_complete)
         return future
 
-    def _format_chunk(self, chunk):
+    def _count_body_bytes(self, size):
         if self._expected_content_remaining is not None:
-            self._expected_content_remaining -= len(chunk)
+            self._expected_content_remaining -= size
             if self._expected_content_remaining < 0:
                 # Close the stream now to stop further framing errors.
                 self.stream.close()
                 raise httputil.HTTPOutputError(
                     "Tried to write more data than Content-Length")
+
+    def _format_chunk(self, chunk):
+        self._count_body_bytes(len(chunk))
         if self._chunking_output and chunk:
             # Don't write out empty chunks because that means END-OF-STREAM
             # with chunked encoding
@@ -429,6 +482,37 @@ class HTTP1Connection(httputil.HTTPConnection):
             self._pending_write.add_done_callback(self._on_write_complete)
         return future
 
+    def write_file(self, fd, offset, count, callback=None):
+        """Writes ``count`` bytes of the file ``fd`` from ``offset`` as body data.
+
+        Like `write`, but the data is sent with `.IOStream.write_file`
+        (``os.sendfile``) instead of passing through Python.  Only
+        available when the connection's stream is a plain `.IOStream`
+        and `os.sendfile` exists; ``fd`` must stay open until the
+        returned `.Future` resolves.
+
+        .. versionadded:: 4.4
+        """
+        future = None
+        if self.stream.closed():
+            future = self._write_future = Future()
+            self._write_future.set_exception(iostream.StreamClosedError())
+            self._write_future.exception()
+        else:
+            if callback is not None:
+                self._write_callback = stack_context.wrap(callback)
+            else:
+                future = self._write_future = Future()
+            self._count_body_bytes(count)
+            if self._chunking_output and count:
+                self.stream.write(utf8("%x" % count) + b"\r\n")
+                self.stream.write_file(fd, offset, count)
+                self._pending_write = self.stream.write(b"\r\n")
+            else:
+                self._pending_write = self.stream.write_file(fd, offset, count)
+            self._pending_write.add_done_callback(self._on_write_complete)
+        return future
+
     def finish(self):
         """Implements `.HTTPConnection.finish`."""
         if (self._expected_content_remaining is not None and
@@ -481,7 +565,9 @@ class HTTP1Connection(httputil.HTTPConnection):
             return connection_header != "close"
         elif ("Content-Length" in headers
               or headers.get("Transfer-Encoding", "").lower() == "chunked"
-              or start_line.method in ("HEAD", "GET")):
+              or getattr(start_line, 'method', None) in ("HEAD", "GET")):
+            # start_line may be a request or response start line; only
+            # the former has a method attribute.
             return connection_header == "keep-alive"
         return False
 
@@ -558,9 +644,20 @@ class HTTP1Connection(httputil.HTTPConnection):
 
     @gen.coroutine
     def _read_fixed_body(self, content_length, delegate):
+        if content_length > self.params.chunk_size:
+            # Large bodies are received straight into one reusable
+            # buffer instead of passing through the stream's buffer.
+            buf = memoryview(bytearray(self.params.chunk_size))
+        else:
+            buf = None
         while content_length > 0:
-            body = yield self.stream.read_bytes(
-                min(self.params.chunk_size, content_length), partial=True)
+            if buf is None:
+                body = yield self.stream.read_bytes(
+                    min(self.params.chunk_size, content_length), partial=True)
+            else:
+                n = yield self.stream.read_into(
+                    buf[:min(len(buf), content_length)], partial=True)
+                body = buf[:n].tobytes()
             content_length -= len(body)
             if not self._write_finished or self.is_client:
                 with _ExceptionLoggingContext(app_log):
@@ -37,14 +37,23 @@ http://curl.haxx.se/libcurl/c/curl_easy_setopt.html#CURLOPTCONNECTTIMEOUTMS
 
 from __future__ import absolute_import, division, print_function, with_statement
 
+import collections
+import copy
+import email.utils
 import functools
+import hashlib
+import json
+import os
+import tempfile
 import time
 import weakref
+from io import BytesIO
 
 from tornado.concurrent import TracebackFuture
-from tornado.escape import utf8, native_str
+from tornado.escape import utf8, native_str, to_unicode
 from tornado import httputil, stack_context
 from tornado.ioloop import IOLoop
+from tornado.log import gen_log
 from tornado.util import Configurable
 
 
@@ -130,8 +139,28 @@ class AsyncHTTPClient(Configurable):
         client = AsyncHTTPClient(force_instance=True,
             defaults=dict(user_agent="MyUserAgent"))
 
+    所有实现也都支持一个 ``cache`` 关键字参数, 它是一个 `CacheStore`
+    对象 (例如 `MemoryCacheStore` 或 `DiskCacheStore`).  设置后, 客户端
+    会像 RFC 7234 描述的私有缓存一样缓存 GET 请求的响应: 遵循响应的
+    ``Cache-Control`` (``max-age``, ``no-cache``, ``no-store``),
+    ``Expires`` 和 ``Vary`` 头, 以及请求的 ``Cache-Control`` (``no-cache``,
+    ``no-store``, ``max-age``) 和 ``Pragma: no-cache`` 头.  对于过期的条目,
+    如果有 ``ETag`` 或 ``Last-Modified`` 头, 将自动发送 ``If-None-Match``/
+    ``If-Modified-Since`` 进行再验证, 并把 304 响应转换为缓存的
+    `HTTPResponse`.  从缓存中返回的响应带有 ``Age`` 头.  POST 等不安全的
+    方法会使相同 URL 的缓存条目失效.  带有认证信息, 请求体, 条件请求头,
+    ``streaming_callback``/``header_callback`` 或非默认的
+    ``follow_redirects``/``decompress_response`` 的请求不使用缓存.
+    写入缓存失败时只记录错误, 不影响请求的结果. 例如::
+
+        AsyncHTTPClient.configure(
+            None, cache=MemoryCacheStore(max_size=32 * 1024 * 1024))
+
     .. versionchanged:: 4.1
        ``io_loop`` 参数被废弃.
+
+    .. versionchanged:: 4.4
+       增加 ``cache`` 参数.
     """
     @classmethod
     def configurable_base(cls):
@@ -168,12 +197,16 @@ class AsyncHTTPClient(Configurable):
             instance_cache[instance.io_loop] = instance
         return instance
 
-    def initialize(self, io_loop, defaults=None):
+    def initialize(self, io_loop, defaults=None, cache=None):
         self.io_loop = io_loop
         self.defaults = dict(HTTPRequest._DEFAULTS)
         if defaults is not None:
             self.defaults.update(defaults)
+        self.cache = cache
         self._closed = False
+        # Maps coalescing keys (see _coalesce_key) to the response
+        # handlers waiting on the in-flight fetch, first one first.
+        self._coalesced = {}
 
     def close(self):
         """销毁该 HTTP 客户端, 释放所有被使用的文件描述符.
@@ -210,6 +243,13 @@ class AsyncHTTPClient(Configurable):
         如果给定了 ``callback`` , 它将被 `HTTPResponse` 调用.
         在回调接口中, `HTTPError` 不会自动抛出. 相反你必须检查该响应的
         ``error`` 属性或者调用它的 `~HTTPResponse.rethrow` 方法.
+
+        如果请求设置了 ``coalesce=True`` (参见 `HTTPRequest`), 与一个
+        正在进行中的请求相同的 GET 或 HEAD 请求不会再次发送, 而是等待
+        并共享那个请求的结果.
+
+        .. versionchanged:: 4.4
+           支持请求合并 (``coalesce``).
         """
         if self._closed:
             raise RuntimeError("fetch() called on closed AsyncHTTPClient")
@@ -242,12 +282,162 @@ class AsyncHTTPClient(Configurable):
                 future.set_exception(response.error)
             else:
                 future.set_result(response)
+        if self.cache is not None:
+            handle_response = self._cache_fetch(request, handle_response)
+            if handle_response is None:
+                return future
+        if request.coalesce and self._can_coalesce(request):
+            key = self._coalesce_key(request)
+            waiters = self._coalesced.get(key)
+            if waiters is not None:
+                waiters.append((request, handle_response))
+                return future
+            self._coalesced[key] = [(request, handle_response)]
+            handle_response = functools.partial(self._on_coalesced_response,
+                                                key)
         self.fetch_impl(request, handle_response)
         return future
 
     def fetch_impl(self, request, callback):
         raise NotImplementedError()
 
+    # Request attributes that change what a fetch returns, in addition
+    # to the method, url and headers.
+    _COALESCE_ATTRS = ("auth_username", "auth_password", "auth_mode",
+                       "follow_redirects", "max_redirects", "user_agent",
+                       "decompress_response", "allow_ipv6",
+                       "network_interface", "proxy_host", "proxy_port",
+                       "proxy_username", "proxy_password", "validate_cert",
+                       "ca_certs", "client_key", "client_cert")
+
+    def _can_coalesce(self, request):
+        return (request.method in ("GET", "HEAD") and
+                request.body is None and
+                request.body_producer is None and
+                request.streaming_callback is None and
+                request.header_callback is None and
+                request.prepare_curl_callback is None)
+
+    def _coalesce_key(self, request):
+        key = [request.method, request.url,
+               tuple(sorted(request.headers.get_all()))]
+        key.extend(getattr(request, name) for name in self._COALESCE_ATTRS)
+        # ssl_options may be an unhashable dict, so only the same
+        # object counts as the same configuration.
+        key.append(id(request.ssl_options) if request.ssl_options else None)
+        return tuple(key)
+
+    def _on_coalesced_response(self, key, response):
+        waiters = self._coalesced.pop(key)
+        waiters[0][1](response)
+        for request, handle_response in waiters[1:]:
+            handle_response(_copy_response(response, request))
+
+    def _cache_fetch(self, request, callback):
+        """尽可能从缓存中响应 ``request``.
+
+        如果已经用缓存的响应调用了 ``callback`` 则返回 None, 否则返回
+        应该传递给 `fetch_impl` 的回调.
+        """
+        if request.method not in ("GET", "HEAD", "OPTIONS", "TRACE"):
+            return functools.partial(self._on_unsafe_response, request.url,
+                                     callback)
+        if request.method != "GET" or not self._can_cache(request):
+            return callback
+        original_request = request.request
+        request_cc = _parse_cache_control(request.headers.get("Cache-Control"))
+        if "no-store" in request_cc:
+            return callback
+        entry = self.cache.get(request.url)
+        if entry is not None and not _vary_matches(entry, request.headers):
+            entry = None
+        if entry is not None:
+            age = entry["initial_age"] + time.time() - entry["response_time"]
+            max_age = _cache_control_seconds(request_cc, "max-age")
+            if max_age is not None:
+                max_age = min(max_age, entry["lifetime"])
+            else:
+                max_age = entry["lifetime"]
+            if (age < max_age and "no-cache" not in request_cc and
+                    "no-cache" not in request.headers.get("Pragma", "")):
+                callback(_cached_response(request, entry))
+                return None
+            headers = httputil.HTTPHeaders(entry["headers"])
+            if "ETag" not in headers and "Last-Modified" not in headers:
+                entry = None
+        request_headers = httputil.HTTPHeaders(request.headers)
+        if entry is not None:
+            # The validators go on a private copy; ``request.headers`` is
+            # also the caller's HTTPRequest.headers.
+            validating_request = copy.copy(original_request)
+            validating_request.headers = httputil.HTTPHeaders(request.headers)
+            if "ETag" in headers:
+                validating_request.headers["If-None-Match"] = headers["ETag"]
+            if "Last-Modified" in headers:
+                validating_request.headers["If-Modified-Since"] = \
+                    headers["Last-Modified"]
+            request.request = validating_request
+        return functools.partial(self._on_cache_response, request,
+                                 original_request, request_headers, entry,
+                                 callback)
+
+    def _can_cache(self, request):
+        if (request.body is not None or request.body_producer is not None or
+                request.streaming_callback is not None or
+                request.header_callback is not None or
+                request.auth_username is not None):
+            return False
+        # Entries are keyed by URL alone, so only requests made with the
+        # default redirect and decompression behavior may share them.
+        if (request.follow_redirects is not True or
+                request.decompress_response is not True):
+            return False
+        for name in ("Authorization", "If-None-Match", "If-Modified-Since",
+                     "If-Match", "If-Unmodified-Since", "If-Range", "Range"):
+            if name in request.headers:
+                return False
+        return True
+
+    def _on_cache_response(self, request, original_request, request_headers,
+                           entry, callback, response):
+        request.request = original_request
+        response.request = original_request
+        if response.code == 304 and entry is not None:
+            headers = httputil.HTTPHeaders(entry["headers"])
+            for name in response.headers:
+                if name != "Content-Length":
+                    headers[name] = response.headers[name]
+            entry = _cache_entry(request, request_headers, entry["code"],
+                                 entry["reason"], headers, entry["body"],
+                                 entry["effective_url"])
+            response = _cached_response(request, entry, response)
+        elif (response.code in _CACHEABLE_CODES and
+                response.effective_url == request.url):
+            entry = _cache_entry(request, request_headers, response.code,
+                                 response.reason, response.headers,
+                                 response.body or b"", response.effective_url)
+        else:
+            entry = None
+        if entry is not None and _is_storable(entry):
+            self._update_cache(self.cache.set, request.url, entry)
+        elif response.code < 300:
+            self._update_cache(self.cache.delete, request.url)
+        callback(response)
+
+    def _update_cache(self, method, *args):
+        # A failing store (e.g. a full disk) must not keep the fetch
+        # from completing.
+        try:
+            method(*args)
+        except Exception:
+            gen_log.error("Error updating HTTP cache for %s", args[0],
+                          exc_info=True)
+
+    def _on_unsafe_response(self, url, callback, response):
+        if response.code < 400:
+            self._update_cache(self.cache.delete, url)
+        callback(response)
+
     @classmethod
     def configure(cls, impl, **kwargs):
         """配置要使用的 `AsyncHTTPClient` 子类.
@@ -282,7 +472,9 @@ class HTTPRequest(object):
         decompress_response=True,
         proxy_password='',
         allow_nonstandard_methods=False,
-        validate_cert=True)
+        validate_cert=True,
+        priority=0,
+        coalesce=False)
 
     def __init__(self, url, method="GET", headers=None, body=None,
                  auth_username=None, auth_password=None, auth_mode=None,
@@ -297,7 +489,7 @@ class HTTPRequest(object):
                  allow_ipv6=None,
                  client_key=None, client_cert=None, body_producer=None,
                  expect_100_continue=False, decompress_response=None,
-                 ssl_options=None):
+                 ssl_options=None, priority=None, coalesce=None):
         r"""除了 ``url`` 以外所有参数都是可选的.
 
         :arg string url: fetch 的 URL
@@ -368,6 +560,16 @@ class HTTPRequest(object):
         :arg bool expect_100_continue: 如果为 true, 发送
            ``Expect: 100-continue`` 头并在发送请求体前等待继续响应.
            只被 simple_httpclient 支持.
+        :arg int priority: 请求在客户端队列中等待时的优先级; 值越大越先
+           被发送, 相同优先级的请求按 FIFO 顺序发送.  默认是 0.
+           只被 simple_httpclient 支持.
+        :arg bool coalesce: 如果为 true, 当已经有一个相同的 GET 或 HEAD
+           请求(相同的 URL, 头和认证, 代理以及证书选项)正在进行时, 该请求
+           不会被再次发送, 而是与那个请求共享同一个响应; 每个调用者都会
+           得到它自己的 `HTTPResponse` 和 ``buffer`` 副本.  超时等其他选项
+           使用最先发起的请求的设置.  设置了 ``streaming_callback``,
+           ``header_callback``, ``prepare_curl_callback`` 或请求体的请求
+           不会被合并.  默认是 False.
 
         .. 注意::
 
@@ -386,6 +588,9 @@ class HTTPRequest(object):
 
         .. versionadded:: 4.2
            ``ssl_options`` 参数.
+
+        .. versionadded:: 4.4
+           ``priority`` 和 ``coalesce`` 参数.
         """
         # Note that some of these attributes go through property setters
         # defined below.
@@ -425,6 +630,8 @@ class HTTPRequest(object):
         self.client_cert = client_cert
         self.ssl_options = ssl_options
         self.expect_100_continue = expect_100_continue
+        self.priority = priority
+        self.coalesce = coalesce
         self.start_time = time.time()
 
     @property
@@ -506,7 +713,13 @@ class HTTPResponse(object):
       可用数据可能会更改, 不过当前在用的时间信息是
       http://curl.haxx.se/libcurl/c/curl_easy_getinfo.html,
       加上 ``queue``, 这是通过等待在 `AsyncHTTPClient` 的 ``max_clients``
-      设置下的插槽引入的延迟(如果有的话).
+      设置下的插槽引入的延迟(如果有的话).  ``simple_httpclient`` 以相同
+      的含义提供 ``queue``, ``namelookup``, ``connect``, ``appconnect``,
+      ``pretransfer``, ``starttransfer``, ``total`` 和 ``redirect``;
+      请求失败时, 没有完成的阶段将被省略.
+
+    .. versionchanged:: 4.4
+       ``simple_httpclient`` 填充 ``time_info``.
     """
     def __init__(self, request, code, headers=None, buffer=None,
                  effective_url=None, error=None, request_time=None,
@@ -582,6 +795,252 @@ class HTTPError(Exception):
         return "HTTP %d: %s" % (self.code, self.message)
 
 
+class CacheStore(object):
+    """`AsyncHTTPClient` 响应缓存 (参见 ``cache`` 参数) 的存储接口.
+
+    条目是以请求 URL 为键的字典, 包含状态码, 头, 响应体和计算新鲜度所需
+    的时间信息.  子类必须实现 `get`, `set` 和 `delete` 方法.
+
+    .. versionadded:: 4.4
+    """
+    def get(self, key):
+        """返回 ``key`` 的条目, 如果没有则返回 None."""
+        raise NotImplementedError()
+
+    def set(self, key, entry):
+        """保存 ``key`` 的条目, 替换之前的条目."""
+        raise NotImplementedError()
+
+    def delete(self, key):
+        """删除 ``key`` 的条目(如果有)."""
+        raise NotImplementedError()
+
+
+class MemoryCacheStore(CacheStore):
+    """内存中的 LRU `CacheStore`.
+
+    ``max_size`` 是所有条目的响应体和头的总字节数的上限 (默认 64MB);
+    超出时最近最少使用的条目将被丢弃.
+
+    .. versionadded:: 4.4
+    """
+    def __init__(self, max_size=64 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            # Move to the most recently used end.
+            self._entries[key] = entry
+        return entry
+
+    def set(self, key, entry):
+        self.delete(key)
+        if _entry_size(entry) > self.max_size:
+            return
+        self._entries[key] = entry
+        self.size += _entry_size(entry)
+        while self.size > self.max_size:
+            old_key, old_entry = self._entries.popitem(last=False)
+            self.size -= _entry_size(old_entry)
+
+    def delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= _entry_size(entry)
+
+
+class DiskCacheStore(CacheStore):
+    """把每个条目保存为 ``path`` 目录中的一个文件的 `CacheStore`.
+
+    文件在 `.IOLoop` 线程中同步读写, 所以 ``path`` 应该在本地磁盘上.
+    这个类不会限制目录的大小; 条目只在被替换或失效时才会被删除.
+
+    .. versionadded:: 4.4
+    """
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _filename(self, key):
+        return os.path.join(self.path, hashlib.sha1(utf8(key)).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._filename(key), "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+        meta, sep, body = data.partition(b"\n")
+        try:
+            entry = json.loads(to_unicode(meta))
+        except ValueError:
+            return None
+        if entry.pop("key", None) != key:
+            return None
+        entry["headers"] = [(native_str(name), native_str(value))
+                            for name, value in entry["headers"]]
+        entry["vary"] = dict((native_str(name), value)
+                             for name, value in entry["vary"].items())
+        entry["body"] = body
+        return entry
+
+    def set(self, key, entry):
+        meta = dict(entry, key=key)
+        body = meta.pop("body")
+        fd, tmp_filename = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(utf8(json.dumps(meta)) + b"\n" + body)
+            filename = self._filename(key)
+            try:
+                os.rename(tmp_filename, filename)
+            except OSError:
+                # Windows does not replace existing files on rename.
+                os.remove(filename)
+                os.rename(tmp_filename, filename)
+        except Exception:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self._filename(key))
+        except OSError:
+            pass
+
+
+# Status codes that may be cached without explicit freshness information
+# (RFC 7231 section 6.1); we only store those we can serve back as-is.
+# Redirects are left out since whether they are followed depends on
+# the request.
+_CACHEABLE_CODES = frozenset([200, 203, 404, 410])
+
+
+def _parse_cache_control(value):
+    """把 ``Cache-Control`` 头解析为一个指令名到值(或 None)的字典."""
+    directives = {}
+    if value:
+        for part in value.split(","):
+            name, sep, arg = part.strip().partition("=")
+            if name:
+                directives[name.lower()] = arg.strip('" ') if sep else None
+    return directives
+
+
+def _cache_control_seconds(directives, name):
+    try:
+        return max(0, int(directives[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _parse_http_date(value):
+    if not value:
+        return None
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return email.utils.mktime_tz(parsed)
+
+
+def _cache_entry(request, request_headers, code, reason, headers, body,
+                 effective_url):
+    """为一个响应创建缓存条目; 参见 `_is_storable`."""
+    now = time.time()
+    cc = _parse_cache_control(headers.get("Cache-Control"))
+    date = _parse_http_date(headers.get("Date"))
+    if date is None:
+        date = now
+    lifetime = _cache_control_seconds(cc, "max-age")
+    if lifetime is None and "Expires" in headers:
+        expires = _parse_http_date(headers["Expires"])
+        lifetime = max(0, expires - date) if expires is not None else 0
+    if lifetime is None:
+        last_modified = _parse_http_date(headers.get("Last-Modified"))
+        if last_modified is not None:
+            # Heuristic freshness (RFC 7234 section 4.2.2).
+            lifetime = max(0, (date - last_modified) / 10.0)
+        else:
+            lifetime = 0
+    if "no-cache" in cc:
+        lifetime = 0
+    try:
+        age = max(0, int(headers.get("Age", 0)))
+    except ValueError:
+        age = 0
+    vary = [name.strip().lower()
+            for name in headers.get("Vary", "").split(",") if name.strip()]
+    return dict(
+        code=code, reason=reason, headers=list(headers.get_all()), body=body,
+        effective_url=effective_url,
+        vary=dict((name, request_headers.get(name)) for name in vary),
+        response_time=now, lifetime=lifetime,
+        initial_age=max(now - date, age + now - request.start_time))
+
+
+def _is_storable(entry):
+    headers = httputil.HTTPHeaders(entry["headers"])
+    if ("no-store" in _parse_cache_control(headers.get("Cache-Control")) or
+            "*" in entry["vary"]):
+        return False
+    return (entry["lifetime"] > 0 or "ETag" in headers or
+            "Last-Modified" in headers)
+
+
+def _entry_size(entry):
+    return len(entry["body"]) + sum(len(name) + len(value)
+                                    for name, value in entry["headers"])
+
+
+def _vary_matches(entry, headers):
+    for name, value in entry["vary"].items():
+        if headers.get(name) != value:
+            return False
+    return True
+
+
+def _cached_response(request, entry, response=None):
+    """从缓存条目为 ``request`` 创建一个 `HTTPResponse`.
+
+    ``response`` 是触发这个条目的 304 响应(如果有).
+    """
+    headers = httputil.HTTPHeaders(entry["headers"])
+    age = entry["initial_age"] + time.time() - entry["response_time"]
+    headers["Age"] = str(int(age))
+    return HTTPResponse(
+        request, entry["code"], headers=headers,
+        buffer=BytesIO(entry["body"]), effective_url=entry["effective_url"],
+        request_time=time.time() - request.start_time,
+        time_info=dict(response.time_info) if response is not None else None,
+        reason=entry["reason"])
+
+
+def _copy_response(response, request):
+    """为另一个被合并的 ``request`` 复制 ``response``.
+
+    ``buffer`` 和头都会被复制, 这样调用者之间不会看到彼此的修改.
+    """
+    if response.buffer is not None:
+        buffer = BytesIO(response.body)
+    else:
+        buffer = None
+    error = response.error
+    if isinstance(error, HTTPError) and error.response is response:
+        # Let the new response create an HTTPError that refers to it.
+        error = None
+    return HTTPResponse(request, response.code,
+                        headers=httputil.HTTPHeaders(response.headers),
+                        buffer=buffer, effective_url=response.effective_url,
+                        error=error, request_time=response.request_time,
+                        time_info=dict(response.time_info),
+                        reason=response.reason)
+
+
 class _RequestProxy(object):
     """将对象和默认字典相结合.
 
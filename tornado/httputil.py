@@ -24,11 +24,11 @@ from __future__ import absolute_import, division, print_function, with_statement
 
 import calendar
 import collections
-import copy
 import datetime
 import email.utils
 import numbers
 import re
+import tempfile
 import time
 
 from tornado.escape import native_str, parse_qs_bytes, utf8
@@ -311,6 +311,10 @@ class HTTPServerRequest(object):
        File uploads are available in the files property, which maps file
        names to lists of `.HTTPFile`.
 
+    ``arguments``, ``query_arguments``, ``body_arguments`` and ``files``
+    are computed lazily: the query string and the request body are only
+    parsed the first time one of them is used.
+
     .. attribute:: connection
 
        An HTTP request is attached to a single HTTP connection, which can
@@ -320,6 +324,10 @@ class HTTPServerRequest(object):
 
     .. versionchanged:: 4.0
        Moved from ``tornado.httpserver.HTTPRequest``.
+
+    .. versionchanged:: 4.4
+       Arguments and files are parsed on first access instead of when
+       the request is created.
     """
     def __init__(self, method=None, uri=None, version="HTTP/1.0", headers=None,
                  body=None, host=None, files=None, connection=None,
@@ -338,15 +346,66 @@ class HTTPServerRequest(object):
         self.protocol = getattr(context, 'protocol', "http")
 
         self.host = host or self.headers.get("Host") or "127.0.0.1"
-        self.files = files or {}
+        self._files = files or {}
         self.connection = connection
         self._start_time = time.time()
         self._finish_time = None
 
         self.path, sep, self.query = uri.partition('?')
-        self.arguments = parse_qs_bytes(self.query, keep_blank_values=True)
-        self.query_arguments = copy.deepcopy(self.arguments)
-        self.body_arguments = {}
+        # Filled in on first access; see the properties below.
+        self._query_arguments = None
+        self._body_arguments = {}
+        self._arguments = None
+        self._body_pending = False
+
+    @property
+    def query_arguments(self):
+        if self._query_arguments is None:
+            self._query_arguments = parse_qs_bytes(self.query,
+                                                   keep_blank_values=True)
+        return self._query_arguments
+
+    @query_arguments.setter
+    def query_arguments(self, value):
+        self._query_arguments = value
+
+    @property
+    def body_arguments(self):
+        self._parse_pending_body()
+        return self._body_arguments
+
+    @body_arguments.setter
+    def body_arguments(self, value):
+        self._parse_pending_body()
+        self._body_arguments = value
+
+    @property
+    def files(self):
+        self._parse_pending_body()
+        return self._files
+
+    @files.setter
+    def files(self, value):
+        self._parse_pending_body()
+        self._files = value
+
+    @property
+    def arguments(self):
+        self._parse_pending_body()
+        if self._arguments is None:
+            # Only the lists are copied; the values themselves are
+            # shared with query_arguments and body_arguments.
+            arguments = dict((k, list(v))
+                             for k, v in self.query_arguments.items())
+            for k, v in self._body_arguments.items():
+                arguments.setdefault(k, []).extend(v)
+            self._arguments = arguments
+        return self._arguments
+
+    @arguments.setter
+    def arguments(self, value):
+        self._parse_pending_body()
+        self._arguments = value
 
     def supports_http_1_1(self):
         """Returns True if this request supports HTTP/1.1 semantics.
@@ -430,13 +489,23 @@ class HTTPServerRequest(object):
             return None
 
     def _parse_body(self):
+        # Called once the whole body has been received; the actual
+        # parsing waits until the arguments or files are needed.
+        self._body_pending = True
+
+    def _parse_pending_body(self):
+        if not self._body_pending:
+            return
+        self._body_pending = False
+        body_arguments = {}
         parse_body_arguments(
             self.headers.get("Content-Type", ""), self.body,
-            self.body_arguments, self.files,
+            body_arguments, self._files,
             self.headers)
-
-        for k, v in self.body_arguments.items():
-            self.arguments.setdefault(k, []).extend(v)
+        for k, v in body_arguments.items():
+            self._body_arguments.setdefault(k, []).extend(v)
+            if self._arguments is not None:
+                self._arguments.setdefault(k, []).extend(v)
 
     def __repr__(self):
         attrs = ("protocol", "host", "method", "uri", "version", "remote_ip")
@@ -593,6 +662,9 @@ class HTTPFile(ObjectDict):
     * ``filename``
     * ``body``
     * ``content_type``
+
+    Files parsed by `MultipartFormDataParser` also have ``size`` and
+    ``file`` attributes (see that class).
     """
     pass
 
@@ -750,6 +822,209 @@ def parse_multipart_form_data(boundary, data, arguments, files):
             arguments.setdefault(name, []).append(value)
 
 
+class MultipartFormDataParser(object):
+    """Incremental parser for ``multipart/form-data`` request bodies.
+
+    `parse_multipart_form_data` needs the whole body in memory.  This
+    class parses it as it arrives instead, so it can be used with
+    `.stream_request_body`: pass each chunk to `data_received` and call
+    `finish` at the end.  Each field is added to ``arguments`` (and each
+    file to ``files``) as soon as it is complete; both default to new
+    dicts, available as the attributes of the same names.
+
+    Uploaded files of up to ``spool_threshold`` bytes are kept in memory
+    in `HTTPFile.body`, as with `parse_multipart_form_data`.  Larger files
+    are written to a temporary file instead: their `HTTPFile` has
+    ``body=None`` and a ``file`` attribute with the open temporary file,
+    positioned at the start (it is deleted when closed).  Every `HTTPFile`
+    also has a ``size`` attribute.
+
+    Apart from the data of the part being parsed, this buffers at most
+    one chunk plus the length of the boundary, or ``max_header_size``
+    bytes while reading the headers of a part.  Fields larger than
+    ``max_field_size`` are skipped with a warning.
+
+    Typical usage::
+
+        @stream_request_body
+        class UploadHandler(RequestHandler):
+            def prepare(self):
+                self.parser = MultipartFormDataParser(
+                    self.request.headers["Content-Type"])
+
+            def data_received(self, chunk):
+                self.parser.data_received(chunk)
+
+            def post(self):
+                self.parser.finish()
+                for f in self.parser.files.get("upload", []):
+                    ...
+
+    Raises `ValueError` if ``content_type`` is not a multipart content
+    type with a boundary.  Malformed bodies are logged and the parts
+    that could not be parsed are skipped.
+
+    .. versionadded:: 4.4
+    """
+    def __init__(self, content_type, arguments=None, files=None,
+                 spool_threshold=1024 * 1024, max_field_size=1024 * 1024,
+                 max_header_size=64 * 1024):
+        ctype, params = _parse_header(content_type)
+        if not ctype.startswith("multipart/") or not params.get("boundary"):
+            raise ValueError("multipart boundary not found")
+        self.arguments = {} if arguments is None else arguments
+        self.files = {} if files is None else files
+        self.spool_threshold = spool_threshold
+        self.max_field_size = max_field_size
+        self.max_header_size = max_header_size
+        self._delimiter = b"\r\n--" + utf8(params["boundary"])
+        # Start with a CRLF so the first delimiter looks like the others.
+        self._buffer = b"\r\n"
+        self._state = self._read_preamble
+        self._part = None
+
+    def data_received(self, chunk):
+        """Parses the next chunk of the body."""
+        self._buffer += chunk
+        while self._state(self._buffer):
+            pass
+
+    def finish(self):
+        """Signals the end of the body.
+
+        Logs a warning if the body was incomplete; any part that was
+        still being parsed is discarded.
+        """
+        if self._state != self._read_epilogue:
+            gen_log.warning("Invalid multipart/form-data: no final boundary")
+            self._discard_part()
+            self._state = self._read_epilogue
+        self._buffer = b""
+
+    # Each state method parses what it can from the buffer and returns
+    # true if the next state should run immediately.
+
+    def _read_preamble(self, buf):
+        index = buf.find(self._delimiter)
+        if index == -1:
+            self._buffer = buf[-len(self._delimiter):]
+            return False
+        self._buffer = buf[index + len(self._delimiter):]
+        self._state = self._read_delimiter_end
+        return True
+
+    def _read_delimiter_end(self, buf):
+        if len(buf) < 2:
+            return False
+        if buf.startswith(b"--"):
+            self._state = self._read_epilogue
+        elif buf.startswith(b"\r\n"):
+            self._state = self._read_headers
+        else:
+            gen_log.warning("Invalid multipart/form-data")
+            self._state = self._read_epilogue
+        return True
+
+    def _read_headers(self, buf):
+        # buf starts with the CRLF that ends the delimiter line, so a
+        # part without headers is found too.
+        eoh = buf.find(b"\r\n\r\n")
+        if eoh == -1:
+            if len(buf) > self.max_header_size:
+                gen_log.warning("multipart/form-data headers too large")
+                self._state = self._read_epilogue
+            return False
+        self._buffer = buf[eoh + 4:]
+        self._state = self._read_body
+        self._start_part(buf[2:eoh])
+        return True
+
+    def _read_body(self, buf):
+        index = buf.find(self._delimiter)
+        if index == -1:
+            # Keep enough to recognize a delimiter split across chunks.
+            safe = len(buf) - len(self._delimiter) + 1
+            if safe > 0:
+                self._part_data(buf[:safe])
+                self._buffer = buf[safe:]
+            return False
+        self._part_data(buf[:index])
+        self._buffer = buf[index + len(self._delimiter):]
+        self._finish_part()
+        self._state = self._read_delimiter_end
+        return True
+
+    def _read_epilogue(self, buf):
+        self._buffer = b""
+        return False
+
+    def _start_part(self, header_data):
+        self._part = None
+        if not header_data:
+            gen_log.warning("multipart/form-data missing headers")
+            return
+        try:
+            headers = HTTPHeaders.parse(header_data.decode("utf-8"))
+        except Exception:
+            gen_log.warning("Invalid multipart/form-data headers")
+            return
+        disposition, disp_params = _parse_header(
+            headers.get("Content-Disposition", ""))
+        if disposition != "form-data":
+            gen_log.warning("Invalid multipart/form-data")
+            return
+        if not disp_params.get("name"):
+            gen_log.warning("multipart/form-data value missing name")
+            return
+        self._part = ObjectDict(
+            name=disp_params["name"], filename=disp_params.get("filename"),
+            content_type=headers.get("Content-Type", "application/unknown"),
+            chunks=[], size=0, file=None)
+
+    def _part_data(self, data):
+        part = self._part
+        if part is None or not data:
+            return
+        part.size += len(data)
+        if part.file is not None:
+            part.file.write(data)
+            return
+        part.chunks.append(data)
+        if not part.filename:
+            if part.size > self.max_field_size:
+                gen_log.warning("multipart/form-data field %s too large",
+                                part.name)
+                self._part = None
+        elif part.size > self.spool_threshold:
+            part.file = tempfile.TemporaryFile()
+            for chunk in part.chunks:
+                part.file.write(chunk)
+            part.chunks = None
+
+    def _finish_part(self):
+        part = self._part
+        self._part = None
+        if part is None:
+            return
+        if not part.filename:
+            self.arguments.setdefault(part.name, []).append(
+                b"".join(part.chunks))
+            return
+        if part.file is not None:
+            part.file.seek(0)
+            body = None
+        else:
+            body = b"".join(part.chunks)
+        self.files.setdefault(part.name, []).append(HTTPFile(
+            filename=part.filename, body=body, file=part.file,
+            size=part.size, content_type=part.content_type))
+
+    def _discard_part(self):
+        if self._part is not None and self._part.file is not None:
+            self._part.file.close()
+        self._part = None
+
+
 def format_timestamp(ts):
     """Formats a timestamp in the format used by HTTP.
 
@@ -771,6 +1046,21 @@ def format_timestamp(ts):
     return email.utils.formatdate(ts, usegmt=True)
 
 
+_current_timestamp = [None, None]
+
+
+def _format_current_timestamp():
+    """Returns `format_timestamp` of the current time.
+
+    The result only changes once per second, so it is reused until the
+    next second starts.
+    """
+    now = int(time.time())
+    if _current_timestamp[0] != now:
+        _current_timestamp[:] = [now, format_timestamp(now)]
+    return _current_timestamp[1]
+
+
 RequestStartLine = collections.namedtuple(
     'RequestStartLine', ['method', 'path', 'version'])
 
@@ -28,6 +28,7 @@ In addition to I/O events, the `IOLoop` can also schedule time-based events.
 
 from __future__ import absolute_import, division, print_function, with_statement
 
+import bisect
 import datetime
 import errno
 import functools
@@ -58,11 +59,14 @@ try:
 except ImportError:
     import _thread as thread  # py3
 
-from tornado.platform.auto import set_close_exec, Waker
+from tornado.platform.auto import set_close_exec, Waker, monotonic_time
 
 
 _POLL_TIMEOUT = 3600.0
 
+# Clock used to measure durations for `IOLoop.get_stats`.
+_stats_clock = monotonic_time or time.time
+
 
 class TimeoutError(Exception):
     pass
@@ -349,6 +353,50 @@ class IOLoop(Configurable):
                         self._blocking_signal_threshold,
                         ''.join(traceback.format_stack(frame)))
 
+    def enable_stats(self, slowest=10):
+        """Starts collecting statistics about each loop iteration.
+
+        The time spent waiting in ``poll()``, running callbacks, running
+        timeouts and running fd handlers is recorded in latency
+        histograms, along with how late each timeout ran (the loop
+        lag) and the ``slowest`` callbacks by qualified name.  Use
+        `get_stats` to read them.  Calling this method again clears
+        the statistics collected so far.
+
+        Collection is off by default and costs nothing while disabled.
+        Statistics are only collected by `PollIOLoop`; on other
+        implementations this method does nothing.
+
+        .. versionadded:: 4.4
+        """
+        pass
+
+    def disable_stats(self):
+        """Stops collecting statistics and discards them.
+
+        .. versionadded:: 4.4
+        """
+        pass
+
+    def get_stats(self):
+        """Returns the statistics collected since `enable_stats`.
+
+        The result is a dictionary of plain numbers, lists and
+        dictionaries that may be passed directly to
+        `.RequestHandler.write` to serve it as JSON, e.g. from a
+        ``/debug/ioloop`` handler::
+
+            class IOLoopStatsHandler(RequestHandler):
+                def get(self):
+                    self.write(IOLoop.current().get_stats())
+
+        Returns None if statistics are not enabled or are not
+        supported by this `IOLoop` implementation.
+
+        .. versionadded:: 4.4
+        """
+        return None
+
     def start(self):
         """Starts the I/O loop.
 
@@ -551,6 +599,12 @@ class IOLoop(Configurable):
 
         To add a callback from a signal handler, see
         `add_callback_from_signal`.
+
+        .. versionchanged:: 4.4
+           When no `.StackContext` is active, `PollIOLoop` no longer
+           wraps the callback with `.stack_context.wrap`, which makes
+           callbacks (and coroutines) in applications that do not use
+           stack contexts cheaper.
         """
         raise NotImplementedError()
 
@@ -591,13 +645,20 @@ class IOLoop(Configurable):
         future.add_done_callback(
             lambda future: self.add_callback(callback, future))
 
-    def _run_callback(self, callback):
+    def _run_callback(self, callback, args=()):
         """Runs a callback with error handling.
 
         For use in subclasses.
         """
+        contexts = stack_context._state.contexts
         try:
-            ret = callback()
+            try:
+                ret = callback(*args)
+            finally:
+                # Callbacks are not always wrapped with
+                # `.stack_context.wrap` (see `PollIOLoop.add_callback`),
+                # so restore the contexts here in case one leaked out.
+                stack_context._state.contexts = contexts
             if ret is not None:
                 from tornado import gen
                 # Functions that return Futures typically swallow all
@@ -676,8 +737,20 @@ class PollIOLoop(IOLoop):
     For concrete implementations, see `tornado.platform.epoll.EPollIOLoop`
     (Linux), `tornado.platform.kqueue.KQueueIOLoop` (BSD and Mac), or
     `tornado.platform.select.SelectIOLoop` (all platforms).
+
+    Pending timeouts are kept in a heap by default.  Pass
+    ``timer_wheel=True`` (e.g. ``IOLoop.configure(EPollIOLoop,
+    timer_wheel=True)``) to use a hierarchical timing wheel instead,
+    which adds and removes timeouts in constant time and frees removed
+    timeouts immediately.  This helps applications with very many
+    timeouts that are almost always removed before they run (such as
+    the idle timeouts of keep-alive connections).  Timeouts run at the
+    same times and in the same order with either implementation.
+
+    .. versionchanged:: 4.4
+       Added the ``timer_wheel`` argument.
     """
-    def initialize(self, impl, time_func=None, **kwargs):
+    def initialize(self, impl, time_func=None, timer_wheel=False, **kwargs):
         super(PollIOLoop, self).initialize(**kwargs)
         self._impl = impl
         if hasattr(self._impl, 'fileno'):
@@ -687,13 +760,16 @@ class PollIOLoop(IOLoop):
         self._events = {}
         self._callbacks = []
         self._callback_lock = threading.Lock()
-        self._timeouts = []
-        self._cancellations = 0
+        if timer_wheel:
+            self._timeouts = _TimerWheel(self.time())
+        else:
+            self._timeouts = _TimeoutHeap()
         self._running = False
         self._stopped = False
         self._closing = False
         self._thread_ident = None
         self._blocking_signal_threshold = None
+        self._stats = None
         self._timeout_counter = itertools.count()
 
         # Create a pipe that we send bogus data to when we want to wake
@@ -743,6 +819,17 @@ class PollIOLoop(IOLoop):
             signal.signal(signal.SIGALRM,
                           action if action is not None else signal.SIG_DFL)
 
+    def enable_stats(self, slowest=10):
+        self._stats = _IOLoopStats(slowest)
+
+    def disable_stats(self):
+        self._stats = None
+
+    def get_stats(self):
+        if self._stats is None:
+            return None
+        return self._stats.to_dict(self)
+
     def start(self):
         if self._running:
             raise RuntimeError("IOLoop is already running")
@@ -754,6 +841,12 @@ class PollIOLoop(IOLoop):
         IOLoop._current.instance = self
         self._thread_ident = thread.get_ident()
         self._running = True
+        # Callbacks added while no StackContext was active are stored
+        # unwrapped (see add_callback), so run everything with no
+        # active contexts, as `.stack_context.wrap` would have.
+        # `_run_callback` restores this state after every callback.
+        old_contexts = stack_context._state.contexts
+        stack_context._state.contexts = (tuple(), None)
 
         # signal.set_wakeup_fd closes a race condition in event loops:
         # a signal may arrive at the beginning of select/poll/etc
@@ -802,35 +895,22 @@ class PollIOLoop(IOLoop):
                 # schedule anything in this iteration.
                 due_timeouts = []
                 if self._timeouts:
-                    now = self.time()
-                    while self._timeouts:
-                        if self._timeouts[0].callback is None:
-                            # The timeout was cancelled.  Note that the
-                            # cancellation check is repeated below for timeouts
-                            # that are cancelled by another timeout or callback.
-                            heapq.heappop(self._timeouts)
-                            self._cancellations -= 1
-                        elif self._timeouts[0].deadline <= now:
-                            due_timeouts.append(heapq.heappop(self._timeouts))
-                        else:
-                            break
-                    if (self._cancellations > 512
-                            and self._cancellations > (len(self._timeouts) >> 1)):
-                        # Clean up the timeout queue when it gets large and it's
-                        # more than half cancellations.
-                        self._cancellations = 0
-                        self._timeouts = [x for x in self._timeouts
-                                          if x.callback is not None]
-                        heapq.heapify(self._timeouts)
-
-                for callback in callbacks:
-                    self._run_callback(callback)
-                for timeout in due_timeouts:
-                    if timeout.callback is not None:
-                        self._run_callback(timeout.callback)
+                    due_timeouts = self._timeouts.pop_due(self.time())
+
+                stats = self._stats
+                if stats is None:
+                    for callback, args in callbacks:
+                        self._run_callback(callback, args)
+                    for timeout in due_timeouts:
+                        if timeout.callback is not None:
+                            self._run_callback(timeout.callback, timeout.args)
+                else:
+                    stats.iterations += 1
+                    stats.run_callbacks(self, callbacks)
+                    stats.run_timeouts(self, due_timeouts)
                 # Closures may be holding on to a lot of memory, so allow
                 # them to be freed before we go into our poll wait.
-                callbacks = callback = due_timeouts = timeout = None
+                callbacks = callback = args = due_timeouts = timeout = None
 
                 if self._callbacks:
                     # If any callbacks or timeouts called add_callback,
@@ -840,7 +920,7 @@ class PollIOLoop(IOLoop):
                     # If there are any timeouts, schedule the first one.
                     # Use self.time() instead of 'now' to account for time
                     # spent running callbacks.
-                    poll_timeout = self._timeouts[0].deadline - self.time()
+                    poll_timeout = self._timeouts.next_deadline() - self.time()
                     poll_timeout = max(0, min(poll_timeout, _POLL_TIMEOUT))
                 else:
                     # No timeouts and no callbacks, so use the default.
@@ -855,7 +935,12 @@ class PollIOLoop(IOLoop):
                     signal.setitimer(signal.ITIMER_REAL, 0, 0)
 
                 try:
-                    event_pairs = self._impl.poll(poll_timeout)
+                    if stats is None:
+                        event_pairs = self._impl.poll(poll_timeout)
+                    else:
+                        start = _stats_clock()
+                        event_pairs = self._impl.poll(poll_timeout)
+                        stats.poll_done(_stats_clock() - start, event_pairs)
                 except Exception as e:
                     # Depending on python version and IOLoop implementation,
                     # different exception types may be thrown and there are
@@ -878,6 +963,8 @@ class PollIOLoop(IOLoop):
                 self._events.update(event_pairs)
                 while self._events:
                     fd, events = self._events.popitem()
+                    if stats is not None:
+                        start = _stats_clock()
                     try:
                         fd_obj, handler_func = self._handlers[fd]
                         handler_func(fd_obj, events)
@@ -889,7 +976,9 @@ class PollIOLoop(IOLoop):
                             self.handle_callback_exception(self._handlers.get(fd))
                     except Exception:
                         self.handle_callback_exception(self._handlers.get(fd))
-                fd_obj = handler_func = None
+                    if stats is not None:
+                        stats.handler_done(self, fd, _stats_clock() - start)
+                fd_obj = handler_func = stats = None
 
         finally:
             # reset the stopped flag so another start/stop pair can be issued
@@ -897,6 +986,7 @@ class PollIOLoop(IOLoop):
             if self._blocking_signal_threshold is not None:
                 signal.setitimer(signal.ITIMER_REAL, 0, 0)
             IOLoop._current.instance = old_current
+            stack_context._state.contexts = old_contexts
             if old_wakeup_fd is not None:
                 signal.set_wakeup_fd(old_wakeup_fd)
 
@@ -909,23 +999,45 @@ class PollIOLoop(IOLoop):
         return self.time_func()
 
     def call_at(self, deadline, callback, *args, **kwargs):
-        timeout = _Timeout(
-            deadline,
-            functools.partial(stack_context.wrap(callback), *args, **kwargs),
-            self)
-        heapq.heappush(self._timeouts, timeout)
+        callback, args = self._prepare_callback(callback, args, kwargs)
+        timeout = _Timeout(deadline, callback, self, args)
+        self._timeouts.add(timeout)
         return timeout
 
     def remove_timeout(self, timeout):
-        # Removing from a heap is complicated, so just leave the defunct
-        # timeout object in the queue (see discussion in
-        # http://docs.python.org/library/heapq.html).
-        # If this turns out to be a problem, we could add a garbage
-        # collection pass whenever there are too many dead timeouts.
-        timeout.callback = None
-        self._cancellations += 1
+        self._timeouts.remove(timeout)
 
     def add_callback(self, callback, *args, **kwargs):
+        callback, args = self._prepare_callback(callback, args, kwargs)
+        self._add_callback(callback, args)
+
+    def add_future(self, future, callback):
+        if stack_context._contexts_active():
+            super(PollIOLoop, self).add_future(future, callback)
+            return
+        assert is_future(future)
+        # The future may be resolved in another StackContext (or
+        # thread); the callback must not pick up that context, so
+        # bypass the wrapping in add_callback.
+        future.add_done_callback(
+            lambda future: self._add_callback(callback, (future,)))
+
+    def _prepare_callback(self, callback, args, kwargs):
+        """Returns a ``(callback, args)`` pair for `_add_callback` or
+        `_Timeout`.
+
+        The callback is only wrapped with `.stack_context.wrap` when a
+        `.StackContext` is active, and ``functools.partial`` is only
+        used for keyword arguments.  Coroutine-based code rarely needs
+        either.
+        """
+        if stack_context._contexts_active():
+            callback = stack_context.wrap(callback)
+        if kwargs:
+            return functools.partial(callback, *args, **kwargs), ()
+        return callback, args
+
+    def _add_callback(self, callback, args):
         if thread.get_ident() != self._thread_ident:
             # If we're not on the IOLoop's thread, we need to synchronize
             # with other threads, or waking logic will induce a race.
@@ -933,8 +1045,7 @@ class PollIOLoop(IOLoop):
                 if self._closing:
                     return
                 list_empty = not self._callbacks
-                self._callbacks.append(functools.partial(
-                    stack_context.wrap(callback), *args, **kwargs))
+                self._callbacks.append((callback, args))
                 if list_empty:
                     # If we're not in the IOLoop's thread, and we added the
                     # first callback to an empty list, we may need to wake it
@@ -954,26 +1065,185 @@ class PollIOLoop(IOLoop):
             # _callback_lock block in IOLoop.start, we may modify
             # either the old or new version of self._callbacks, but
             # either way will work.
-            self._callbacks.append(functools.partial(
-                stack_context.wrap(callback), *args, **kwargs))
+            self._callbacks.append((callback, args))
 
     def add_callback_from_signal(self, callback, *args, **kwargs):
         with stack_context.NullContext():
             self.add_callback(callback, *args, **kwargs)
 
 
+class _LatencyHistogram(object):
+    """Counts durations in logarithmic buckets for `IOLoop.get_stats`."""
+
+    # Upper bounds of the buckets, in seconds.  Longer durations are
+    # counted in a final, unbounded bucket.
+    BOUNDS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    __slots__ = ['count', 'total', 'max', 'buckets']
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+
+    def to_dict(self):
+        return dict(
+            count=self.count,
+            total=self.total,
+            max=self.max,
+            mean=self.total / self.count if self.count else 0.0,
+            buckets=[[bound, n] for bound, n in
+                     zip(self.BOUNDS + (None,), self.buckets)])
+
+
+def _callback_name(callback):
+    """Returns the qualified name of the function behind ``callback``.
+
+    Looks through `functools.partial` objects and `.stack_context.wrap`
+    wrappers.
+    """
+    while True:
+        if isinstance(callback, functools.partial):
+            callback = callback.func
+        elif hasattr(callback, '__wrapped__'):
+            callback = callback.__wrapped__
+        else:
+            break
+    name = getattr(callback, '__qualname__', None)
+    if name is None:
+        name = getattr(callback, '__name__', None)
+        if name is None:
+            return repr(callback)
+        cls = getattr(callback, 'im_class', None)  # py2 bound method
+        if cls is not None:
+            name = '%s.%s' % (cls.__name__, name)
+    module = getattr(callback, '__module__', None)
+    if module:
+        return '%s.%s' % (module, name)
+    return name
+
+
+class _IOLoopStats(object):
+    """Statistics collected by `PollIOLoop` while `IOLoop.enable_stats`
+    is in effect.
+    """
+    def __init__(self, slowest):
+        self.started = time.time()
+        self.iterations = 0
+        self.max_callbacks = 0
+        self.max_fd_events = 0
+        self.poll = _LatencyHistogram()
+        self.callbacks = _LatencyHistogram()
+        self.timeouts = _LatencyHistogram()
+        self.handlers = _LatencyHistogram()
+        self.loop_lag = _LatencyHistogram()
+        self.fd_events = {}
+        # Min-heap of (seconds, tiebreaker, name) holding the slowest
+        # runs seen so far.  Names are only computed for runs that make
+        # it into the heap.
+        self.slowest = slowest
+        self._slowest = []
+        self._counter = itertools.count()
+
+    def poll_done(self, elapsed, event_pairs):
+        self.poll.add(elapsed)
+        if len(event_pairs) > self.max_fd_events:
+            self.max_fd_events = len(event_pairs)
+
+    def run_callbacks(self, io_loop, callbacks):
+        if len(callbacks) > self.max_callbacks:
+            self.max_callbacks = len(callbacks)
+        for callback, args in callbacks:
+            start = _stats_clock()
+            io_loop._run_callback(callback, args)
+            elapsed = _stats_clock() - start
+            self.callbacks.add(elapsed)
+            self._record_slow(elapsed, callback)
+
+    def run_timeouts(self, io_loop, timeouts):
+        for timeout in timeouts:
+            if timeout.callback is None:
+                continue
+            self.loop_lag.add(max(0.0, io_loop.time() - timeout.deadline))
+            start = _stats_clock()
+            io_loop._run_callback(timeout.callback, timeout.args)
+            elapsed = _stats_clock() - start
+            self.timeouts.add(elapsed)
+            self._record_slow(elapsed, timeout.callback)
+
+    def handler_done(self, io_loop, fd, elapsed):
+        self.handlers.add(elapsed)
+        self.fd_events[fd] = self.fd_events.get(fd, 0) + 1
+        if self._is_slow(elapsed):
+            handler = io_loop._handlers.get(fd)
+            if handler is None:
+                # The handler removed itself.
+                name = 'fd %r' % (fd,)
+            else:
+                name = _callback_name(handler[1])
+            self._push_slow(elapsed, name)
+
+    def _is_slow(self, elapsed):
+        return (len(self._slowest) < self.slowest or
+                (self._slowest and elapsed > self._slowest[0][0]))
+
+    def _record_slow(self, elapsed, callback):
+        if self._is_slow(elapsed):
+            self._push_slow(elapsed, _callback_name(callback))
+
+    def _push_slow(self, elapsed, name):
+        entry = (elapsed, next(self._counter), name)
+        if len(self._slowest) < self.slowest:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heapreplace(self._slowest, entry)
+
+    def to_dict(self, io_loop):
+        busiest = sorted(self.fd_events.items(), key=lambda item: -item[1])
+        return dict(
+            started=self.started,
+            iterations=self.iterations,
+            max_callbacks_per_iteration=self.max_callbacks,
+            max_fd_events_per_iteration=self.max_fd_events,
+            pending_callbacks=len(io_loop._callbacks or ()),
+            pending_timeouts=len(io_loop._timeouts or ()),
+            handlers=len(io_loop._handlers),
+            phases=dict(
+                poll=self.poll.to_dict(),
+                callbacks=self.callbacks.to_dict(),
+                timeouts=self.timeouts.to_dict(),
+                handlers=self.handlers.to_dict()),
+            loop_lag=self.loop_lag.to_dict(),
+            slowest_callbacks=[
+                dict(name=name, seconds=seconds)
+                for seconds, _, name in sorted(self._slowest, reverse=True)],
+            busiest_fds=[dict(fd=fd, events=n)
+                         for fd, n in busiest[:self.slowest]])
+
+
 class _Timeout(object):
     """An IOLoop timeout, a UNIX timestamp and a callback"""
 
     # Reduce memory overhead when there are lots of pending callbacks
-    __slots__ = ['deadline', 'callback', 'tiebreaker']
+    __slots__ = ['deadline', 'callback', 'args', 'tiebreaker', 'bucket']
 
-    def __init__(self, deadline, callback, io_loop):
+    def __init__(self, deadline, callback, io_loop, args=()):
         if not isinstance(deadline, numbers.Real):
             raise TypeError("Unsupported deadline %r" % deadline)
         self.deadline = deadline
         self.callback = callback
+        self.args = args
         self.tiebreaker = next(io_loop._timeout_counter)
+        # The _TimerWheel slot holding this timeout, if any.
+        self.bucket = None
 
     # Comparison methods to sort by deadline, with object id as a tiebreaker
     # to guarantee a consistent ordering.  The heapq module uses __le__
@@ -988,6 +1258,248 @@ class _Timeout(object):
                 (other.deadline, other.tiebreaker))
 
 
+class _TimeoutHeap(object):
+    """The default timeout queue for `PollIOLoop`: a heap of `_Timeout`.
+
+    Removing from a heap is complicated, so removed timeouts are just
+    marked as cancelled and left in the heap (see discussion in
+    http://docs.python.org/library/heapq.html) until they reach the top
+    or there are enough of them to make rebuilding the heap worthwhile.
+    """
+    def __init__(self):
+        self._heap = []
+        self._cancellations = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def add(self, timeout):
+        heapq.heappush(self._heap, timeout)
+
+    def remove(self, timeout):
+        timeout.callback = None
+        timeout.args = ()
+        self._cancellations += 1
+
+    def pop_due(self, now):
+        """Removes and returns the timeouts due at ``now``, in order."""
+        due_timeouts = []
+        heap = self._heap
+        while heap:
+            if heap[0].callback is None:
+                # The timeout was cancelled.  Note that the
+                # cancellation check is repeated in the IOLoop for timeouts
+                # that are cancelled by another timeout or callback.
+                heapq.heappop(heap)
+                self._cancellations -= 1
+            elif heap[0].deadline <= now:
+                due_timeouts.append(heapq.heappop(heap))
+            else:
+                break
+        if (self._cancellations > 512 and
+                self._cancellations > (len(heap) >> 1)):
+            # Clean up the timeout queue when it gets large and it's
+            # more than half cancellations.
+            self._cancellations = 0
+            self._heap = [x for x in heap if x.callback is not None]
+            heapq.heapify(self._heap)
+        return due_timeouts
+
+    def next_deadline(self):
+        """Returns the time by which the IOLoop must next call `pop_due`."""
+        return self._heap[0].deadline
+
+
+# Marks a _Timeout that has been moved from the wheel to the ready heap.
+_READY = object()
+
+
+class _TimerWheel(object):
+    """A hierarchical timing wheel of `_Timeout` objects.
+
+    Time is divided into ticks of ``resolution`` seconds.  There are
+    four wheels of 256 slots each: the first has one slot per tick, and
+    each of the others has one slot per full turn of the wheel below it.
+    A timeout is put in the slot for its tick on the lowest wheel whose
+    range covers it; whenever a wheel completes a turn, the next slot of
+    the wheel above is emptied into the lower wheels.
+
+    When a tick of the first wheel starts (or earlier, if the IOLoop
+    would otherwise go to sleep), its timeouts are moved to a small
+    heap, from which they are returned in deadline order once they are
+    due.  So the resolution only affects the bookkeeping, not when or
+    in which order timeouts run.
+
+    Slots are sets, so adding and removing a timeout takes constant
+    time, and removed timeouts are released immediately (only those
+    already in the heap are removed lazily, as in `_TimeoutHeap`).
+    """
+    _BITS = 8
+    _SLOTS = 1 << _BITS
+    _MASK = _SLOTS - 1
+    _LEVELS = 4
+
+    def __init__(self, now, resolution=0.01):
+        self._resolution = resolution
+        # The next tick whose slot has not yet been moved to the heap.
+        self._current = int(now / resolution)
+        # One dict per wheel, from slot index to a set of timeouts.
+        # Slots are created as needed.
+        self._wheels = [{} for i in range(self._LEVELS)]
+        self._count = 0
+        self._ready = []
+        # The last tick moved to the heap ahead of time by
+        # next_deadline; later timeouts up to this tick go straight to
+        # the heap so that it always holds the earliest deadline.
+        self._ready_tick = self._current - 1
+        self._cancellations = 0
+
+    def __len__(self):
+        return self._count + len(self._ready)
+
+    def add(self, timeout):
+        tick = int(timeout.deadline / self._resolution)
+        delta = tick - self._current
+        if delta < 0 or tick <= self._ready_tick:
+            timeout.bucket = _READY
+            heapq.heappush(self._ready, timeout)
+            return
+        # Find the lowest wheel that reaches the tick (unrolled for the
+        # fixed _BITS and _LEVELS, since this is the hot path).
+        if delta < 0x100:
+            level = 0
+            index = tick & 0xff
+        elif delta < 0x10000:
+            level = 1
+            index = (tick >> 8) & 0xff
+        else:
+            level = 2 if delta < 0x1000000 else 3
+            if delta >= 0x100000000:
+                # Further away than the wheels reach; park the timeout in
+                # the furthest slot and place it again when it gets there.
+                tick = self._current + 0xffffffff
+            index = (tick >> (8 * level)) & 0xff
+        wheel = self._wheels[level]
+        bucket = wheel.get(index)
+        if bucket is None:
+            bucket = wheel[index] = set()
+        bucket.add(timeout)
+        timeout.bucket = bucket
+        self._count += 1
+
+    def remove(self, timeout):
+        bucket = timeout.bucket
+        timeout.callback = None
+        timeout.args = ()
+        if bucket is _READY:
+            self._cancellations += 1
+        elif bucket is not None:
+            bucket.discard(timeout)
+            self._count -= 1
+        timeout.bucket = None
+
+    def pop_due(self, now):
+        """Removes and returns the timeouts due at ``now``, in order."""
+        # Allow for rounding errors when ``now`` is the start of a tick
+        # returned by next_deadline (moving a tick's timeouts to the
+        # heap a little early is harmless).
+        self._advance(int(now / self._resolution + 0.001))
+        due_timeouts = []
+        ready = self._ready
+        while ready:
+            if ready[0].callback is None:
+                heapq.heappop(ready).bucket = None
+                self._cancellations -= 1
+            elif ready[0].deadline <= now:
+                timeout = heapq.heappop(ready)
+                timeout.bucket = None
+                due_timeouts.append(timeout)
+            else:
+                break
+        if (self._cancellations > 512 and
+                self._cancellations > (len(ready) >> 1)):
+            self._cancellations = 0
+            self._ready = [x for x in ready if x.callback is not None]
+            heapq.heapify(self._ready)
+        return due_timeouts
+
+    def next_deadline(self):
+        """Returns the time by which the IOLoop must next call `pop_due`."""
+        if not self._ready:
+            tick, level, index = self._next_slot()
+            if level > 0:
+                # Wake up to empty the slot into the lower wheels.
+                return tick * self._resolution
+            # Move the timeouts of the next occupied tick to the heap
+            # now, so the IOLoop can sleep until the first of them.
+            self._make_ready(self._wheels[0].pop(index))
+            self._ready_tick = tick
+        return self._ready[0].deadline
+
+    def _next_slot(self):
+        # Find the first tick at which an occupied slot will be moved
+        # to the heap or emptied into a lower wheel.
+        best = (None, None, None)
+        for level, wheel in enumerate(self._wheels):
+            shift = self._BITS * level
+            # The first turn of this wheel's slots at or after _current.
+            start = (self._current + (1 << shift) - 1) >> shift
+            if best[0] is not None and best[0] <= start << shift:
+                # Slots of this wheel (or higher) are emptied later.
+                break
+            for index, bucket in wheel.items():
+                if bucket:
+                    tick = (start + ((index - start) & self._MASK)) << shift
+                    if best[0] is None or tick < best[0]:
+                        best = (tick, level, index)
+        return best
+
+    def _make_ready(self, bucket):
+        self._count -= len(bucket)
+        for timeout in bucket:
+            timeout.bucket = _READY
+            heapq.heappush(self._ready, timeout)
+
+    def _advance(self, target):
+        # Move the slots of all ticks up to and including ``target``
+        # to the ready heap.
+        if target - self._current > self._SLOTS ** 2:
+            # After a long pause it is cheaper to place every timeout
+            # again than to go through all the ticks in between.
+            timeouts = [timeout for wheel in self._wheels
+                        for bucket in wheel.values() for timeout in bucket]
+            self._wheels = [{} for i in range(self._LEVELS)]
+            self._count = 0
+            self._current = target + 1
+            for timeout in timeouts:
+                self.add(timeout)
+            return
+        first_wheel = self._wheels[0]
+        while self._current <= target:
+            index = self._current & self._MASK
+            if index == 0:
+                self._cascade()
+            bucket = first_wheel.pop(index, None)
+            if bucket:
+                self._make_ready(bucket)
+            self._current += 1
+
+    def _cascade(self):
+        # The first wheel has completed a turn: empty the current slot
+        # of each higher wheel that has also completed a turn into the
+        # wheels below it, highest first.
+        for level in range(self._LEVELS - 1, 0, -1):
+            shift = self._BITS * level
+            if self._current & ((1 << shift) - 1):
+                continue
+            index = (self._current >> shift) & self._MASK
+            bucket = self._wheels[level].pop(index, None)
+            if bucket:
+                self._count -= len(bucket)
+                for timeout in bucket:
+                    self.add(timeout)
+
+
 class PeriodicCallback(object):
     """Schedules the given callback to be called periodically.
 
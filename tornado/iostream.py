@@ -82,6 +82,24 @@ _ERRNO_INPROGRESS = (errno.EINPROGRESS,)
 if hasattr(errno, "WSAEINPROGRESS"):
     _ERRNO_INPROGRESS += (errno.WSAEINPROGRESS,)
 
+# On windows, socket.send blows up if given a write buffer that's too
+# large, instead of just returning the number of bytes it was able to
+# process.  Therefore we must not call socket.send with more than 128KB
+# at a time.
+_WRITE_CHUNK_SIZE = 128 * 1024
+
+# The most buffers passed to a single sendmsg call.  POSIX only
+# guarantees an IOV_MAX of 16, but every platform with sendmsg allows
+# at least 1024.
+_MAX_SENDMSG_BUFFERS = 64
+
+try:
+    # Python 2's re module accepts old-style buffers but not memoryviews.
+    _buffer_from = buffer
+except NameError:
+    def _buffer_from(data, offset):
+        return memoryview(data)[offset:]
+
 
 class StreamClosedError(IOError):
     """Exception raised by `IOStream` methods when the stream is closed.
@@ -158,11 +176,29 @@ class BaseIOStream(object):
                                    self.max_buffer_size // 2)
         self.max_write_buffer_size = max_write_buffer_size
         self.error = None
-        self._read_buffer = collections.deque()
+        # Incoming data is appended to a single bytearray; the first
+        # _read_buffer_pos bytes of it have already been consumed.
+        self._read_buffer = bytearray()
+        self._read_buffer_pos = 0
+        # While a read_into() is pending, _read_buffer is the caller's
+        # buffer and any data that doesn't fit in it is kept here.
+        self._user_read_buffer = False
+        self._after_user_read_buffer = None
+        # Outgoing data is kept as the chunks passed to write(); the
+        # first _write_buffer_pos bytes of the first chunk have already
+        # been sent.
         self._write_buffer = collections.deque()
+        self._write_buffer_pos = 0
         self._read_buffer_size = 0
         self._write_buffer_size = 0
-        self._write_buffer_frozen = False
+        # See set_write_watermarks.  _write_paused is set when the write
+        # buffer goes over the high watermark and cleared when it drains
+        # to the low watermark.
+        self._write_high_watermark = None
+        self._write_low_watermark = 0
+        self._write_overflow = None
+        self._write_paused = False
+        self._drain_waiters = []  # callbacks and futures
         self._read_delimiter = None
         self._read_regex = None
         self._read_max_bytes = None
@@ -202,6 +238,8 @@ class BaseIOStream(object):
     def write_to_fd(self, data):
         """Attempts to write ``data`` to the underlying file.
 
+        ``data`` may be a `memoryview` into a larger buffer.
+
         Returns the number of bytes written.
         """
         raise NotImplementedError()
@@ -216,6 +254,30 @@ class BaseIOStream(object):
         """
         raise NotImplementedError()
 
+    def read_from_fd_into(self, buf):
+        """Attempts to read from the underlying file into ``buf``.
+
+        ``buf`` is a writable `memoryview`.  Returns ``None`` if there
+        was nothing to read, otherwise the number of bytes read.
+
+        The default implementation copies the result of `read_from_fd`;
+        subclasses that can read directly into a buffer (such as
+        `IOStream` with ``recv_into``) should override it.
+
+        .. versionadded:: 4.4
+        """
+        chunk = self.read_from_fd()
+        if chunk is None:
+            return None
+        n = min(len(chunk), len(buf))
+        buf[:n] = chunk[:n]
+        if n < len(chunk):
+            # Keep whatever didn't fit for the next read.
+            if self._after_user_read_buffer is None:
+                self._after_user_read_buffer = bytearray()
+            self._after_user_read_buffer += chunk[n:]
+        return n
+
     def get_fd_error(self):
         """Returns information about any error on the underlying file.
 
@@ -321,6 +383,54 @@ class BaseIOStream(object):
             raise
         return future
 
+    def read_into(self, buf, callback=None, partial=False):
+        """Asynchronously read a number of bytes into ``buf``.
+
+        ``buf`` must be a writable buffer such as a `bytearray` or a
+        `memoryview` of one; ``len(buf)`` bytes are read.  Data that is
+        already buffered is copied into ``buf`` first, and the rest is
+        read from the socket directly into ``buf`` without going
+        through the stream's own buffer.
+
+        The result (passed to the callback or the `.Future`) is the
+        number of bytes read.  This is ``len(buf)`` unless ``partial``
+        is true, in which case the read completes as soon as any bytes
+        are available.
+
+        ``buf`` must not be used or resized until the read completes.
+
+        .. versionadded:: 4.4
+        """
+        future = self._set_read_callback(callback)
+        buf = memoryview(buf)
+        n = len(buf)
+        # First copy the data that is already in the read buffer.
+        available_bytes = self._read_buffer_size
+        pos = self._read_buffer_pos
+        if available_bytes >= n:
+            end = pos + n
+            buf[:] = memoryview(self._read_buffer)[pos:end]
+            del self._read_buffer[:end]
+            self._after_user_read_buffer = self._read_buffer
+        elif available_bytes > 0:
+            buf[:available_bytes] = memoryview(self._read_buffer)[pos:]
+        # Then make the caller's buffer our read buffer until the read
+        # is complete; the original has been saved if it had any data
+        # left.
+        self._user_read_buffer = True
+        self._read_buffer = buf
+        self._read_buffer_pos = 0
+        self._read_buffer_size = available_bytes
+        self._read_bytes = n
+        self._read_partial = partial
+        try:
+            self._try_inline_read()
+        except:
+            if future is not None:
+                future.add_done_callback(lambda f: f.exception())
+            raise
+        return future
+
     def read_until_close(self, callback=None, streaming_callback=None):
         """Asynchronously reads all data from the socket until it is closed.
 
@@ -381,13 +491,109 @@ class BaseIOStream(object):
             if (self.max_write_buffer_size is not None and
                     self._write_buffer_size + len(data) > self.max_write_buffer_size):
                 raise StreamBufferFullError("Reached maximum write buffer size")
-            # Break up large contiguous strings before inserting them in the
-            # write buffer, so we don't have to recopy the entire thing
-            # as we slice off pieces to send to the socket.
-            WRITE_BUFFER_CHUNK_SIZE = 128 * 1024
-            for i in range(0, len(data), WRITE_BUFFER_CHUNK_SIZE):
-                self._write_buffer.append(data[i:i + WRITE_BUFFER_CHUNK_SIZE])
+            if self._write_high_watermark is not None:
+                # A single large write into a buffer below the watermark
+                # is always accepted; only writes to an already full
+                # buffer overflow.
+                if (self._write_overflow == "close" and
+                        self._write_buffer_size >= self._write_high_watermark):
+                    self.close(exc_info=(
+                        StreamBufferFullError,
+                        StreamBufferFullError(
+                            "Write buffer exceeded the high watermark"),
+                        None))
+                    self._check_closed()
+                if (self._write_buffer_size + len(data) >
+                        self._write_high_watermark):
+                    self._write_paused = True
+            # The data is never copied or merged; partial writes just
+            # advance _write_buffer_pos.
+            self._write_buffer.append(data)
             self._write_buffer_size += len(data)
+        return self._start_write(callback)
+
+    def set_write_watermarks(self, high, low=None, overflow=None):
+        """Sets the write buffer watermarks used for flow control.
+
+        When a `write` takes the amount of buffered outgoing data over
+        ``high`` bytes, the stream is considered full until the buffer
+        has drained to ``low`` bytes (default ``high // 2``).  Use
+        `wait_for_drain` to wait for that.  ``overflow`` selects what
+        happens to a write made while the buffer is already at or over
+        ``high``:
+
+        * ``None`` (the default): the data is buffered anyway.
+        * ``"close"``: the stream is closed, with a
+          `StreamBufferFullError` as its ``error``, and `write` raises
+          `StreamClosedError`.
+
+        (`.WebSocketHandler` additionally supports ``"drop"`` for whole
+        messages; a byte stream cannot drop data without corrupting it.)
+
+        Pass ``high=None`` to remove the watermarks again.
+
+        .. versionadded:: 4.4
+        """
+        if overflow not in (None, "close"):
+            raise ValueError("unknown overflow policy %r" % (overflow,))
+        if high is None:
+            self._write_high_watermark = None
+            self._write_low_watermark = 0
+            self._write_overflow = None
+            self._write_paused = False
+        else:
+            if low is None:
+                low = high // 2
+            if not 0 <= low <= high:
+                raise ValueError("low watermark must be between 0 and high")
+            self._write_high_watermark = high
+            self._write_low_watermark = low
+            self._write_overflow = overflow
+            self._write_paused = self._write_buffer_size > high
+        self._maybe_run_drain_callbacks()
+
+    def wait_for_drain(self, callback=None):
+        """Waits until the write buffer has drained.
+
+        Without watermarks (see `set_write_watermarks`) this means until
+        the write buffer is empty.  With watermarks, it means until the
+        buffer is no longer over the high watermark, or has drained to
+        the low watermark if it went over.  Writers can use this for
+        flow control by waiting for it after each write: it resolves
+        immediately while the buffer is below the high watermark.
+
+        If ``callback`` is given, it is run when the buffer has
+        drained; otherwise this method returns a `.Future`.
+
+        .. versionadded:: 4.4
+        """
+        self._check_closed()
+        if callback is not None:
+            waiter = stack_context.wrap(callback)
+            future = None
+        else:
+            waiter = future = TracebackFuture()
+        self._drain_waiters.append(waiter)
+        self._maybe_run_drain_callbacks()
+        return future
+
+    def _write_drained(self):
+        if self._write_high_watermark is None:
+            return not self._write_buffer
+        return not self._write_paused
+
+    def _maybe_run_drain_callbacks(self):
+        if not self._drain_waiters or not self._write_drained():
+            return
+        waiters = self._drain_waiters
+        self._drain_waiters = []
+        for waiter in waiters:
+            if isinstance(waiter, TracebackFuture):
+                waiter.set_result(None)
+            else:
+                self._run_callback(waiter)
+
+    def _start_write(self, callback):
         if callback is not None:
             self._write_callback = stack_context.wrap(callback)
             future = None
@@ -454,6 +660,9 @@ class BaseIOStream(object):
             if self._ssl_connect_future is not None:
                 futures.append(self._ssl_connect_future)
                 self._ssl_connect_future = None
+            futures.extend(waiter for waiter in self._drain_waiters
+                           if isinstance(waiter, TracebackFuture))
+            self._drain_waiters = []
             for future in futures:
                 future.set_exception(StreamClosedError(real_error=self.error))
             if self._close_callback is not None:
@@ -667,6 +876,17 @@ class BaseIOStream(object):
         return self._read_future
 
     def _run_read_callback(self, size, streaming):
+        if self._user_read_buffer:
+            # The data is already in the caller's buffer, so the result
+            # is just the byte count.  Restore our own buffer.
+            self._read_buffer = self._after_user_read_buffer or bytearray()
+            self._after_user_read_buffer = None
+            self._read_buffer_pos = 0
+            self._read_buffer_size = len(self._read_buffer)
+            self._user_read_buffer = False
+            result = size
+        else:
+            result = self._consume(size)
         if streaming:
             callback = self._streaming_callback
         else:
@@ -676,10 +896,10 @@ class BaseIOStream(object):
                 assert callback is None
                 future = self._read_future
                 self._read_future = None
-                future.set_result(self._consume(size))
+                future.set_result(result)
         if callback is not None:
             assert (self._read_future is None) or streaming
-            self._run_callback(callback, self._consume(size))
+            self._run_callback(callback, result)
         else:
             # If we scheduled a callback, we will add the error listener
             # afterwards.  If we didn't, we have to do it now.
@@ -727,7 +947,11 @@ class BaseIOStream(object):
         """
         while True:
             try:
-                chunk = self.read_from_fd()
+                if self._user_read_buffer:
+                    chunk = self.read_from_fd_into(
+                        self._read_buffer[self._read_buffer_size:])
+                else:
+                    chunk = self.read_from_fd()
             except (socket.error, IOError, OSError) as e:
                 if errno_from_exception(e) == errno.EINTR:
                     continue
@@ -743,7 +967,12 @@ class BaseIOStream(object):
             break
         if chunk is None:
             return 0
-        self._read_buffer.append(chunk)
+        if self._user_read_buffer:
+            # read_from_fd_into returns a byte count, and the caller's
+            # buffer can't overflow max_buffer_size.
+            self._read_buffer_size += chunk
+            return chunk
+        self._read_buffer += chunk
         self._read_buffer_size += len(chunk)
         if self._read_buffer_size > self.max_buffer_size:
             gen_log.error("Reached maximum read buffer size")
@@ -782,39 +1011,31 @@ class BaseIOStream(object):
             num_bytes = min(self._read_bytes, self._read_buffer_size)
             return num_bytes
         elif self._read_delimiter is not None:
-            # Multi-byte delimiters (e.g. '\r\n') may straddle two
-            # chunks in the read buffer, so we can't easily find them
-            # without collapsing the buffer.  However, since protocols
-            # using delimited reads (as opposed to reads of a known
-            # length) tend to be "line" oriented, the delimiter is likely
-            # to be in the first few chunks.  Merge the buffer gradually
-            # since large merges are relatively expensive and get undone in
-            # _consume().
-            if self._read_buffer:
-                while True:
-                    loc = self._read_buffer[0].find(self._read_delimiter)
-                    if loc != -1:
-                        delimiter_len = len(self._read_delimiter)
-                        self._check_max_bytes(self._read_delimiter,
-                                              loc + delimiter_len)
-                        return loc + delimiter_len
-                    if len(self._read_buffer) == 1:
-                        break
-                    _double_prefix(self._read_buffer)
+            # The buffer is contiguous, so delimiters that straddle two
+            # socket reads are found without merging anything.
+            if self._read_buffer_size:
+                loc = self._read_buffer.find(self._read_delimiter,
+                                             self._read_buffer_pos)
+                if loc != -1:
+                    loc -= self._read_buffer_pos
+                    delimiter_len = len(self._read_delimiter)
+                    self._check_max_bytes(self._read_delimiter,
+                                          loc + delimiter_len)
+                    return loc + delimiter_len
                 self._check_max_bytes(self._read_delimiter,
-                                      len(self._read_buffer[0]))
+                                      self._read_buffer_size)
         elif self._read_regex is not None:
-            if self._read_buffer:
-                while True:
-                    m = self._read_regex.search(self._read_buffer[0])
-                    if m is not None:
-                        self._check_max_bytes(self._read_regex, m.end())
-                        return m.end()
-                    if len(self._read_buffer) == 1:
-                        break
-                    _double_prefix(self._read_buffer)
+            if self._read_buffer_size:
+                # Search a zero-copy view of the unread data so that
+                # anchors and lookbehinds cannot see consumed bytes.
+                m = self._read_regex.search(
+                    _buffer_from(self._read_buffer, self._read_buffer_pos))
+                if m is not None:
+                    loc = m.end()
+                    self._check_max_bytes(self._read_regex, loc)
+                    return loc
                 self._check_max_bytes(self._read_regex,
-                                      len(self._read_buffer[0]))
+                                      self._read_buffer_size)
         return None
 
     def _check_max_bytes(self, delimiter, size):
@@ -824,35 +1045,40 @@ class BaseIOStream(object):
                 "delimiter %r not found within %d bytes" % (
                     delimiter, self._read_max_bytes))
 
+    def _write_from_buffer(self):
+        """Writes data from the front of the write buffer.
+
+        Returns the number of bytes written.  Subclasses that can send
+        several buffers in one system call may override this.
+        """
+        data = self._write_buffer[0]
+        pos = self._write_buffer_pos
+        if pos or len(data) > _WRITE_CHUNK_SIZE:
+            data = memoryview(data)[pos:pos + _WRITE_CHUNK_SIZE]
+        return self.write_to_fd(data)
+
+    def _advance_write_buffer(self, num_bytes):
+        """Drops ``num_bytes`` of sent data from the write buffer."""
+        self._write_buffer_size -= num_bytes
+        pos = self._write_buffer_pos + num_bytes
+        while self._write_buffer and pos >= len(self._write_buffer[0]):
+            pos -= len(self._write_buffer.popleft())
+        self._write_buffer_pos = pos
+
     def _handle_write(self):
         while self._write_buffer:
             try:
-                if not self._write_buffer_frozen:
-                    # On windows, socket.send blows up if given a
-                    # write buffer that's too large, instead of just
-                    # returning the number of bytes it was able to
-                    # process.  Therefore we must not call socket.send
-                    # with more than 128KB at a time.
-                    _merge_prefix(self._write_buffer, 128 * 1024)
-                num_bytes = self.write_to_fd(self._write_buffer[0])
+                # With OpenSSL, if we couldn't write the entire buffer,
+                # the next call to send must use the same memory.  Since
+                # the buffer is never merged or copied, retrying from
+                # _write_buffer_pos always does so.
+                # (http://bugs.python.org/issue8240)
+                num_bytes = self._write_from_buffer()
                 if num_bytes == 0:
-                    # With OpenSSL, if we couldn't write the entire buffer,
-                    # the very same string object must be used on the
-                    # next call to send.  Therefore we suppress
-                    # merging the write buffer after an incomplete send.
-                    # A cleaner solution would be to set
-                    # SSL_MODE_ACCEPT_MOVING_WRITE_BUFFER, but this is
-                    # not yet accessible from python
-                    # (http://bugs.python.org/issue8240)
-                    self._write_buffer_frozen = True
                     break
-                self._write_buffer_frozen = False
-                _merge_prefix(self._write_buffer, num_bytes)
-                self._write_buffer.popleft()
-                self._write_buffer_size -= num_bytes
+                self._advance_write_buffer(num_bytes)
             except (socket.error, IOError, OSError) as e:
                 if e.args[0] in _ERRNO_WOULDBLOCK:
-                    self._write_buffer_frozen = True
                     break
                 else:
                     if not self._is_connreset(e):
@@ -863,6 +1089,10 @@ class BaseIOStream(object):
                                         self.fileno(), e)
                     self.close(exc_info=True)
                     return
+        if (self._write_paused and
+                self._write_buffer_size <= self._write_low_watermark):
+            self._write_paused = False
+        self._maybe_run_drain_callbacks()
         if not self._write_buffer:
             if self._write_callback:
                 callback = self._write_callback
@@ -876,9 +1106,19 @@ class BaseIOStream(object):
     def _consume(self, loc):
         if loc == 0:
             return b""
-        _merge_prefix(self._read_buffer, loc)
+        assert loc <= self._read_buffer_size
+        # Copy the requested bytes out through a memoryview so the
+        # slice doesn't make an intermediate bytearray.
+        pos = self._read_buffer_pos
+        b = memoryview(self._read_buffer)[pos:pos + loc].tobytes()
+        self._read_buffer_pos += loc
         self._read_buffer_size -= loc
-        return self._read_buffer.popleft()
+        # Discard the consumed prefix once it is larger than the unread
+        # data, so the memmove it costs is amortized O(1) per byte.
+        if self._read_buffer_pos > self._read_buffer_size:
+            del self._read_buffer[:self._read_buffer_pos]
+            self._read_buffer_pos = 0
+        return b
 
     def _check_closed(self):
         if self.closed():
@@ -942,6 +1182,22 @@ class BaseIOStream(object):
                 errno_from_exception(exc) in _ERRNO_CONNRESET)
 
 
+class _FileSegment(object):
+    """A region of an open file queued in the write buffer.
+
+    Only `IOStream` puts these in the buffer (see `IOStream.write_file`).
+    """
+    __slots__ = ('fd', 'offset', 'count')
+
+    def __init__(self, fd, offset, count):
+        self.fd = fd
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+
 class IOStream(BaseIOStream):
     r"""Socket-based `IOStream` implementation.
 
@@ -1020,9 +1276,74 @@ class IOStream(BaseIOStream):
             return None
         return chunk
 
+    def read_from_fd_into(self, buf):
+        try:
+            n = self.socket.recv_into(buf)
+        except socket.error as e:
+            if e.args[0] in _ERRNO_WOULDBLOCK:
+                return None
+            else:
+                raise
+        if not n:
+            self.close()
+            return None
+        return n
+
     def write_to_fd(self, data):
         return self.socket.send(data)
 
+    def write_file(self, fd, offset, count, callback=None):
+        """Asynchronously write part of a file to this stream.
+
+        Sends ``count`` bytes of the file descriptor ``fd``, starting at
+        ``offset``, with `os.sendfile`, so the data is never copied into
+        Python.  It is queued after any data already passed to `write`,
+        and ``callback`` and the returned `.Future` behave as for `write`.
+
+        The stream does not take ownership of ``fd``; it must stay open
+        (and the file must not shrink) until the write has completed.
+        Requires `os.sendfile` (Python 3.3+ on Unix) and is not supported
+        by `SSLIOStream`.
+
+        .. versionadded:: 4.4
+        """
+        self._check_closed()
+        if count:
+            self._write_buffer.append(_FileSegment(fd, offset, count))
+            self._write_buffer_size += count
+        return self._start_write(callback)
+
+    def _write_from_buffer(self):
+        first = self._write_buffer[0]
+        if isinstance(first, _FileSegment):
+            pos = self._write_buffer_pos
+            num_bytes = os.sendfile(self.socket.fileno(), first.fd,
+                                    first.offset + pos, first.count - pos)
+            if num_bytes == 0:
+                raise IOError("file ended before %d bytes were sent" %
+                              first.count)
+            return num_bytes
+        if (len(self._write_buffer) == 1 or
+                isinstance(self._write_buffer[1], _FileSegment) or
+                not hasattr(self.socket, 'sendmsg')):
+            return super(IOStream, self)._write_from_buffer()
+        # Send several chunks at once with a scatter-gather write
+        # instead of joining them.
+        buffers = []
+        total = 0
+        for chunk in self._write_buffer:
+            if isinstance(chunk, _FileSegment):
+                break
+            buf = memoryview(chunk)
+            if not buffers and self._write_buffer_pos:
+                buf = buf[self._write_buffer_pos:]
+            buffers.append(buf)
+            total += len(buf)
+            if (len(buffers) >= _MAX_SENDMSG_BUFFERS or
+                    total >= _WRITE_CHUNK_SIZE):
+                break
+        return self.socket.sendmsg(buffers)
+
     def connect(self, address, callback=None, server_hostname=None):
         """Connects the socket to a remote address without blocking.
 
@@ -1127,7 +1448,7 @@ class IOStream(BaseIOStream):
                 self._write_callback or self._write_future or
                 self._connect_callback or self._connect_future or
                 self._pending_callbacks or self._closed or
-                self._read_buffer or self._write_buffer):
+                self._read_buffer_size or self._write_buffer):
             raise ValueError("IOStream is not idle; cannot convert to SSL")
         if ssl_options is None:
             if server_side:
@@ -1407,6 +1728,14 @@ class SSLIOStream(IOStream):
             self._run_ssl_connect_callback()
         return future
 
+    def write_file(self, fd, offset, count, callback=None):
+        # The data has to be encrypted, so it can't bypass userspace.
+        raise NotImplementedError("write_file is not supported on SSL streams")
+
+    def _write_from_buffer(self):
+        # SSL sockets do not support sendmsg.
+        return BaseIOStream._write_from_buffer(self)
+
     def write_to_fd(self, data):
         try:
             return self.socket.send(data)
@@ -1451,6 +1780,26 @@ class SSLIOStream(IOStream):
             return None
         return chunk
 
+    def read_from_fd_into(self, buf):
+        if self._ssl_accepting:
+            return None
+        try:
+            n = self.socket.recv_into(buf)
+        except ssl.SSLError as e:
+            if e.args[0] == ssl.SSL_ERROR_WANT_READ:
+                return None
+            else:
+                raise
+        except socket.error as e:
+            if e.args[0] in _ERRNO_WOULDBLOCK:
+                return None
+            else:
+                raise
+        if not n:
+            self.close()
+            return None
+        return n
+
     def _is_connreset(self, e):
         if isinstance(e, ssl.SSLError) and e.args[0] == ssl.SSL_ERROR_EOF:
             return True
@@ -1496,55 +1845,3 @@ class PipeIOStream(BaseIOStream):
             self.close()
             return None
         return chunk
-
-
-def _double_prefix(deque):
-    """Grow by doubling, but don't split the second chunk just because the
-    first one is small.
-    """
-    new_len = max(len(deque[0]) * 2,
-                  (len(deque[0]) + len(deque[1])))
-    _merge_prefix(deque, new_len)
-
-
-def _merge_prefix(deque, size):
-    """Replace the first entries in a deque of strings with a single
-    string of up to size bytes.
-
-    >>> d = collections.deque(['abc', 'de', 'fghi', 'j'])
-    >>> _merge_prefix(d, 5); print(d)
-    deque(['abcde', 'fghi', 'j'])
-
-    Strings will be split as necessary to reach the desired size.
-    >>> _merge_prefix(d, 7); print(d)
-    deque(['abcdefg', 'hi', 'j'])
-
-    >>> _merge_prefix(d, 3); print(d)
-    deque(['abc', 'defg', 'hi', 'j'])
-
-    >>> _merge_prefix(d, 100); print(d)
-    deque(['abcdefghij'])
-    """
-    if len(deque) == 1 and len(deque[0]) <= size:
-        return
-    prefix = []
-    remaining = size
-    while deque and remaining > 0:
-        chunk = deque.popleft()
-        if len(chunk) > remaining:
-            deque.appendleft(chunk[remaining:])
-            chunk = chunk[:remaining]
-        prefix.append(chunk)
-        remaining -= len(chunk)
-    # This data structure normally just contains byte strings, but
-    # the unittest gets messy if it doesn't use the default str() type,
-    # so do the merge based on the type of data that's actually present.
-    if prefix:
-        deque.appendleft(type(prefix[0])().join(prefix))
-    if not deque:
-        deque.appendleft(b"")
-
-
-def doctests():
-    import doctest
-    return doctest.DocTestSuite()
@@ -18,16 +18,19 @@
 
 from __future__ import absolute_import, division, print_function, with_statement
 
+import collections
 import errno
+import functools
 import os
 import sys
 import socket
 import stat
 
-from tornado.concurrent import dummy_executor, run_on_executor
+from tornado.concurrent import Future, dummy_executor, run_on_executor
+from tornado import gen
 from tornado.ioloop import IOLoop
 from tornado.platform.auto import set_close_exec
-from tornado.util import u, Configurable, errno_from_exception
+from tornado.util import u, Configurable, errno_from_exception, raise_exc_info
 
 try:
     import ssl
@@ -311,6 +314,7 @@ class Resolver(Configurable):
     * `tornado.netutil.BlockingResolver`
     * `tornado.netutil.ThreadedResolver`
     * `tornado.netutil.OverrideResolver`
+    * `tornado.netutil.CachingResolver`
     * `tornado.platform.twisted.TwistedResolver`
     * `tornado.platform.caresresolver.CaresResolver`
     """
@@ -458,6 +462,104 @@ class OverrideResolver(Resolver):
         return self.resolver.resolve(host, port, *args, **kwargs)
 
 
+class CachingResolver(Resolver):
+    """Wraps a resolver with a cache of recent results.
+
+    Successful lookups are cached for ``ttl`` seconds and failed ones
+    for ``negative_ttl`` seconds, keyed on ``(host, port, family)``.
+    Concurrent lookups of the same key share a single call to the
+    wrapped resolver.  When a cached result is used after
+    ``refresh_ratio`` of its ``ttl`` has passed, it is returned
+    immediately and refreshed in the background, so that names in
+    constant use do not stall on the resolver when they expire (pass
+    ``refresh_ratio=None`` to disable this).  At most ``max_entries``
+    results are kept; the least recently used are discarded first.
+
+    `socket.getaddrinfo` does not report the TTLs of the underlying
+    DNS records, so ``ttl`` should be chosen to match how quickly
+    address changes need to be noticed::
+
+        Resolver.configure('tornado.netutil.CachingResolver',
+                           resolver=ThreadedResolver(), ttl=60)
+
+    .. versionadded:: 4.4
+    """
+    def initialize(self, resolver, ttl=300.0, negative_ttl=10.0,
+                   refresh_ratio=0.8, max_entries=1024, io_loop=None):
+        self.resolver = resolver
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_ratio = refresh_ratio
+        self.max_entries = max_entries
+        self.io_loop = io_loop or IOLoop.current()
+        # key -> (expires, refresh_at, addresses, exc_info)
+        self._cache = collections.OrderedDict()
+        # key -> Future for lookups in progress
+        self._pending = {}
+
+    def close(self):
+        self.resolver.close()
+        self._cache.clear()
+
+    @gen.coroutine
+    def resolve(self, host, port, family=socket.AF_UNSPEC):
+        key = (host, port, family)
+        now = self.io_loop.time()
+        entry = self._cache.pop(key, None)
+        if entry is not None and entry[0] > now:
+            # Move to the most recently used end.
+            self._cache[key] = entry
+            expires, refresh_at, addresses, exc_info = entry
+            if exc_info is not None:
+                raise_exc_info(exc_info)
+            if (refresh_at is not None and now >= refresh_at and
+                    key not in self._pending):
+                # Nobody waits for a background refresh; don't log
+                # its failure as an unretrieved exception.
+                self._lookup(key).add_done_callback(lambda f: f.exception())
+            raise gen.Return(list(addresses))
+        future = self._pending.get(key)
+        if future is None:
+            future = self._lookup(key)
+        addresses = yield future
+        raise gen.Return(list(addresses))
+
+    def _lookup(self, key):
+        future = Future()
+        self._pending[key] = future
+        self.io_loop.add_future(self.resolver.resolve(*key),
+                                functools.partial(self._on_resolved,
+                                                  key, future))
+        return future
+
+    def _on_resolved(self, key, future, resolved):
+        del self._pending[key]
+        now = self.io_loop.time()
+        try:
+            addresses = resolved.result()
+        except Exception:
+            exc_info = sys.exc_info()
+            entry = self._cache.get(key)
+            if entry is None or entry[0] <= now or entry[3] is not None:
+                self._store(key, (now + self.negative_ttl, None, None,
+                                  exc_info))
+            # else: a background refresh failed; keep using the
+            # previous result until it expires.
+            future.set_exc_info(exc_info)
+        else:
+            refresh_at = None
+            if self.refresh_ratio is not None:
+                refresh_at = now + self.ttl * self.refresh_ratio
+            self._store(key, (now + self.ttl, refresh_at, addresses, None))
+            future.set_result(addresses)
+
+    def _store(self, key, entry):
+        self._cache.pop(key, None)
+        self._cache[key] = entry
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+
 # These are the keyword arguments to ssl.wrap_socket that must be translated
 # to their SSLContext equivalents (the other arguments are still passed
 # to SSLContext.wrap_socket).
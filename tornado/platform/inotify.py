@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+#
+# Copyright 2016 The Tornado Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Minimal ctypes wrapper for the Linux inotify API.
+
+Importing this module raises `ImportError` on systems without inotify.
+"""
+from __future__ import absolute_import, division, print_function, with_statement
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                        use_errno=True)
+    _inotify_init1 = _libc.inotify_init1
+    _inotify_add_watch = _libc.inotify_add_watch
+    _inotify_rm_watch = _libc.inotify_rm_watch
+except (OSError, AttributeError):
+    raise ImportError("inotify is not available on this platform")
+
+_inotify_init1.argtypes = (ctypes.c_int,)
+_inotify_init1.restype = ctypes.c_int
+_inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+_inotify_add_watch.restype = ctypes.c_int
+_inotify_rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+_inotify_rm_watch.restype = ctypes.c_int
+
+# Constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+IN_CLOEXEC = os.O_CLOEXEC if hasattr(os, "O_CLOEXEC") else 0o2000000
+IN_NONBLOCK = os.O_NONBLOCK
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _check(result):
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return result
+
+
+class Inotify(object):
+    """A non-blocking inotify instance.
+
+    `fileno` may be registered with an `.IOLoop`; call `read_events`
+    when it becomes readable.
+    """
+    def __init__(self):
+        self._fd = _check(_inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+
+    def fileno(self):
+        return self._fd
+
+    def add_watch(self, path, mask):
+        """Watches ``path`` for the events in ``mask``.
+
+        Returns the watch descriptor, which identifies the path in the
+        events returned by `read_events`.
+        """
+        if not isinstance(path, bytes):
+            path = path.encode(sys.getfilesystemencoding() or "utf-8")
+        return _check(_inotify_add_watch(self._fd, path, mask))
+
+    def rm_watch(self, wd):
+        _check(_inotify_rm_watch(self._fd, wd))
+
+    def read_events(self):
+        """Returns a list of ``(wd, mask, cookie, name)`` tuples.
+
+        ``name`` is a byte string, empty for events on the watched
+        path itself.  Returns an empty list if no events are pending.
+        """
+        try:
+            data = os.read(self._fd, 65536)
+        except (IOError, OSError) as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return []
+            raise
+        events = []
+        pos = 0
+        while pos + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, pos)
+            pos += _EVENT_HEADER.size
+            name = data[pos:pos + length].rstrip(b"\0")
+            pos += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
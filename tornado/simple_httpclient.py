@@ -16,9 +16,11 @@ import base64
 import collections
 import copy
 import functools
+import heapq
 import re
 import socket
 import sys
+import time
 from io import BytesIO
 
 
@@ -51,14 +53,16 @@ class SimpleAsyncHTTPClient(AsyncHTTPClient):
 
     This class implements an HTTP 1.1 client on top of Tornado's IOStreams.
     Some features found in the curl-based AsyncHTTPClient are not yet
-    supported.  In particular, proxies are not supported, connections
-    are not reused, and callers cannot select the network interface to be
-    used.
+    supported.  In particular, proxies are not supported, and callers
+    cannot select the network interface to be used.  Connections are
+    only reused if ``max_idle_connections_per_host`` is set.
     """
     def initialize(self, io_loop, max_clients=10,
                    hostname_mapping=None, max_buffer_size=104857600,
                    resolver=None, defaults=None, max_header_size=None,
-                   max_body_size=None):
+                   max_body_size=None, max_idle_connections_per_host=0,
+                   idle_connection_timeout=60, max_clients_per_host=None,
+                   cache=None):
         """Creates a AsyncHTTPClient.
 
         Only a single AsyncHTTPClient instance exists per IOLoop
@@ -75,6 +79,12 @@ class SimpleAsyncHTTPClient(AsyncHTTPClient):
         queued. Note that time spent waiting in this queue still counts
         against the ``request_timeout``.
 
+        ``max_clients_per_host``, if set, additionally limits the number
+        of concurrent requests to any one host (scheme, hostname and
+        port), so that a slow server cannot occupy every slot.  Queued
+        requests are sent in order of `.HTTPRequest.priority`, and hosts
+        with equally urgent requests take turns; see `get_queue_stats`.
+
         ``hostname_mapping`` is a dictionary mapping hostnames to IP addresses.
         It can be used to make local DNS changes when modifying system-wide
         settings like ``/etc/hosts`` is not possible or desirable (e.g. in
@@ -88,18 +98,49 @@ class SimpleAsyncHTTPClient(AsyncHTTPClient):
         applies; with a ``streaming_callback`` only ``max_body_size``
         does.
 
+        ``max_idle_connections_per_host`` is the number of idle
+        keep-alive connections that will be kept open for each
+        combination of scheme, host, port and SSL options.  When it is
+        zero (the default), every request uses a new connection and
+        sends ``Connection: close``.  Idle connections are closed after
+        ``idle_connection_timeout`` seconds, or as soon as the server
+        closes them.
+
         .. versionchanged:: 4.2
            Added the ``max_body_size`` argument.
+
+        .. versionchanged:: 4.4
+           Added the ``max_idle_connections_per_host`` and
+           ``idle_connection_timeout`` arguments.
+
+        .. versionchanged:: 4.4
+           Added the ``max_clients_per_host`` argument.
         """
         super(SimpleAsyncHTTPClient, self).initialize(io_loop,
-                                                      defaults=defaults)
+                                                      defaults=defaults,
+                                                      cache=cache)
         self.max_clients = max_clients
-        self.queue = collections.deque()
+        self.max_clients_per_host = max_clients_per_host
         self.active = {}
         self.waiting = {}
+        # Maps host keys (see _host_key) to heaps of
+        # (-priority, seq, key, request, callback, queued_time) tuples.
+        self._host_queues = {}
+        # Hosts with queued requests, least recently served first.
+        self._host_order = collections.deque()
+        self._active_hosts = {}
+        self._host_active = {}
+        self._queue_seq = 0
+        self._host_stats = {}
+        self._queue_stats = _QueueStats()
         self.max_buffer_size = max_buffer_size
         self.max_header_size = max_header_size
         self.max_body_size = max_body_size
+        self.max_idle_connections_per_host = max_idle_connections_per_host
+        self.idle_connection_timeout = idle_connection_timeout
+        # Maps connection keys (see _HTTPConnection._connection_key) to
+        # deques of (stream, timeout_handle) pairs, oldest first.
+        self._idle_connections = {}
         # TCPClient could create a Resolver for us, but we have to do it
         # ourselves to support hostname_mapping.
         if resolver:
@@ -115,38 +156,120 @@ class SimpleAsyncHTTPClient(AsyncHTTPClient):
 
     def close(self):
         super(SimpleAsyncHTTPClient, self).close()
+        for idle in self._idle_connections.values():
+            for stream, timeout_handle in idle:
+                self.io_loop.remove_timeout(timeout_handle)
+                stream.set_close_callback(None)
+                stream.close()
+        self._idle_connections.clear()
         if self.own_resolver:
             self.resolver.close()
         self.tcp_client.close()
 
+    @property
+    def queue(self):
+        """The queued ``(key, request, callback)`` tuples, in no
+        particular order.
+        """
+        return [entry[2:5] for heap in self._host_queues.values()
+                for entry in heap]
+
     def fetch_impl(self, request, callback):
         key = object()
-        self.queue.append((key, request, callback))
-        if not len(self.active) < self.max_clients:
+        host = self._host_key(request)
+        self.waiting[key] = (request, callback, None)
+        self._queue_seq += 1
+        heapq.heappush(self._host_queues.setdefault(host, []),
+                       (-request.priority, self._queue_seq, key, request,
+                        callback, self.io_loop.time()))
+        if host not in self._host_order:
+            self._host_order.append(host)
+        self._process_queue()
+        if key in self.waiting:
             timeout_handle = self.io_loop.add_timeout(
                 self.io_loop.time() + min(request.connect_timeout,
                                           request.request_timeout),
                 functools.partial(self._on_timeout, key))
-        else:
-            timeout_handle = None
-        self.waiting[key] = (request, callback, timeout_handle)
-        self._process_queue()
-        if self.queue:
-            gen_log.debug("max_clients limit reached, request queued. "
+            self.waiting[key] = (request, callback, timeout_handle)
+            gen_log.debug("concurrency limit reached, request queued. "
                           "%d active, %d queued requests." % (
-                              len(self.active), len(self.queue)))
+                              len(self.active), len(self.waiting)))
+
+    def _host_key(self, request):
+        scheme, netloc = urlparse.urlsplit(request.url)[:2]
+        return "%s://%s" % (scheme.lower(),
+                            netloc.rpartition("@")[2].lower())
+
+    def _next_host(self):
+        """Returns the host whose queued request should be sent next.
+
+        The host with the most urgent request wins; among equals the
+        one that has been waiting longest for a turn goes first.  Hosts
+        at ``max_clients_per_host`` are skipped.
+        """
+        best = None
+        for host in self._host_order:
+            if (self.max_clients_per_host is not None and
+                    self._host_active.get(host, 0) >=
+                    self.max_clients_per_host):
+                continue
+            if best is None or (self._host_queues[host][0][0] <
+                                self._host_queues[best][0][0]):
+                best = host
+        return best
 
     def _process_queue(self):
         with stack_context.NullContext():
-            while self.queue and len(self.active) < self.max_clients:
-                key, request, callback = self.queue.popleft()
-                if key not in self.waiting:
-                    continue
+            while len(self.active) < self.max_clients:
+                host = self._next_host()
+                if host is None:
+                    break
+                heap = self._host_queues[host]
+                entry = heapq.heappop(heap)
+                key, request, callback, queued_time = entry[2:]
+                self._host_order.remove(host)
+                if heap:
+                    self._host_order.append(host)
+                else:
+                    del self._host_queues[host]
                 self._remove_timeout(key)
+                wait_time = self.io_loop.time() - queued_time
+                self._queue_stats.dispatched(wait_time)
+                self._stats_for(host).dispatched(wait_time)
                 self.active[key] = (request, callback)
+                self._active_hosts[key] = host
+                self._host_active[host] = self._host_active.get(host, 0) + 1
                 release_callback = functools.partial(self._release_fetch, key)
                 self._handle_request(request, release_callback, callback)
 
+    def _stats_for(self, host):
+        stats = self._host_stats.get(host)
+        if stats is None:
+            stats = self._host_stats[host] = _QueueStats()
+        return stats
+
+    def get_queue_stats(self):
+        """Returns a dict describing the request queue.
+
+        The top level has the number of ``active`` and ``queued``
+        requests, the number of requests ``dispatched`` from the queue
+        and ``timeouts`` (requests that gave up while queued), and
+        ``wait_time_total`` and ``wait_time_max`` in seconds.  ``hosts``
+        maps each host that has been fetched from (as
+        ``scheme://netloc``) to a dict with the same keys.
+
+        .. versionadded:: 4.4
+        """
+        result = self._queue_stats.to_dict()
+        result["active"] = len(self.active)
+        result["queued"] = sum(len(q) for q in self._host_queues.values())
+        result["hosts"] = hosts = {}
+        for host, stats in self._host_stats.items():
+            hosts[host] = stats.to_dict()
+            hosts[host]["active"] = self._host_active.get(host, 0)
+            hosts[host]["queued"] = len(self._host_queues.get(host, ()))
+        return result
+
     def _connection_class(self):
         return _HTTPConnection
 
@@ -158,8 +281,70 @@ class SimpleAsyncHTTPClient(AsyncHTTPClient):
 
     def _release_fetch(self, key):
         del self.active[key]
+        host = self._active_hosts.pop(key)
+        self._host_active[host] -= 1
+        if not self._host_active[host]:
+            del self._host_active[host]
         self._process_queue()
 
+    def _get_idle_connection(self, key):
+        """Returns a pooled stream for ``key``, or None.
+
+        The most recently used connection is preferred since it is the
+        least likely to have been closed by the server.
+        """
+        idle = self._idle_connections.get(key)
+        while idle:
+            stream, timeout_handle = idle.pop()
+            self.io_loop.remove_timeout(timeout_handle)
+            stream.set_close_callback(None)
+            if stream.closed() or stream._read_buffer_size:
+                # Either the server closed the connection, or it sent
+                # data we never asked for; neither can be reused.
+                stream.close()
+                continue
+            if not idle:
+                del self._idle_connections[key]
+            return stream
+        self._idle_connections.pop(key, None)
+        return None
+
+    def _put_idle_connection(self, key, stream):
+        """Returns ``stream`` to the pool after a complete response."""
+        if (self._closed or stream.closed() or
+                self.max_idle_connections_per_host <= 0):
+            stream.close()
+            return
+        with stack_context.NullContext():
+            idle = self._idle_connections.setdefault(key, collections.deque())
+            while len(idle) >= self.max_idle_connections_per_host:
+                old_stream, old_timeout = idle.popleft()
+                self.io_loop.remove_timeout(old_timeout)
+                old_stream.set_close_callback(None)
+                old_stream.close()
+            timeout_handle = self.io_loop.add_timeout(
+                self.io_loop.time() + self.idle_connection_timeout,
+                functools.partial(self._discard_idle_connection, key, stream))
+            idle.append((stream, timeout_handle))
+            # The close callback also makes the stream listen for reads,
+            # so a connection closed by the server leaves the pool
+            # right away.
+            stream.set_close_callback(
+                functools.partial(self._discard_idle_connection, key, stream))
+
+    def _discard_idle_connection(self, key, stream):
+        idle = self._idle_connections.get(key)
+        if idle:
+            for entry in idle:
+                if entry[0] is stream:
+                    idle.remove(entry)
+                    self.io_loop.remove_timeout(entry[1])
+                    break
+            if not idle:
+                del self._idle_connections[key]
+        stream.set_close_callback(None)
+        stream.close()
+
     def _remove_timeout(self, key):
         if key in self.waiting:
             request, callback, timeout_handle = self.waiting[key]
@@ -169,7 +354,19 @@ class SimpleAsyncHTTPClient(AsyncHTTPClient):
 
     def _on_timeout(self, key):
         request, callback, timeout_handle = self.waiting[key]
-        self.queue.remove((key, request, callback))
+        host = self._host_key(request)
+        heap = self._host_queues[host]
+        for i, entry in enumerate(heap):
+            if entry[2] is key:
+                heap[i] = heap[-1]
+                heap.pop()
+                heapq.heapify(heap)
+                break
+        if not heap:
+            del self._host_queues[host]
+            self._host_order.remove(host)
+        self._queue_stats.timeouts += 1
+        self._stats_for(host).timeouts += 1
         timeout_response = HTTPResponse(
             request, 599, error=HTTPError(599, "Timeout"),
             request_time=self.io_loop.time() - request.start_time)
@@ -177,6 +374,32 @@ class SimpleAsyncHTTPClient(AsyncHTTPClient):
         del self.waiting[key]
 
 
+class _QueueStats(object):
+    """Counters behind `SimpleAsyncHTTPClient.get_queue_stats`."""
+    __slots__ = ("count", "timeouts", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.count = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def dispatched(self, wait_time):
+        self.count += 1
+        self.wait_total += wait_time
+        if wait_time > self.wait_max:
+            self.wait_max = wait_time
+
+    def to_dict(self):
+        return dict(dispatched=self.count, timeouts=self.timeouts,
+                    wait_time_total=self.wait_total,
+                    wait_time_max=self.wait_max)
+
+
+_IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "PUT", "DELETE", "OPTIONS",
+                                 "TRACE"])
+
+
 class _HTTPConnection(httputil.HTTPMessageDelegate):
     _SUPPORTED_METHODS = set(["GET", "HEAD", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
 
@@ -200,6 +423,25 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
         # Timeout handle returned by IOLoop.add_timeout
         self._timeout = None
         self._sockaddr = None
+        self.connection = None
+        # True if the stream came from the client's idle connection pool.
+        self._reused_connection = False
+        # True once on_connection_close has seen the stream close.
+        self._connection_closed = False
+        # True once the request (including any body) has been written.
+        self._request_written = False
+        # When the connection may be pooled, the response is held here
+        # until HTTP1Connection is done with the stream.
+        self._pending_response = None
+        # IOLoop times at which each phase finished; see _time_info.
+        # Redirects carry the start of the first transfer and its queue
+        # time over so the totals cover the whole fetch, as with curl.
+        self._timing = {}
+        self._transfer_start = getattr(request, "_transfer_start",
+                                       self.start_time)
+        self._queue_time = getattr(request, "_queue_time", None)
+        if self._queue_time is None:
+            self._queue_time = max(0, time.time() - request.start_time)
         with stack_context.ExceptionStackContext(self._handle_exception):
             self.parsed = urlparse.urlsplit(_unicode(self.request.url))
             if self.parsed.scheme not in ("http", "https"):
@@ -223,17 +465,46 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
             else:
                 af = socket.AF_UNSPEC
 
-            ssl_options = self._get_ssl_options(self.parsed.scheme)
-
-            timeout = min(self.request.connect_timeout, self.request.request_timeout)
-            if timeout:
-                self._timeout = self.io_loop.add_timeout(
-                    self.start_time + timeout,
-                    stack_context.wrap(self._on_timeout))
-            self.tcp_client.connect(host, port, af=af,
-                                    ssl_options=ssl_options,
-                                    max_buffer_size=self.max_buffer_size,
-                                    callback=self._on_connect)
+            self._connect_args = (host, port, af,
+                                  self._get_ssl_options(self.parsed.scheme))
+            self._connect(self.start_time)
+
+    def _connection_key(self):
+        host, port, af, ssl_options = self._connect_args
+        if isinstance(ssl_options, dict):
+            ssl_options = tuple(sorted(ssl_options.items()))
+        return (self.parsed.scheme, host, port, af, ssl_options)
+
+    def _pooling_enabled(self):
+        # Subclasses such as the websocket client run without a
+        # SimpleAsyncHTTPClient and never pool their connections.
+        return (self.client is not None and
+                self.client.max_idle_connections_per_host > 0)
+
+    def _connect(self, start_time, reuse=True):
+        if reuse and self._pooling_enabled():
+            stream = self.client._get_idle_connection(self._connection_key())
+            if stream is not None:
+                self._reused_connection = True
+                now = self.io_loop.time()
+                self._timing.update(namelookup=now, connect=now)
+                if self._connect_args[3] is not None:
+                    self._timing["appconnect"] = now
+                self.io_loop.add_callback(self._on_connect, stream)
+                return
+        self._reused_connection = False
+        self._timing.clear()
+        host, port, af, ssl_options = self._connect_args
+        timeout = min(self.request.connect_timeout, self.request.request_timeout)
+        if timeout:
+            self._timeout = self.io_loop.add_timeout(
+                start_time + timeout,
+                stack_context.wrap(self._on_timeout))
+        self.tcp_client.connect(host, port, af=af,
+                                ssl_options=ssl_options,
+                                max_buffer_size=self.max_buffer_size,
+                                timing=self._timing,
+                                callback=self._on_connect)
 
     def _get_ssl_options(self, scheme):
         if scheme == "https":
@@ -316,7 +587,8 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
                     'proxy_username', 'proxy_password'):
             if getattr(self.request, key, None):
                 raise NotImplementedError('%s not supported' % key)
-        if "Connection" not in self.request.headers:
+        if ("Connection" not in self.request.headers and
+                not self._pooling_enabled()):
             self.request.headers["Connection"] = "close"
         if "Host" not in self.request.headers:
             if '@' in self.parsed.netloc:
@@ -366,6 +638,7 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
         req_path = ((self.parsed.path or '/') +
                     (('?' + self.parsed.query) if self.parsed.query else ''))
         self.connection = self._create_connection(stream)
+        self._timing["pretransfer"] = self.io_loop.time()
         start_line = httputil.RequestStartLine(self.request.method,
                                                req_path, '')
         self.connection.write_headers(start_line, self.request.headers)
@@ -379,7 +652,7 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
         connection = HTTP1Connection(
             stream, True,
             HTTP1ConnectionParameters(
-                no_keep_alive=True,
+                no_keep_alive=not self._pooling_enabled(),
                 max_header_size=self.max_header_size,
                 max_body_size=self.max_body_size,
                 decompress=self.request.decompress_response),
@@ -397,11 +670,13 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
                 def on_body_written(fut):
                     fut.result()
                     self.connection.finish()
+                    self._request_written = True
                     if start_read:
                         self._read_response()
                 self.io_loop.add_future(fut, on_body_written)
                 return
         self.connection.finish()
+        self._request_written = True
         if start_read:
             self._read_response()
 
@@ -410,7 +685,43 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
         # stack context.
         self.io_loop.add_future(
             self.connection.read_response(self),
-            lambda f: f.result())
+            functools.partial(self._on_response_read, self.connection))
+
+    def _on_response_read(self, connection, future):
+        if connection is not self.connection:
+            # The request has been retried on a new connection, so the
+            # outcome on the old one no longer matters.
+            future.exception()
+            return
+        keep_alive = future.result()
+        if self._pending_response is None:
+            return
+        response = self._pending_response
+        self._pending_response = None
+        # read_response only returns with the stream still open if the
+        # message was complete and the server allows keep-alive.
+        if keep_alive and not self.stream.closed():
+            self.client._put_idle_connection(self._connection_key(),
+                                             self.stream)
+        else:
+            self.stream.close()
+        self._run_callback(response)
+
+    def _time_info(self):
+        """Returns ``time_info`` for a response, with the keys and
+        meaning used by ``curl_httpclient``: seconds from the start of
+        the transfer until each phase finished.  Phases that were never
+        reached are left out; ``appconnect`` is zero without TLS.
+        """
+        now = self.io_loop.time()
+        info = dict(queue=self._queue_time,
+                    redirect=self.start_time - self._transfer_start,
+                    total=now - self._transfer_start)
+        for name, value in self._timing.items():
+            info[name] = value - self._transfer_start
+        if "connect" in info and "appconnect" not in info:
+            info["appconnect"] = 0.0
+        return info
 
     def _release(self):
         if self.release_callback is not None:
@@ -428,6 +739,22 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
     def _handle_exception(self, typ, value, tb):
         if self.final_callback:
             self._remove_timeout()
+            if self._should_retry(value):
+                # The server closed a pooled connection before we got
+                # a response (typically because it timed out just as we
+                # sent the request).  Try once more on a new connection.
+                self._reused_connection = False
+                self._connection_closed = False
+                self.connection = None
+                self.stream.set_close_callback(None)
+                self.stream.close()
+                self.chunks = []
+                self._pending_response = None
+                self._request_written = False
+                with stack_context.NullContext():
+                    self.io_loop.add_callback(self._retry)
+                return True
+            self._pending_response = None
             if isinstance(value, StreamClosedError):
                 if value.real_error is None:
                     value = HTTPError(599, "Stream closed")
@@ -435,6 +762,7 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
                     value = value.real_error
             self._run_callback(HTTPResponse(self.request, 599, error=value,
                                             request_time=self.io_loop.time() - self.start_time,
+                                            time_info=self._time_info(),
                                             ))
 
             if hasattr(self, "stream"):
@@ -450,8 +778,30 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
             # pass it along, unless it's just the stream being closed.
             return isinstance(value, StreamClosedError)
 
+    def _should_retry(self, value):
+        # Depending on timing, a closed connection is reported either
+        # by the stream's Futures or by on_connection_close.  Only
+        # idempotent requests may be replayed automatically (RFC 7230
+        # section 6.3.1); the server may already have processed
+        # anything else.
+        return (self._reused_connection and
+                (isinstance(value, StreamClosedError) or
+                 self._connection_closed) and
+                self.code is None and
+                not self.stream._read_buffer_size and
+                self.request.body_producer is None and
+                self.request.method in _IDEMPOTENT_METHODS)
+
+    def _retry(self):
+        with stack_context.ExceptionStackContext(self._handle_exception):
+            self._connect(self.io_loop.time(), reuse=False)
+
     def on_connection_close(self):
+        if self.connection is None:
+            # A close of the old stream while the request is retried.
+            return
         if self.final_callback is not None:
+            self._connection_closed = True
             message = "Connection closed"
             if self.stream.error:
                 raise self.stream.error
@@ -461,6 +811,7 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
                 self._handle_exception(*sys.exc_info())
 
     def headers_received(self, first_line, headers):
+        self._timing.setdefault("starttransfer", self.io_loop.time())
         if self.request.expect_100_continue and first_line.code == 100:
             self._write_body(False)
             return
@@ -512,6 +863,8 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
                     except KeyError:
                         pass
             new_request.original_request = original_request
+            new_request._transfer_start = self._transfer_start
+            new_request._queue_time = self._queue_time
             final_callback = self.final_callback
             self.final_callback = None
             self._release()
@@ -526,8 +879,14 @@ class _HTTPConnection(httputil.HTTPMessageDelegate):
                                 self.code, reason=getattr(self, 'reason', None),
                                 headers=self.headers,
                                 request_time=self.io_loop.time() - self.start_time,
+                                time_info=self._time_info(),
                                 buffer=buffer,
                                 effective_url=self.request.url)
+        if self._pooling_enabled() and self._request_written:
+            # Hold the response until _on_response_read has returned the
+            # stream to the pool, so a follow-up request can reuse it.
+            self._pending_response = response
+            return
         self._run_callback(response)
         self._on_end_request()
 
@@ -85,6 +85,14 @@ class _State(threading.local):
 _state = _State()
 
 
+def _contexts_active():
+    """Returns True if any `StackContext` or `ExceptionStackContext`
+    is active, i.e. if `wrap` would have anything to capture.
+    """
+    contexts = _state.contexts
+    return bool(contexts[0] or contexts[1])
+
+
 class StackContext(object):
     """Establishes the given context as a StackContext that will be transferred.
 
@@ -276,6 +284,7 @@ def wrap(fn):
             finally:
                 _state.contexts = current_state
         null_wrapper._wrapped = True
+        null_wrapper.__wrapped__ = fn
         return null_wrapper
 
     def wrapped(*args, **kwargs):
@@ -346,6 +355,7 @@ def wrap(fn):
         return ret
 
     wrapped._wrapped = True
+    wrapped.__wrapped__ = fn
     return wrapped
 
 
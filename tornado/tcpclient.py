@@ -155,23 +155,37 @@ class TCPClient(object):
 
     @gen.coroutine
     def connect(self, host, port, af=socket.AF_UNSPEC, ssl_options=None,
-                max_buffer_size=None):
+                max_buffer_size=None, timing=None):
         """Connect to the given host and port.
 
         Asynchronously returns an `.IOStream` (or `.SSLIOStream` if
         ``ssl_options`` is not None).
+
+        If ``timing`` is a dict, the `.IOLoop` time at which each phase
+        of the connection finished is stored in it under the keys
+        ``namelookup``, ``connect`` and (if ``ssl_options`` is given)
+        ``appconnect``.
+
+        .. versionchanged:: 4.4
+           Added the ``timing`` argument.
         """
         addrinfo = yield self.resolver.resolve(host, port, af)
+        if timing is not None:
+            timing["namelookup"] = self.io_loop.time()
         connector = _Connector(
             addrinfo, self.io_loop,
             functools.partial(self._create_stream, max_buffer_size))
         af, addr, stream = yield connector.start()
+        if timing is not None:
+            timing["connect"] = self.io_loop.time()
         # TODO: For better performance we could cache the (af, addr)
         # information here and re-use it on subsequent connections to
         # the same host. (http://tools.ietf.org/html/rfc6555#section-4.2)
         if ssl_options is not None:
             stream = yield stream.start_tls(False, ssl_options=ssl_options,
                                             server_hostname=host)
+            if timing is not None:
+                timing["appconnect"] = self.io_loop.time()
         raise gen.Return(stream)
 
     def _create_stream(self, max_buffer_size, af, addr):
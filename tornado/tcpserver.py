@@ -98,6 +98,16 @@ class TCPServer(object):
        单进程服务中, 如果你想要使用 `~tornado.netutil.bind_sockets` 以外的方式
        创建你监听的 socket.
 
+    在 `bind`/`start` 模式中, 可以给 `bind` 传递 ``reuse_port=True``,
+    使得每个子进程在 fork 之后绑定自己的 ``SO_REUSEPORT`` socket,
+    而不是所有子进程共享同一个监听 socket. 这样由内核在各个进程之间
+    分配新连接, 避免惊群效应(thundering herd)和进程间负载不均::
+
+            server = TCPServer()
+            server.bind(8888, reuse_port=True)
+            server.start(0)  # Forks multiple sub-processes
+            IOLoop.current().start()
+
     .. versionadded:: 3.1
        ``max_buffer_size`` 参数.
     """
@@ -107,6 +117,7 @@ class TCPServer(object):
         self.ssl_options = ssl_options
         self._sockets = {}  # fd -> socket object
         self._pending_sockets = []
+        self._pending_reuse_port = []  # bind_sockets arguments
         self._started = False
         self.max_buffer_size = max_buffer_size
         self.read_chunk_size = read_chunk_size
@@ -158,7 +169,8 @@ class TCPServer(object):
         u"""单数版本的 `add_sockets`.  接受一个单一的 socket 对象."""
         self.add_sockets([socket])
 
-    def bind(self, port, address=None, family=socket.AF_UNSPEC, backlog=128):
+    def bind(self, port, address=None, family=socket.AF_UNSPEC, backlog=128,
+             reuse_port=False):
         u"""绑定该服务到指定的地址的指定端口上.
 
         要启动该服务, 调用 `start`. 如果你想要在一个单进程上运行该服务,
@@ -173,9 +185,31 @@ class TCPServer(object):
         ``backlog`` 参数和 `socket.listen <socket.socket.listen>` 是相同含义.
 
         这个方法可能在 `start` 之前被调用多次来监听在多个端口或接口上.
+
+        如果 ``reuse_port`` 为 ``True``, socket 将设置 ``SO_REUSEPORT``
+        选项, 并且直到 `start` 时(在 fork 出子进程之后)才会被创建,
+        所以每个子进程都拥有自己的监听 socket. 为了尽早报告错误(例如端口
+        已被占用), 该方法会在当前进程中先试着绑定一次再关闭该 socket.
+        因为每个进程分别绑定, 这时 ``port`` 不能为 0. 如果 ``port`` 为 0
+        或者平台不支持 ``SO_REUSEPORT``, 将抛出 `ValueError`.
+
+        .. versionchanged:: 4.4
+           添加 ``reuse_port`` 参数.
         """
+        if reuse_port and not self._started:
+            if not hasattr(socket, "SO_REUSEPORT"):
+                raise ValueError("the platform doesn't support SO_REUSEPORT")
+            if not port:
+                raise ValueError("port must be nonzero with reuse_port=True")
+            # Validate the address now so errors surface in the parent
+            # instead of in every forked child.
+            for sock in bind_sockets(port, address=address, family=family,
+                                     backlog=backlog, reuse_port=True):
+                sock.close()
+            self._pending_reuse_port.append((port, address, family, backlog))
+            return
         sockets = bind_sockets(port, address=address, family=family,
-                               backlog=backlog)
+                               backlog=backlog, reuse_port=reuse_port)
         if self._started:
             self.add_sockets(sockets)
         else:
@@ -197,6 +231,9 @@ class TCPServer(object):
         `tornado.web.Application` 的 ``autoreload=True`` 选项默认为 True).
         当使用多进程模式时, 直到 ``TCPServer.start(n)`` 调用后, 才能创建或者
         引用 IOLoops .
+
+        用 ``reuse_port=True`` 调用 `bind` 的 socket 在这里(fork 之后)
+        被每个进程单独创建.
         """
         assert not self._started
         self._started = True
@@ -204,6 +241,10 @@ class TCPServer(object):
             process.fork_processes(num_processes)
         sockets = self._pending_sockets
         self._pending_sockets = []
+        for port, address, family, backlog in self._pending_reuse_port:
+            sockets.extend(bind_sockets(port, address=address, family=family,
+                                        backlog=backlog, reuse_port=True))
+        self._pending_reuse_port = []
         self.add_sockets(sockets)
 
     def stop(self):
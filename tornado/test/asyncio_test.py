@@ -111,3 +111,11 @@ class AsyncIOLoopTest(AsyncTestCase):
             asyncio.get_event_loop().run_until_complete(
                 native_coroutine_with_adapter2()),
             42)
+
+    def test_stats_unsupported(self):
+        # Statistics are only collected by PollIOLoop; other loops
+        # accept the calls and report no statistics.
+        self.io_loop.enable_stats()
+        self.assertIsNone(self.io_loop.get_stats())
+        self.io_loop.disable_stats()
+        self.assertIsNone(self.io_loop.get_stats())
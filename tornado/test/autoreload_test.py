@@ -0,0 +1,76 @@
+from __future__ import absolute_import, division, print_function, with_statement
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+from tornado import autoreload
+from tornado.testing import AsyncTestCase
+from tornado.test.util import unittest
+
+
+@unittest.skipIf(autoreload.inotify is None, "inotify not available")
+class InotifyWatcherTest(AsyncTestCase):
+    def setUp(self):
+        super(InotifyWatcherTest, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'watched.py')
+        self.other = os.path.join(self.dir, 'other.py')
+        for path in (self.path, self.other):
+            with open(path, 'w') as f:
+                f.write('x = 1\n')
+        self.watcher = autoreload._InotifyWatcher(self.io_loop)
+        self.watcher.add(self.path)
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.dir)
+        super(InotifyWatcherTest, self).tearDown()
+
+    def test_no_changes(self):
+        self.assertEqual(self.watcher.changed_paths(), [])
+
+    def test_write(self):
+        with open(self.path, 'w') as f:
+            f.write('x = 2\n')
+        self.assertEqual(self.watcher.changed_paths(), [self.path])
+
+    def test_rename_over(self):
+        # Editors often save by writing a new file and renaming it.
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write('x = 2\n')
+        os.rename(tmp, self.path)
+        self.assertEqual(self.watcher.changed_paths(), [self.path])
+
+    def test_touch(self):
+        os.utime(self.path, None)
+        self.assertEqual(self.watcher.changed_paths(), [self.path])
+
+    def test_unwatched_file(self):
+        with open(self.other, 'w') as f:
+            f.write('x = 2\n')
+        self.assertEqual(self.watcher.changed_paths(), [])
+
+    def test_missing_directory(self):
+        self.watcher.add(os.path.join(self.dir, 'missing', 'x.py'))
+        self.assertEqual(len(self.watcher._dirs), 1)
+
+    def test_replaced_module(self):
+        # A module that replaces another one in sys.modules is watched
+        # even though the number of modules has not changed.
+        name = 'tornado_autoreload_test_module'
+        module = types.ModuleType(name)
+        module.__file__ = self.path
+        sys.modules[name] = module
+        try:
+            self.watcher.update()
+            self.assertNotIn(self.other, self.watcher._paths)
+            module = types.ModuleType(name)
+            module.__file__ = self.other
+            sys.modules[name] = module
+            self.watcher.update()
+            self.assertIn(self.other, self.watcher._paths)
+        finally:
+            del sys.modules[name]
@@ -7,14 +7,16 @@ import binascii
 from contextlib import closing
 import copy
 import functools
+import shutil
 import sys
+import tempfile
 import threading
 import datetime
 from io import BytesIO
 
 from tornado.escape import utf8
 from tornado import gen
-from tornado.httpclient import HTTPRequest, HTTPResponse, _RequestProxy, HTTPError, HTTPClient
+from tornado.httpclient import HTTPRequest, HTTPResponse, _RequestProxy, HTTPError, HTTPClient, AsyncHTTPClient, MemoryCacheStore, DiskCacheStore
 from tornado.httpserver import HTTPServer
 from tornado.ioloop import IOLoop
 from tornado.iostream import IOStream
@@ -114,6 +116,37 @@ class AllMethodsHandler(RequestHandler):
 
     get = post = put = delete = options = patch = other = method
 
+
+class CountingHandler(RequestHandler):
+    def initialize(self, counter):
+        self.counter = counter
+
+    def get(self):
+        self.counter.append(self.request.headers.get("X-Variant"))
+        self.write("request %d" % len(self.counter))
+
+    post = get
+
+
+class CacheControlHandler(RequestHandler):
+    def initialize(self, counter):
+        self.counter = counter
+
+    def get(self):
+        self.counter.append(self.request.headers.get("If-None-Match"))
+        for name in ("Cache-Control", "Vary"):
+            value = self.get_argument(name, None)
+            if value is not None:
+                self.set_header(name, value)
+        expires = self.get_argument("expires", None)
+        if expires is not None:
+            self.set_header("Expires", datetime.datetime.utcnow() +
+                            datetime.timedelta(seconds=int(expires)))
+        self.write("hello %s" % self.request.headers.get("X-Variant"))
+
+    def post(self):
+        self.counter.append("POST")
+
 # These tests end up getting run redundantly: once here with the default
 # HTTPClient implementation, and then again in each implementation's own
 # test suite.
@@ -121,6 +154,7 @@ class AllMethodsHandler(RequestHandler):
 
 class HTTPClientCommonTestCase(AsyncHTTPTestCase):
     def get_app(self):
+        self.counter = []
         return Application([
             url("/hello", HelloWorldHandler),
             url("/post", PostHandler),
@@ -134,6 +168,7 @@ class HTTPClientCommonTestCase(AsyncHTTPTestCase):
             url("/304_with_content_length", ContentLength304Handler),
             url("/all_methods", AllMethodsHandler),
             url('/patch', PatchHandler),
+            url("/counting", CountingHandler, dict(counter=self.counter)),
         ], gzip=True)
 
     def test_patch_receives_payload(self):
@@ -446,6 +481,47 @@ X-XSS-Protection: 1;
         response = yield self.http_client.fetch(self.get_url('/notfound'), raise_error=False)
         self.assertEqual(response.code, 404)
 
+    @gen_test
+    def test_coalesce(self):
+        fetch = functools.partial(self.http_client.fetch,
+                                  self.get_url('/counting'), coalesce=True)
+        responses = yield [fetch(), fetch(), fetch(),
+                           fetch(headers={"X-Variant": "b"})]
+        self.assertEqual(sorted(self.counter, key=str), [None, "b"])
+        self.assertEqual(len(set(r.body for r in responses[:3])), 1)
+        self.assertNotEqual(responses[0].body, responses[3].body)
+        # Each caller gets its own response and buffer.
+        self.assertEqual(len(set(id(r) for r in responses)), 4)
+        self.assertEqual(len(set(id(r.buffer) for r in responses)), 4)
+        self.assertEqual(len(set(id(r.request) for r in responses)), 4)
+        responses[1].buffer.write(b"garbage")
+        self.assertEqual(responses[2].buffer.getvalue(), responses[0].body)
+
+        # Once the fetch is done a new one is started.
+        yield fetch()
+        self.assertEqual(len(self.counter), 3)
+
+    @gen_test
+    def test_coalesce_error(self):
+        fetch = functools.partial(self.http_client.fetch,
+                                  self.get_url('/notfound'), coalesce=True,
+                                  raise_error=False)
+        responses = yield [fetch(), fetch()]
+        for response in responses:
+            self.assertEqual(response.code, 404)
+            self.assertIs(response.error.response, response)
+
+    @gen_test
+    def test_coalesce_only_when_enabled(self):
+        yield [self.http_client.fetch(self.get_url('/counting')),
+               self.http_client.fetch(self.get_url('/counting'))]
+        self.assertEqual(len(self.counter), 2)
+        yield [self.http_client.fetch(self.get_url('/counting'),
+                                      method="POST", body=b"", coalesce=True),
+               self.http_client.fetch(self.get_url('/counting'),
+                                      method="POST", body=b"", coalesce=True)]
+        self.assertEqual(len(self.counter), 4)
+
     @gen_test
     def test_reuse_request_from_response(self):
         # The response.request attribute should be an HTTPRequest, not
@@ -522,6 +598,151 @@ X-XSS-Protection: 1;
         self.assertEqual(response.body, b"Put body: hello")
 
 
+class HTTPCacheTestCase(AsyncHTTPTestCase):
+    def get_app(self):
+        self.counter = []
+        return Application([
+            url("/cache", CacheControlHandler, dict(counter=self.counter)),
+        ])
+
+    def get_cache_store(self):
+        return MemoryCacheStore()
+
+    def get_http_client(self):
+        return AsyncHTTPClient(io_loop=self.io_loop, force_instance=True,
+                               cache=self.get_cache_store())
+
+    @gen_test
+    def test_max_age(self):
+        url = self.get_url("/cache?Cache-Control=max-age%3D60")
+        first = yield self.http_client.fetch(url)
+        second = yield self.http_client.fetch(url)
+        self.assertEqual(len(self.counter), 1)
+        self.assertEqual(second.code, 200)
+        self.assertEqual(second.body, first.body)
+        self.assertEqual(second.headers["Age"], "0")
+        self.assertEqual(second.headers["Cache-Control"], "max-age=60")
+        self.assertIsNot(second.buffer, first.buffer)
+
+    @gen_test
+    def test_expires(self):
+        yield self.http_client.fetch(self.get_url("/cache?expires=60"))
+        yield self.http_client.fetch(self.get_url("/cache?expires=60"))
+        self.assertEqual(len(self.counter), 1)
+
+    @gen_test
+    def test_no_store(self):
+        url = self.get_url("/cache?Cache-Control=no-store")
+        yield self.http_client.fetch(url)
+        yield self.http_client.fetch(url)
+        self.assertEqual(self.counter, [None, None])
+
+    @gen_test
+    def test_revalidation(self):
+        # RequestHandler adds an ETag and answers If-None-Match with 304.
+        url = self.get_url("/cache?expires=-60")
+        first = yield self.http_client.fetch(url)
+        second = yield self.http_client.fetch(url)
+        self.assertEqual(len(self.counter), 2)
+        self.assertEqual(self.counter[1], first.headers["Etag"])
+        self.assertEqual(second.code, 200)
+        self.assertEqual(second.body, first.body)
+        self.assertIs(second.error, None)
+
+    @gen_test
+    def test_revalidation_does_not_modify_request(self):
+        request = HTTPRequest(self.get_url("/cache?expires=-60"))
+        for i in range(3):
+            response = yield self.http_client.fetch(request)
+            self.assertEqual(response.code, 200)
+            self.assertIs(response.request, request)
+            self.assertNotIn("If-None-Match", request.headers)
+        etag = response.headers["Etag"]
+        self.assertEqual(self.counter, [None, etag, etag])
+
+    @gen_test
+    def test_nondefault_options_bypass_cache(self):
+        url = self.get_url("/cache?Cache-Control=max-age%3D60")
+        yield self.http_client.fetch(url)
+        yield self.http_client.fetch(url, decompress_response=False)
+        yield self.http_client.fetch(url, follow_redirects=False)
+        self.assertEqual(self.counter, [None, None, None])
+
+    @gen_test
+    def test_store_error(self):
+        store = self.http_client.cache
+
+        def fail(*args):
+            raise IOError("disk full")
+        store.set = fail
+        url = self.get_url("/cache?Cache-Control=max-age%3D60")
+        with ExpectLog(gen_log, "Error updating HTTP cache"):
+            response = yield self.http_client.fetch(url)
+        self.assertEqual(response.body, b"hello None")
+
+    @gen_test
+    def test_request_no_cache(self):
+        url = self.get_url("/cache?Cache-Control=max-age%3D60")
+        first = yield self.http_client.fetch(url)
+        yield self.http_client.fetch(url, headers={"Cache-Control": "no-cache"})
+        yield self.http_client.fetch(url, headers={"Pragma": "no-cache"})
+        self.assertEqual(self.counter, [None, first.headers["Etag"],
+                                        first.headers["Etag"]])
+
+    @gen_test
+    def test_vary(self):
+        url = self.get_url("/cache?Cache-Control=max-age%3D60&Vary=X-Variant")
+        fetch = functools.partial(self.http_client.fetch, url)
+        response = yield fetch(headers={"X-Variant": "a"})
+        self.assertEqual(response.body, b"hello a")
+        response = yield fetch(headers={"X-Variant": "a"})
+        self.assertEqual(len(self.counter), 1)
+        response = yield fetch(headers={"X-Variant": "b"})
+        self.assertEqual(response.body, b"hello b")
+        self.assertEqual(len(self.counter), 2)
+
+    @gen_test
+    def test_unsafe_method_invalidates(self):
+        url = self.get_url("/cache?Cache-Control=max-age%3D60")
+        yield self.http_client.fetch(url)
+        yield self.http_client.fetch(url, method="POST", body=b"")
+        yield self.http_client.fetch(url)
+        self.assertEqual(self.counter, [None, "POST", None])
+
+    def test_memory_store_size(self):
+        store = MemoryCacheStore(max_size=25)
+        for key in ("a", "b", "c"):
+            store.set(key, dict(headers=[], body=b"0123456789"))
+        self.assertIs(store.get("a"), None)
+        self.assertEqual(store.size, 20)
+        store.get("b")
+        store.set("d", dict(headers=[("X", "y")], body=b"01234"))
+        self.assertIs(store.get("c"), None)
+        self.assertEqual(store.get("b")["body"], b"0123456789")
+        store.set("e", dict(headers=[], body=b"x" * 26))
+        self.assertIs(store.get("e"), None)
+
+
+class DiskHTTPCacheTestCase(HTTPCacheTestCase):
+    def get_cache_store(self):
+        self.cache_dir = tempfile.mkdtemp()
+        return DiskCacheStore(self.cache_dir)
+
+    def tearDown(self):
+        super(DiskHTTPCacheTestCase, self).tearDown()
+        shutil.rmtree(self.cache_dir)
+
+    def test_store(self):
+        store = DiskCacheStore(self.cache_dir)
+        entry = dict(code=200, headers=[("Etag", '"x"')], body=b"a\nb",
+                     vary={"x-variant": None})
+        store.set("http://example.com/", entry)
+        self.assertEqual(store.get("http://example.com/"), entry)
+        self.assertIs(store.get("http://example.com/other"), None)
+        store.delete("http://example.com/")
+        self.assertIs(store.get("http://example.com/"), None)
+
+
 class RequestProxyTest(unittest.TestCase):
     def test_request_set(self):
         proxy = _RequestProxy(HTTPRequest('http://example.com/',
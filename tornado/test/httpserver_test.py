@@ -5,7 +5,7 @@ from __future__ import absolute_import, division, print_function, with_statement
 from tornado import netutil
 from tornado.escape import json_decode, json_encode, utf8, _unicode, recursive_unicode, native_str
 from tornado import gen
-from tornado.http1connection import HTTP1Connection
+from tornado.http1connection import HTTP1Connection, _header_lines
 from tornado.httpserver import HTTPServer
 from tornado.httputil import HTTPHeaders, HTTPMessageDelegate, HTTPServerConnectionDelegate, ResponseStartLine
 from tornado.iostream import IOStream
@@ -18,6 +18,7 @@ from tornado.util import u
 from tornado.web import Application, RequestHandler, asynchronous, stream_request_body
 from contextlib import closing
 import datetime
+import email.utils
 import gzip
 import os
 import shutil
@@ -1065,6 +1066,47 @@ class BodyLimitsTest(AsyncHTTPTestCase):
             stream.close()
 
 
+class HeaderSerializationTest(AsyncHTTPTestCase):
+    def get_app(self):
+        class HeaderHandler(RequestHandler):
+            def get(self):
+                self.set_header("X-Static", "same")
+                self.set_header("X-Dynamic", self.get_argument("value"))
+                self.set_cookie("session", "secret-cookie")
+                self.write("ok")
+
+        return Application([("/", HeaderHandler)])
+
+    def test_cached_headers(self):
+        for value in ["a", "b", "a"]:
+            response = self.fetch("/?value=" + value)
+            self.assertEqual(response.headers["X-Static"], "same")
+            self.assertEqual(response.headers["X-Dynamic"], value)
+
+    def test_date_header(self):
+        response = self.fetch("/?value=a")
+        date = datetime.datetime(
+            *email.utils.parsedate(response.headers["Date"])[:6])
+        self.assertTrue(abs(date - datetime.datetime.utcnow()) <
+                        datetime.timedelta(seconds=3))
+
+    def test_sensitive_headers_not_cached(self):
+        response = self.fetch("/?value=a", headers={
+            "Authorization": "Basic c2VjcmV0", "Cookie": "a=secret"})
+        self.assertIn("secret-cookie", response.headers["Set-Cookie"])
+        names = set(name for name, value in _header_lines)
+        for name in ["Authorization", "Cookie", "Set-Cookie", "Date"]:
+            self.assertNotIn(name, names)
+
+    def test_newline_in_header(self):
+        # The invalid line must be rejected every time, not just the
+        # first time it is seen.
+        for i in range(2):
+            with self.assertRaises(ValueError):
+                _header_lines[("X-Bad", "a\r\nb")]
+        self.assertNotIn(("X-Bad", "a\r\nb"), _header_lines)
+
+
 class LegacyInterfaceTest(AsyncHTTPTestCase):
     def get_app(self):
         # The old request_callback interface does not implement the
@@ -2,7 +2,7 @@
 
 
 from __future__ import absolute_import, division, print_function, with_statement
-from tornado.httputil import url_concat, parse_multipart_form_data, HTTPHeaders, format_timestamp, HTTPServerRequest, parse_request_start_line
+from tornado.httputil import url_concat, parse_multipart_form_data, MultipartFormDataParser, HTTPHeaders, format_timestamp, HTTPServerRequest, parse_request_start_line
 from tornado.escape import utf8, native_str
 from tornado.log import gen_log
 from tornado.testing import ExpectLog
@@ -68,6 +68,9 @@ class TestUrlConcat(unittest.TestCase):
 
 
 class MultipartFormDataTest(unittest.TestCase):
+    def parse(self, boundary, data, args, files):
+        parse_multipart_form_data(boundary, data, args, files)
+
     def test_file_upload(self):
         data = b"""\
 --1234
@@ -77,7 +80,7 @@ Foo
 --1234--""".replace(b"\n", b"\r\n")
         args = {}
         files = {}
-        parse_multipart_form_data(b"1234", data, args, files)
+        self.parse(b"1234", data, args, files)
         file = files["files"][0]
         self.assertEqual(file["filename"], "ab.txt")
         self.assertEqual(file["body"], b"Foo")
@@ -92,7 +95,7 @@ Foo
 --1234--""".replace(b"\n", b"\r\n")
         args = {}
         files = {}
-        parse_multipart_form_data(b"1234", data, args, files)
+        self.parse(b"1234", data, args, files)
         file = files["files"][0]
         self.assertEqual(file["filename"], "ab.txt")
         self.assertEqual(file["body"], b"Foo")
@@ -117,7 +120,7 @@ Foo
             data = utf8(data.replace("\n", "\r\n"))
             args = {}
             files = {}
-            parse_multipart_form_data(b"1234", data, args, files)
+            self.parse(b"1234", data, args, files)
             file = files["files"][0]
             self.assertEqual(file["filename"], filename)
             self.assertEqual(file["body"], b"Foo")
@@ -131,7 +134,7 @@ Foo
 --1234--'''.replace(b"\n", b"\r\n")
         args = {}
         files = {}
-        parse_multipart_form_data(b'"1234"', data, args, files)
+        self.parse(b'"1234"', data, args, files)
         file = files["files"][0]
         self.assertEqual(file["filename"], "ab.txt")
         self.assertEqual(file["body"], b"Foo")
@@ -145,7 +148,7 @@ Foo
         args = {}
         files = {}
         with ExpectLog(gen_log, "multipart/form-data missing headers"):
-            parse_multipart_form_data(b"1234", data, args, files)
+            self.parse(b"1234", data, args, files)
         self.assertEqual(files, {})
 
     def test_invalid_content_disposition(self):
@@ -158,7 +161,7 @@ Foo
         args = {}
         files = {}
         with ExpectLog(gen_log, "Invalid multipart/form-data"):
-            parse_multipart_form_data(b"1234", data, args, files)
+            self.parse(b"1234", data, args, files)
         self.assertEqual(files, {})
 
     def test_line_does_not_end_with_correct_line_break(self):
@@ -170,7 +173,7 @@ Foo--1234--'''.replace(b"\n", b"\r\n")
         args = {}
         files = {}
         with ExpectLog(gen_log, "Invalid multipart/form-data"):
-            parse_multipart_form_data(b"1234", data, args, files)
+            self.parse(b"1234", data, args, files)
         self.assertEqual(files, {})
 
     def test_content_disposition_header_without_name_parameter(self):
@@ -183,7 +186,7 @@ Foo
         args = {}
         files = {}
         with ExpectLog(gen_log, "multipart/form-data value missing name"):
-            parse_multipart_form_data(b"1234", data, args, files)
+            self.parse(b"1234", data, args, files)
         self.assertEqual(files, {})
 
     def test_data_after_final_boundary(self):
@@ -199,12 +202,93 @@ Foo
 """.replace(b"\n", b"\r\n")
         args = {}
         files = {}
-        parse_multipart_form_data(b"1234", data, args, files)
+        self.parse(b"1234", data, args, files)
         file = files["files"][0]
         self.assertEqual(file["filename"], "ab.txt")
         self.assertEqual(file["body"], b"Foo")
 
 
+class MultipartFormDataParserTest(MultipartFormDataTest):
+    # Runs the MultipartFormDataTest cases through the streaming parser,
+    # feeding the body in chunks of various sizes.
+    chunk_sizes = [1, 2, 7, 1000000]
+
+    def parse(self, boundary, data, args, files):
+        content_type = "multipart/form-data; boundary=" + native_str(boundary)
+        results = []
+        for chunk_size in self.chunk_sizes:
+            parser = MultipartFormDataParser(content_type)
+            for i in range(0, len(data), chunk_size):
+                parser.data_received(data[i:i + chunk_size])
+            parser.finish()
+            results.append((parser.arguments, parser.files))
+        for result in results[1:]:
+            self.assertEqual(result, results[0])
+        args.update(results[0][0])
+        files.update(results[0][1])
+
+    def make_body(self, parts):
+        lines = []
+        for headers, value in parts:
+            lines.append(b"--1234\r\n" + headers + b"\r\n\r\n" + value)
+        return b"preamble\r\n" + b"\r\n".join(lines) + b"\r\n--1234--\r\n"
+
+    def test_fields_and_files(self):
+        body = self.make_body([
+            (b'Content-Disposition: form-data; name="a"', b"1"),
+            (b'Content-Disposition: form-data; name="a"', b""),
+            (b'Content-Disposition: form-data; name="b"; filename="b.txt"\r\n'
+             b'Content-Type: text/plain', b"x\r\n--123 y"),
+            (b'Content-Disposition: form-data; name="c"; filename="c.bin"',
+             b"\0" * 3000),
+        ])
+        for chunk_size in self.chunk_sizes:
+            parser = MultipartFormDataParser(
+                "multipart/form-data; boundary=1234", spool_threshold=2048)
+            for i in range(0, len(body), chunk_size):
+                parser.data_received(body[i:i + chunk_size])
+            parser.finish()
+            self.assertEqual(parser.arguments, {"a": [b"1", b""]})
+            b = parser.files["b"][0]
+            self.assertEqual((b.filename, b.content_type, b.body, b.size),
+                             ("b.txt", "text/plain", b"x\r\n--123 y", 10))
+            self.assertIsNone(b.file)
+            # Large files are spooled to a temporary file.
+            c = parser.files["c"][0]
+            self.assertIsNone(c.body)
+            self.assertEqual(c.size, 3000)
+            self.assertEqual(c.file.read(), b"\0" * 3000)
+            c.file.close()
+
+    def test_field_too_large(self):
+        body = self.make_body([
+            (b'Content-Disposition: form-data; name="a"', b"x" * 100),
+            (b'Content-Disposition: form-data; name="b"', b"y" * 10),
+        ])
+        parser = MultipartFormDataParser(
+            "multipart/form-data; boundary=1234", max_field_size=50)
+        with ExpectLog(gen_log, "multipart/form-data field a too large"):
+            parser.data_received(body)
+        parser.finish()
+        self.assertEqual(parser.arguments, {"b": [b"y" * 10]})
+
+    def test_no_final_boundary(self):
+        body = self.make_body([
+            (b'Content-Disposition: form-data; name="a"', b"1"),
+        ])
+        parser = MultipartFormDataParser("multipart/form-data; boundary=1234")
+        parser.data_received(body[:-10])
+        with ExpectLog(gen_log, "Invalid multipart/form-data: no final"):
+            parser.finish()
+        self.assertEqual(parser.arguments, {})
+
+    def test_no_boundary(self):
+        with self.assertRaises(ValueError):
+            MultipartFormDataParser("multipart/form-data")
+        with self.assertRaises(ValueError):
+            MultipartFormDataParser("text/plain; boundary=1234")
+
+
 class HTTPHeadersTest(unittest.TestCase):
     def test_multi_line(self):
         # Lines beginning with whitespace are appended to the previous line
@@ -359,6 +443,43 @@ class HTTPServerRequestTest(unittest.TestCase):
         requets = HTTPServerRequest(uri='/')
         self.assertIsInstance(requets.body, bytes)
 
+    def test_lazy_arguments(self):
+        request = HTTPServerRequest(uri='/?a=1&b=2&a=3')
+        self.assertIsNone(request._query_arguments)
+        self.assertEqual(request.query_arguments,
+                         {'a': [b'1', b'3'], 'b': [b'2']})
+        self.assertEqual(request.arguments, request.query_arguments)
+        # The two dicts can be modified independently.
+        request.arguments['a'].append(b'4')
+        self.assertEqual(request.query_arguments['a'], [b'1', b'3'])
+
+    def test_lazy_body_arguments(self):
+        request = HTTPServerRequest(
+            method='POST', uri='/?a=1',
+            headers=HTTPHeaders({
+                'Content-Type': 'application/x-www-form-urlencoded'}),
+            body=b'a=2&c=3')
+        request._parse_body()
+        self.assertTrue(request._body_pending)
+        self.assertEqual(request.arguments, {'a': [b'1', b'2'], 'c': [b'3']})
+        self.assertFalse(request._body_pending)
+        self.assertEqual(request.body_arguments, {'a': [b'2'], 'c': [b'3']})
+        self.assertEqual(request.query_arguments, {'a': [b'1']})
+        self.assertEqual(request.files, {})
+
+    def test_body_parsed_after_arguments(self):
+        # Arguments read before the body arrives are updated (not
+        # replaced) once it is parsed.
+        request = HTTPServerRequest(
+            method='POST', uri='/?a=1',
+            headers=HTTPHeaders({
+                'Content-Type': 'application/x-www-form-urlencoded'}))
+        arguments = request.arguments
+        request.body = b'a=2'
+        request._parse_body()
+        self.assertIs(request.arguments, arguments)
+        self.assertEqual(arguments, {'a': [b'1', b'2']})
+
 
 class ParseRequestStartLineTest(unittest.TestCase):
     METHOD = "GET"
@@ -5,13 +5,18 @@ from __future__ import absolute_import, division, print_function, with_statement
 import contextlib
 import datetime
 import functools
+import itertools
+import json
+import random
 import socket
 import sys
 import threading
 import time
 
 from tornado import gen
-from tornado.ioloop import IOLoop, TimeoutError, PollIOLoop, PeriodicCallback
+from tornado import stack_context
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop, TimeoutError, PollIOLoop, PeriodicCallback, _Timeout, _TimerWheel
 from tornado.log import app_log
 from tornado.platform.select import _Select
 from tornado.stack_context import ExceptionStackContext, StackContext, wrap, NullContext
@@ -50,10 +55,11 @@ class FakeTimeIOLoop(PollIOLoop):
     For use when testing code that involves the passage of time
     and no external dependencies.
     """
-    def initialize(self):
+    def initialize(self, **kwargs):
         self.fts = FakeTimeSelect()
         super(FakeTimeIOLoop, self).initialize(impl=self.fts,
-                                               time_func=self.fts.time)
+                                               time_func=self.fts.time,
+                                               **kwargs)
 
     def sleep(self, t):
         """Simulate a blocking sleep by advancing the clock."""
@@ -417,8 +423,166 @@ class TestIOLoop(AsyncTestCase):
             server.close()
 
 
+@unittest.skipIf(not issubclass(IOLoop.configured_class(), PollIOLoop),
+                 'stats are only collected by PollIOLoop')
+class TestIOLoopStats(AsyncTestCase):
+    def test_disabled(self):
+        self.assertIsNone(self.io_loop.get_stats())
+        self.io_loop.enable_stats()
+        self.assertIsNotNone(self.io_loop.get_stats())
+        self.io_loop.disable_stats()
+        self.assertIsNone(self.io_loop.get_stats())
+
+    def test_stats(self):
+        def slow_callback():
+            time.sleep(0.02)
+
+        def handle_read(fd, events):
+            fd.recv(1024)
+            self.io_loop.remove_handler(fd)
+            self.stop()
+
+        self.io_loop.enable_stats(slowest=2)
+        client, server = socket.socketpair()
+        server_fd = server.fileno()
+        try:
+            self.io_loop.add_callback(slow_callback)
+            self.io_loop.add_callback(lambda: None)
+            self.io_loop.call_later(0.01, client.send, b'abc')
+            self.io_loop.add_handler(server, handle_read, self.io_loop.READ)
+            self.wait()
+        finally:
+            client.close()
+            server.close()
+
+        stats = self.io_loop.get_stats()
+        # The result can be served as JSON.
+        json.dumps(stats)
+        self.assertGreater(stats['iterations'], 0)
+        self.assertEqual(stats['max_callbacks_per_iteration'], 2)
+        phases = stats['phases']
+        self.assertGreaterEqual(phases['callbacks']['count'], 2)
+        self.assertGreaterEqual(phases['timeouts']['count'], 1)
+        self.assertGreaterEqual(phases['handlers']['count'], 1)
+        self.assertGreaterEqual(phases['poll']['count'], 1)
+        self.assertEqual(sum(n for bound, n in phases['callbacks']['buckets']),
+                         phases['callbacks']['count'])
+        self.assertGreaterEqual(phases['callbacks']['max'], 0.02)
+        self.assertEqual(stats['loop_lag']['count'],
+                         phases['timeouts']['count'])
+        self.assertIn(server_fd, [fd['fd'] for fd in stats['busiest_fds']])
+        slowest = stats['slowest_callbacks']
+        self.assertEqual(len(slowest), 2)
+        self.assertTrue(slowest[0]['name'].endswith('slow_callback'),
+                        slowest[0]['name'])
+        self.assertGreaterEqual(slowest[0]['seconds'], slowest[1]['seconds'])
+
+
 # Deliberately not a subclass of AsyncTestCase so the IOLoop isn't
 # automatically set as current.
+@unittest.skipIf(not issubclass(IOLoop.configured_class(), PollIOLoop),
+                 'timer_wheel is a PollIOLoop option')
+class TestIOLoopTimerWheel(TestIOLoop):
+    def get_new_ioloop(self):
+        return IOLoop(timer_wheel=True)
+
+
+class TestTimerWheel(unittest.TestCase):
+    def setUp(self):
+        self.counter = itertools.count()
+
+    def make_timeout(self, deadline):
+        timeout = _Timeout(deadline, None, self)
+        timeout.callback = deadline
+        return timeout
+
+    @property
+    def _timeout_counter(self):
+        return self.counter
+
+    def test_order(self):
+        # Deadlines on every level of the wheel, some with ties.
+        random.seed(1)
+        start = 1000.0
+        deadlines = [start + random.choice([0.001, 0.5, 30, 5000, 1e6]) *
+                     random.random() for i in range(2000)]
+        deadlines += [start + 10, start + 10, start - 5, start + 1e9]
+        wheel = _TimerWheel(start)
+        timeouts = [self.make_timeout(d) for d in deadlines]
+        for timeout in timeouts:
+            wheel.add(timeout)
+        removed = set(timeouts[::3])
+        for timeout in removed:
+            wheel.remove(timeout)
+        self.assertEqual(len(wheel), len(timeouts) - len(removed))
+        now = start
+        fired = []
+        while wheel:
+            due = wheel.pop_due(now)
+            for timeout in due:
+                self.assertLessEqual(timeout.deadline, now)
+            fired.extend(t for t in due if t.callback is not None)
+            now = max(now, wheel.next_deadline()) if wheel else now
+        expected = sorted(t for t in timeouts if t not in removed)
+        self.assertEqual(fired, expected)
+
+    def test_remove_frees_memory(self):
+        wheel = _TimerWheel(0)
+        for i in range(1000):
+            timeout = self.make_timeout(60 + i / 1000.0)
+            wheel.add(timeout)
+            wheel.remove(timeout)
+        self.assertEqual(len(wheel), 0)
+        self.assertEqual(sum(len(bucket) for level in wheel._wheels
+                             for bucket in level.values()), 0)
+
+    def test_next_deadline(self):
+        wheel = _TimerWheel(0)
+        wheel.add(self.make_timeout(0.105))
+        wheel.add(self.make_timeout(10.5))
+        self.assertEqual(wheel.next_deadline(), 0.105)
+        self.assertEqual(len(wheel.pop_due(0.105)), 1)
+        # The second timeout is on the second wheel: wake up when its
+        # slot is emptied into the first wheel, then at its deadline.
+        self.assertAlmostEqual(wheel.next_deadline(), 10.24)
+        self.assertEqual(wheel.pop_due(wheel.next_deadline()), [])
+        self.assertEqual(wheel.next_deadline(), 10.5)
+        self.assertEqual(len(wheel.pop_due(10.5)), 1)
+
+    def test_shorter_timeout_after_next_deadline(self):
+        # next_deadline moves the tick of the 2.0 timeout to the heap
+        # ahead of time; a shorter timeout added afterwards must still
+        # be seen first.
+        wheel = _TimerWheel(0)
+        wheel.add(self.make_timeout(2.0))
+        self.assertEqual(wheel.next_deadline(), 2.0)
+        wheel.add(self.make_timeout(0.35))
+        self.assertEqual(wheel.next_deadline(), 0.35)
+        self.assertEqual([t.deadline for t in wheel.pop_due(0.35)], [0.35])
+        self.assertEqual(wheel.next_deadline(), 2.0)
+
+    def test_next_deadline_random(self):
+        # next_deadline is never later than the earliest deadline, no
+        # matter when timeouts are added.
+        random.seed(2)
+        now = 0.0
+        wheel = _TimerWheel(now)
+        live = []
+        for i in range(3000):
+            if random.random() < 0.6 or not live:
+                timeout = self.make_timeout(
+                    now + random.choice([0.001, 0.5, 5, 500]) * random.random())
+                wheel.add(timeout)
+                live.append(timeout)
+            deadline = wheel.next_deadline()
+            self.assertLessEqual(deadline,
+                                 min(t.deadline for t in live) + 1e-9)
+            if random.random() < 0.3:
+                now = max(now, deadline)
+                for timeout in wheel.pop_due(now):
+                    live.remove(timeout)
+
+
 class TestIOLoopCurrent(unittest.TestCase):
     def setUp(self):
         self.io_loop = None
@@ -512,6 +676,48 @@ class TestIOLoopAddCallback(AsyncTestCase):
         result = self.wait()
         self.assertEqual(result, (1, 2))
 
+    def test_no_context(self):
+        # Callbacks added while no StackContext is active run with no
+        # active contexts, even if the IOLoop is started inside one.
+        def f1(foo, bar):
+            self.assertEqual(stack_context._state.contexts, ((), None))
+            self.stop((foo, bar))
+
+        with StackContext(functools.partial(self.context, 'c1')):
+            with NullContext():
+                self.add_callback(f1, 1, bar=2)
+            result = self.wait()
+        self.assertEqual(result, (1, 2))
+
+    def test_leaked_context(self):
+        # A callback that leaves a StackContext active must not leak it
+        # into the callbacks that run after it.
+        def f1():
+            StackContext(functools.partial(self.context, 'c1')).__enter__()
+
+        def f2():
+            self.assertEqual(stack_context._state.contexts, ((), None))
+            self.stop()
+
+        with NullContext():
+            self.add_callback(f1)
+            self.add_callback(f2)
+        self.wait()
+
+    def test_add_future_context(self):
+        # add_future callbacks run in the context add_future was called
+        # in, not in the context that resolved the future.
+        def f1(future):
+            self.assertNotIn('c2', self.active_contexts)
+            self.stop()
+
+        future = Future()
+        with NullContext():
+            self.io_loop.add_future(future, f1)
+        with StackContext(functools.partial(self.context, 'c2')):
+            future.set_result(None)
+        self.wait()
+
 
 class TestIOLoopAddCallbackFromSignal(TestIOLoopAddCallback):
     # Repeat the add_callback tests using add_callback_from_signal
@@ -654,5 +860,11 @@ class TestPeriodicCallback(unittest.TestCase):
         self.assertEqual(calls, expected)
 
 
+class TestPeriodicCallbackTimerWheel(TestPeriodicCallback):
+    def setUp(self):
+        self.io_loop = FakeTimeIOLoop(timer_wheel=True)
+        self.io_loop.make_current()
+
+
 if __name__ == "__main__":
     unittest.main()
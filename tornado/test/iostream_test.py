@@ -2,7 +2,7 @@ from __future__ import absolute_import, division, print_function, with_statement
 from tornado.concurrent import Future
 from tornado import gen
 from tornado import netutil
-from tornado.iostream import IOStream, SSLIOStream, PipeIOStream, StreamClosedError
+from tornado.iostream import IOStream, SSLIOStream, PipeIOStream, StreamClosedError, StreamBufferFullError
 from tornado.httputil import HTTPHeaders
 from tornado.log import gen_log, app_log
 from tornado.netutil import ssl_wrap_socket
@@ -18,6 +18,7 @@ import platform
 import socket
 import ssl
 import sys
+import tempfile
 
 try:
     from unittest import mock  # python 3.3
@@ -714,6 +715,22 @@ class TestIOStreamMixin(object):
             server.close()
             client.close()
 
+    def test_read_until_regex_anchored_after_partial_read(self):
+        server, client = self.make_iostream_pair()
+        try:
+            server.write(b"abc\nfoo\n")
+            client.read_until(b"\n", self.stop)
+            self.assertEqual(self.wait(), b"abc\n")
+            # Consumed bytes must not be visible to anchors or lookbehinds.
+            client.read_until_regex(b"^foo", self.stop)
+            self.assertEqual(self.wait(), b"foo")
+            server.write(b"xbar")
+            client.read_until_regex(b"(?<!\n)bar", self.stop)
+            self.assertEqual(self.wait(), b"\nxbar")
+        finally:
+            server.close()
+            client.close()
+
     def test_read_until_regex_max_bytes_inline(self):
         server, client = self.make_iostream_pair()
         client.set_close_callback(lambda: self.stop("closed"))
@@ -777,6 +794,198 @@ class TestIOStreamMixin(object):
             server.close()
             client.close()
 
+    def test_mixed_reads_from_buffer(self):
+        # Delimiters and regexes split across writes are found, and
+        # reads that follow partially-consumed data see the right bytes.
+        server, client = self.make_iostream_pair()
+        try:
+            server.write(b"abc\r")
+            client.read_bytes(2, self.stop)
+            self.assertEqual(self.wait(), b"ab")
+            server.write(b"\ndef\r\n\r")
+            client.read_until(b"\r\n", self.stop)
+            self.assertEqual(self.wait(), b"c\r\n")
+            server.write(b"\nghi")
+            client.read_until_regex(b"\r?\n\r?\n", self.stop)
+            self.assertEqual(self.wait(), b"def\r\n\r\n")
+            client.read_bytes(3, self.stop)
+            self.assertEqual(self.wait(), b"ghi")
+            self.assertEqual(client._read_buffer_size, 0)
+        finally:
+            server.close()
+            client.close()
+
+    def test_many_small_writes(self):
+        # Enough data to fill the socket buffers, so writes queue up and
+        # are sent several at a time with partial sends in between.
+        server, client = self.make_iostream_pair()
+        server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        try:
+            chunks = [("%06d" % i).encode() * 100 for i in range(2000)]
+            for chunk in chunks:
+                server.write(chunk)
+            server.write(b"x" * 300 * 1024)
+            expected = b"".join(chunks) + b"x" * 300 * 1024
+            client.read_bytes(len(expected), self.stop)
+            self.assertEqual(self.wait(), expected)
+        finally:
+            server.close()
+            client.close()
+
+    def test_read_into(self):
+        server, client = self.make_iostream_pair()
+        try:
+            buf = bytearray(10)
+            client.read_into(buf, self.stop)
+            server.write(b"hello")
+            self.io_loop.add_timeout(self.io_loop.time() + 0.05, self.stop)
+            # Not enough data yet; only the timeout fires.
+            self.assertIs(self.wait(), None)
+            server.write(b"world!!")
+            self.assertEqual(self.wait(), 10)
+            self.assertEqual(bytes(buf), b"helloworld")
+            # The two extra bytes are left for the next read.
+            client.read_bytes(2, self.stop)
+            self.assertEqual(self.wait(), b"!!")
+        finally:
+            server.close()
+            client.close()
+
+    def test_read_into_partial(self):
+        server, client = self.make_iostream_pair()
+        try:
+            buf = bytearray(10)
+            server.write(b"abcd")
+            client.read_until(b"b", self.stop)
+            self.assertEqual(self.wait(), b"ab")
+            # Buffered data satisfies a partial read immediately.
+            client.read_into(buf, self.stop, partial=True)
+            self.assertEqual(self.wait(), 2)
+            self.assertEqual(bytes(buf[:2]), b"cd")
+            client.read_into(memoryview(buf)[2:], self.stop, partial=True)
+            server.write(b"efg")
+            self.assertEqual(self.wait(), 3)
+            self.assertEqual(bytes(buf[:5]), b"cdefg")
+        finally:
+            server.close()
+            client.close()
+
+    def test_read_into_large(self):
+        server, client = self.make_iostream_pair()
+        try:
+            data = os.urandom(1024 * 1024)
+            buf = bytearray(len(data))
+            client.read_into(buf, self.stop)
+            server.write(data)
+            self.assertEqual(self.wait(), len(data))
+            self.assertEqual(bytes(buf), data)
+        finally:
+            server.close()
+            client.close()
+
+    def test_read_into_future_close(self):
+        server, client = self.make_iostream_pair()
+        try:
+            future = client.read_into(bytearray(10))
+            server.write(b"abc")
+            server.close()
+            self.io_loop.add_future(future, self.stop)
+            future = self.wait()
+            self.assertRaises(StreamClosedError, future.result)
+        finally:
+            server.close()
+            client.close()
+
+    def test_write_watermarks(self):
+        server, client = self.make_iostream_pair()
+        server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        try:
+            server.set_write_watermarks(64 * 1024, 16 * 1024)
+            # Below the high watermark, wait_for_drain resolves at once.
+            server.write(b"a" * 1024)
+            self.assertTrue(server.wait_for_drain().done())
+            server.write(b"b" * 1024 * 1024)
+            future = server.wait_for_drain()
+            self.assertFalse(future.done())
+            self.assertTrue(server._write_buffer_size > 16 * 1024)
+            client.read_bytes(1025 * 1024, self.stop)
+            self.io_loop.add_future(future, self.stop)
+            self.wait()
+            self.assertTrue(server._write_buffer_size <= 16 * 1024)
+            self.assertIs(future.result(), None)
+            self.wait()
+        finally:
+            server.close()
+            client.close()
+
+    def test_wait_for_drain_close(self):
+        server, client = self.make_iostream_pair()
+        server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        try:
+            server.set_write_watermarks(1024)
+            server.write(b"x" * 1024 * 1024)
+            future = server.wait_for_drain()
+            server.close()
+            self.io_loop.add_future(future, self.stop)
+            self.assertRaises(StreamClosedError, self.wait().result)
+        finally:
+            server.close()
+            client.close()
+
+    def test_wait_for_drain_without_watermarks(self):
+        server, client = self.make_iostream_pair()
+        try:
+            server.write(b"abc")
+            server.wait_for_drain(self.stop)
+            self.wait()
+            self.assertFalse(server.writing())
+        finally:
+            server.close()
+            client.close()
+
+    def test_write_watermark_overflow_policies(self):
+        server, client = self.make_iostream_pair()
+        try:
+            # Dropping arbitrary bytes would corrupt the stream.
+            self.assertRaises(ValueError, server.set_write_watermarks,
+                              1024, overflow="drop")
+            self.assertRaises(ValueError, server.set_write_watermarks,
+                              1024, overflow="bogus")
+        finally:
+            server.close()
+            client.close()
+
+    def test_write_watermark_close_large_write(self):
+        server, client = self.make_iostream_pair()
+        try:
+            # A write bigger than the high watermark is accepted while
+            # the buffer is below it.
+            server.set_write_watermarks(1024, overflow="close")
+            server.write(b"x" * 4096, callback=server.close)
+            client.read_until_close(self.stop)
+            self.assertEqual(self.wait(), b"x" * 4096)
+            self.assertIs(server.error, None)
+        finally:
+            server.close()
+            client.close()
+
+    def test_write_watermark_close(self):
+        server, client = self.make_iostream_pair()
+        server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        try:
+            server.set_write_watermarks(64 * 1024, overflow="close")
+            with self.assertRaises(StreamClosedError):
+                for i in range(100):
+                    server.write(b"x" * 4096)
+            self.assertTrue(server.closed())
+            self.assertIsInstance(server.error, StreamBufferFullError)
+            # The stream was closed before this write.
+            self.assertTrue(i > 0)
+            self.assertRaises(StreamClosedError, server.wait_for_drain)
+        finally:
+            server.close()
+            client.close()
+
     def test_flow_control(self):
         MB = 1024 * 1024
         server, client = self.make_iostream_pair(max_buffer_size=5 * MB)
@@ -816,6 +1025,45 @@ class TestIOStream(TestIOStreamMixin, AsyncTestCase):
     def _make_client_iostream(self, connection, **kwargs):
         return IOStream(connection, **kwargs)
 
+    @unittest.skipIf(not hasattr(os, 'sendfile'), 'os.sendfile not present')
+    def test_write_file(self):
+        server, client = self.make_iostream_pair()
+        server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        data = os.urandom(1024 * 1024)
+        with tempfile.TemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            try:
+                # File data is sent in order with regular writes around
+                # it, and only the requested range is sent.
+                server.write(b"head")
+                server.write_file(f.fileno(), 100, len(data) - 200)
+                server.write(b"tail", callback=self.stop)
+                expected = b"head" + data[100:-100] + b"tail"
+                client.read_bytes(len(expected), self.stop)
+                results = [self.wait(), self.wait()]
+                self.assertIn(None, results)
+                self.assertIn(expected, results)
+            finally:
+                server.close()
+                client.close()
+
+    @unittest.skipIf(not hasattr(os, 'sendfile'), 'os.sendfile not present')
+    def test_write_file_truncated(self):
+        server, client = self.make_iostream_pair()
+        with tempfile.TemporaryFile() as f:
+            f.write(b"12345")
+            f.flush()
+            try:
+                client.read_until_close(self.stop)
+                with ExpectLog(gen_log, "Write error"):
+                    server.write_file(f.fileno(), 0, 10)
+                    self.assertEqual(self.wait(), b"12345")
+                self.assertTrue(server.closed())
+            finally:
+                server.close()
+                client.close()
+
 
 class TestIOStreamSSL(TestIOStreamMixin, AsyncTestCase):
     def _make_server_iostream(self, connection, **kwargs):
@@ -1077,6 +1325,25 @@ class TestPipeIOStream(AsyncTestCase):
 
         rs.close()
 
+    def test_pipe_iostream_read_into(self):
+        r, w = os.pipe()
+
+        rs = PipeIOStream(r, io_loop=self.io_loop)
+        ws = PipeIOStream(w, io_loop=self.io_loop)
+
+        ws.write(b"hello world")
+
+        buf = bytearray(5)
+        rs.read_into(buf, self.stop)
+        self.assertEqual(self.wait(), 5)
+        self.assertEqual(bytes(buf), b"hello")
+
+        rs.read_until_close(self.stop)
+        ws.close()
+        self.assertEqual(self.wait(), b" world")
+
+        rs.close()
+
     def test_pipe_iostream_big_write(self):
         r, w = os.pipe()
 
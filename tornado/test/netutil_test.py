@@ -7,7 +7,10 @@ from subprocess import Popen
 import sys
 import time
 
-from tornado.netutil import BlockingResolver, ThreadedResolver, is_valid_ip, bind_sockets
+from tornado.concurrent import Future
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.netutil import BlockingResolver, ThreadedResolver, CachingResolver, Resolver, is_valid_ip, bind_sockets
 from tornado.stack_context import ExceptionStackContext
 from tornado.testing import AsyncTestCase, gen_test, bind_unused_port
 from tornado.test.util import unittest, skipIfNoNetwork
@@ -119,6 +122,117 @@ class ThreadedResolverErrorTest(AsyncTestCase, _ResolverErrorTestMixin):
         super(ThreadedResolverErrorTest, self).tearDown()
 
 
+@skipIfNoNetwork
+class CachingResolverTest(AsyncTestCase, _ResolverTestMixin):
+    def setUp(self):
+        super(CachingResolverTest, self).setUp()
+        self.resolver = CachingResolver(BlockingResolver(io_loop=self.io_loop),
+                                        io_loop=self.io_loop)
+
+
+class CachingResolverErrorTest(AsyncTestCase, _ResolverErrorTestMixin):
+    def setUp(self):
+        super(CachingResolverErrorTest, self).setUp()
+        self.resolver = CachingResolver(BlockingResolver(io_loop=self.io_loop),
+                                        io_loop=self.io_loop)
+        self.real_getaddrinfo = socket.getaddrinfo
+        socket.getaddrinfo = _failing_getaddrinfo
+
+    def tearDown(self):
+        socket.getaddrinfo = self.real_getaddrinfo
+        super(CachingResolverErrorTest, self).tearDown()
+
+
+class _CountingResolver(Resolver):
+    """Resolves every host to 10.0.0.N, where N counts the lookups.
+
+    Hosts starting with ``bad`` fail.
+    """
+    def initialize(self):
+        self.lookups = []
+
+    def resolve(self, host, port, family=socket.AF_UNSPEC):
+        self.lookups.append(host)
+        future = Future()
+        if host.startswith('bad'):
+            result = IOError('lookup failed')
+        else:
+            result = [(socket.AF_INET, ('10.0.0.%d' % len(self.lookups), port))]
+
+        def resolved():
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        IOLoop.current().add_callback(resolved)
+        return future
+
+
+class CachingResolverCacheTest(AsyncTestCase):
+    def setUp(self):
+        super(CachingResolverCacheTest, self).setUp()
+        self.wrapped = _CountingResolver()
+        self.resolver = CachingResolver(self.wrapped, ttl=60, negative_ttl=5,
+                                        max_entries=2, io_loop=self.io_loop)
+
+    def age(self, seconds):
+        # Make the cached entries older instead of waiting.
+        cache = self.resolver._cache
+        for key, (expires, refresh_at, addresses, exc_info) in cache.items():
+            if refresh_at is not None:
+                refresh_at -= seconds
+            cache[key] = (expires - seconds, refresh_at, addresses, exc_info)
+
+    @gen.coroutine
+    def resolve(self, host):
+        result = yield self.resolver.resolve(host, 80)
+        raise gen.Return(result[0][1][0])
+
+    @gen_test
+    def test_cache(self):
+        self.assertEqual((yield self.resolve('a')), '10.0.0.1')
+        self.assertEqual((yield self.resolve('a')), '10.0.0.1')
+        self.assertEqual((yield self.resolve('b')), '10.0.0.2')
+        self.age(61)
+        self.assertEqual((yield self.resolve('a')), '10.0.0.3')
+        self.assertEqual(self.wrapped.lookups, ['a', 'b', 'a'])
+
+    @gen_test
+    def test_coalesce(self):
+        results = yield [self.resolve('a') for i in range(3)]
+        self.assertEqual(results, ['10.0.0.1'] * 3)
+        self.assertEqual(self.wrapped.lookups, ['a'])
+
+    @gen_test
+    def test_negative_cache(self):
+        for i in range(2):
+            with self.assertRaises(IOError):
+                yield self.resolve('bad')
+        self.assertEqual(self.wrapped.lookups, ['bad'])
+        self.age(6)
+        with self.assertRaises(IOError):
+            yield self.resolve('bad')
+        self.assertEqual(self.wrapped.lookups, ['bad', 'bad'])
+
+    @gen_test
+    def test_refresh(self):
+        self.assertEqual((yield self.resolve('a')), '10.0.0.1')
+        self.age(50)
+        # The cached result is returned while it is refreshed.
+        self.assertEqual((yield self.resolve('a')), '10.0.0.1')
+        self.assertEqual(self.wrapped.lookups, ['a', 'a'])
+        while self.resolver._pending:
+            yield gen.moment
+        self.assertEqual((yield self.resolve('a')), '10.0.0.2')
+        self.assertEqual(self.wrapped.lookups, ['a', 'a'])
+
+    @gen_test
+    def test_max_entries(self):
+        for host in ['a', 'b', 'c', 'a']:
+            yield self.resolve(host)
+        self.assertEqual(self.wrapped.lookups, ['a', 'b', 'c', 'a'])
+
+
 @skipIfNoNetwork
 @unittest.skipIf(futures is None, "futures module not present")
 @unittest.skipIf(sys.platform == 'win32', "preexec_fn not available on win32")
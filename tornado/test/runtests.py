@@ -21,10 +21,10 @@ except NameError:
 
 TEST_MODULES = [
     'tornado.httputil.doctests',
-    'tornado.iostream.doctests',
     'tornado.util.doctests',
     'tornado.test.asyncio_test',
     'tornado.test.auth_test',
+    'tornado.test.autoreload_test',
     'tornado.test.concurrent_test',
     'tornado.test.curl_httpclient_test',
     'tornado.test.escape_test',
@@ -17,11 +17,11 @@ from tornado.httpclient import AsyncHTTPClient
 from tornado.httputil import HTTPHeaders, ResponseStartLine
 from tornado.ioloop import IOLoop
 from tornado.log import gen_log
-from tornado.netutil import Resolver, bind_sockets
+from tornado.netutil import Resolver, add_accept_handler, bind_sockets
 from tornado.simple_httpclient import SimpleAsyncHTTPClient
 from tornado.test.httpclient_test import ChunkHandler, CountdownHandler, HelloWorldHandler, RedirectHandler
 from tornado.test import httpclient_test
-from tornado.testing import AsyncHTTPTestCase, AsyncHTTPSTestCase, AsyncTestCase, ExpectLog
+from tornado.testing import AsyncHTTPTestCase, AsyncHTTPSTestCase, AsyncTestCase, ExpectLog, bind_unused_port, gen_test
 from tornado.test.util import skipOnTravis, skipIfNoIPv6, refusing_port, unittest, skipBefore35, exec_test
 from tornado.web import RequestHandler, Application, asynchronous, url, stream_request_body
 
@@ -197,6 +197,97 @@ class SimpleHTTPClientTestMixin(object):
             response = self.wait()
             response.rethrow()
 
+    def host_url(self, host, path):
+        return "%s://%s:%s%s" % (self.get_protocol(), host,
+                                 self.get_http_port(), path)
+
+    def test_per_host_connection_limit(self):
+        mapping = {"host-a": "127.0.0.1", "host-b": "127.0.0.1"}
+        with closing(self.create_client(max_clients=3, max_clients_per_host=1,
+                                        hostname_mapping=mapping)) as client:
+            seen = []
+            for host in ["host-a", "host-a", "host-b"]:
+                client.fetch(self.host_url(host, "/trigger"),
+                             lambda response, host=host: (seen.append(host),
+                                                          self.stop()))
+            self.wait(condition=lambda: len(self.triggers) == 2)
+            self.assertEqual(len(client.queue), 1)
+            stats = client.get_queue_stats()
+            self.assertEqual((stats["active"], stats["queued"]), (2, 1))
+            hosts = dict((host.split("//")[1].split(":")[0], info)
+                         for host, info in stats["hosts"].items())
+            self.assertEqual((hosts["host-a"]["active"],
+                              hosts["host-a"]["queued"]), (1, 1))
+            self.assertEqual((hosts["host-b"]["active"],
+                              hosts["host-b"]["queued"]), (1, 0))
+
+            # Finishing the first host-a request lets the second one in
+            self.triggers.popleft()()
+            self.triggers.popleft()()
+            self.wait(condition=lambda: (len(self.triggers) == 1 and
+                                         len(seen) == 2))
+            self.triggers.popleft()()
+            self.wait(condition=lambda: len(seen) == 3)
+            self.assertEqual(sorted(seen), ["host-a", "host-a", "host-b"])
+            stats = client.get_queue_stats()
+            self.assertEqual((stats["active"], stats["queued"]), (0, 0))
+            self.assertEqual(stats["dispatched"], 3)
+            self.assertTrue(stats["wait_time_max"] > 0)
+
+    def test_priority(self):
+        with closing(self.create_client(max_clients=1)) as client:
+            seen = []
+            client.fetch(self.get_url("/trigger"), self.stop)
+            self.wait()
+            for priority in [0, 5, 1, 5]:
+                client.fetch(self.get_url("/hello"),
+                             lambda response, p=priority: (seen.append(p),
+                                                           self.stop()),
+                             priority=priority)
+            self.assertEqual(client.get_queue_stats()["queued"], 4)
+            self.triggers.popleft()()
+            self.wait(condition=lambda: len(seen) == 4)
+            self.assertEqual(seen, [5, 5, 1, 0])
+
+    def check_time_info(self, response):
+        info = response.time_info
+        self.assertEqual(sorted(info), ["appconnect", "connect", "namelookup",
+                                        "pretransfer", "queue", "redirect",
+                                        "starttransfer", "total"])
+        self.assertTrue(info["queue"] >= 0, info)
+        if self.get_protocol() == "https":
+            self.assertTrue(info["connect"] <= info["appconnect"], info)
+        else:
+            self.assertEqual(info["appconnect"], 0, info)
+        self.assertTrue(info["redirect"] <= info["namelookup"] <=
+                        info["connect"] <= info["pretransfer"] <=
+                        info["starttransfer"] <= info["total"], info)
+
+    def test_time_info(self):
+        response = self.fetch("/hello")
+        self.check_time_info(response)
+        self.assertEqual(response.time_info["redirect"], 0)
+        # Timings of a second request (on a pooled connection, if
+        # enabled) cover the same phases.
+        self.check_time_info(self.fetch("/hello"))
+
+    def test_time_info_redirect(self):
+        response = self.fetch("/countdown/2")
+        self.assertEqual(response.code, 200)
+        self.check_time_info(response)
+        self.assertTrue(response.time_info["redirect"] > 0)
+
+    @gen_test
+    def test_time_info_error(self):
+        with ExpectLog(gen_log, ".*", required=False):
+            response = yield self.http_client.fetch(
+                self.get_url("/hang"), request_timeout=0.1,
+                raise_error=False)
+        self.assertEqual(response.code, 599)
+        self.assertTrue(response.time_info["total"] >= 0.1)
+        self.assertTrue("pretransfer" in response.time_info)
+        self.assertFalse("starttransfer" in response.time_info)
+
     def test_gzip(self):
         # All the tests in this file should be using gzip, but this test
         # ensures that it is in fact getting compressed.
@@ -474,6 +565,13 @@ class SimpleHTTPClientTestCase(SimpleHTTPClientTestMixin, AsyncHTTPTestCase):
                                      **kwargs)
 
 
+class PooledSimpleHTTPClientTestCase(SimpleHTTPClientTestCase):
+    def create_client(self, **kwargs):
+        kwargs.setdefault('max_idle_connections_per_host', 2)
+        return super(PooledSimpleHTTPClientTestCase, self).create_client(
+            **kwargs)
+
+
 class SimpleHTTPSClientTestCase(SimpleHTTPClientTestMixin, AsyncHTTPSTestCase):
     def setUp(self):
         super(SimpleHTTPSClientTestCase, self).setUp()
@@ -554,6 +652,171 @@ class CreateAsyncHTTPClientTestCase(AsyncTestCase):
             self.assertEqual(client.max_clients, 14)
 
 
+class PeerPortHandler(RequestHandler):
+    def get(self):
+        if self.get_argument("close", None):
+            self.set_header("Connection", "close")
+        self.write(str(self.request.connection.stream.socket.getpeername()[1]))
+
+
+class ConnectionPoolTest(AsyncHTTPTestCase):
+    def get_app(self):
+        return Application([url("/port", PeerPortHandler),
+                            url("/echo_post", EchoPostHandler)])
+
+    def create_client(self, **kwargs):
+        return SimpleAsyncHTTPClient(self.io_loop, force_instance=True,
+                                     **kwargs)
+
+    def fetch_port(self, client, path="/port", **kwargs):
+        url = path if "://" in path else self.get_url(path)
+        client.fetch(url, self.stop, **kwargs)
+        response = self.wait()
+        response.rethrow()
+        return response.body
+
+    def test_no_reuse_by_default(self):
+        with closing(self.create_client()) as client:
+            self.assertNotEqual(self.fetch_port(client),
+                                self.fetch_port(client))
+            self.assertEqual(client._idle_connections, {})
+
+    def test_sequential_reuse(self):
+        with closing(self.create_client(
+                max_idle_connections_per_host=2)) as client:
+            first = self.fetch_port(client)
+            self.assertEqual(self.fetch_port(client), first)
+            client.fetch(self.get_url("/echo_post"), self.stop,
+                         method="POST", body=b"hello")
+            response = self.wait()
+            self.assertEqual(response.body, b"hello")
+            self.assertEqual(self.fetch_port(client), first)
+
+    def test_concurrent_reuse(self):
+        with closing(self.create_client(
+                max_idle_connections_per_host=2)) as client:
+            @gen.coroutine
+            def fetch_many():
+                responses = yield [client.fetch(self.get_url("/port"))
+                                   for i in range(3)]
+                raise gen.Return(set(r.body for r in responses))
+            first = self.io_loop.run_sync(fetch_many)
+            self.assertEqual(len(first), 3)
+            idle = list(client._idle_connections.values())
+            self.assertEqual(len(idle), 1)
+            self.assertEqual(len(idle[0]), 2)
+            second = self.io_loop.run_sync(fetch_many)
+            self.assertEqual(len(first & second), 2)
+
+    def test_connection_close_header(self):
+        with closing(self.create_client(
+                max_idle_connections_per_host=2)) as client:
+            first = self.fetch_port(client, "/port?close=1")
+            self.assertEqual(client._idle_connections, {})
+            self.assertNotEqual(self.fetch_port(client), first)
+
+    def test_idle_timeout(self):
+        with closing(self.create_client(
+                max_idle_connections_per_host=2,
+                idle_connection_timeout=0.01)) as client:
+            first = self.fetch_port(client)
+            self.io_loop.add_timeout(self.io_loop.time() + 0.1, self.stop)
+            self.wait()
+            self.assertEqual(client._idle_connections, {})
+            self.assertNotEqual(self.fetch_port(client), first)
+
+    def test_server_closes_idle_connection(self):
+        with closing(self.create_client(
+                max_idle_connections_per_host=2)) as client:
+            first = self.fetch_port(client)
+            for streams in client._idle_connections.values():
+                for stream, timeout in streams:
+                    # Simulate the server dropping the connection after
+                    # the client has already picked it up for reuse.
+                    stream.socket.shutdown(socket.SHUT_RDWR)
+            self.assertNotEqual(self.fetch_port(client), first)
+
+    def start_raw_server(self):
+        # A server that answers one request per connection and closes
+        # it without reading the next one, as if its keep-alive timeout
+        # expired just as the client reused the connection.  Each
+        # response body is the number of connections accepted so far.
+        sock, port = bind_unused_port()
+        connections = []
+
+        def accept_callback(connection, address):
+            connections.append(connection)
+            body = str(len(connections)).encode()
+            requests = []
+
+            def on_readable(fd, events):
+                if requests:
+                    self.io_loop.remove_handler(connection)
+                    connection.close()
+                    return
+                requests.append(connection.recv(4096))
+                connection.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: " +
+                                   str(len(body)).encode() + b"\r\n\r\n" +
+                                   body)
+            self.io_loop.add_handler(connection, on_readable,
+                                     self.io_loop.READ)
+        add_accept_handler(sock, accept_callback, io_loop=self.io_loop)
+
+        def cleanup():
+            self.io_loop.remove_handler(sock.fileno())
+            sock.close()
+            for connection in connections:
+                connection.close()
+        self.addCleanup(cleanup)
+        return "http://127.0.0.1:%d/" % port, connections
+
+    def test_server_closes_reused_connection(self):
+        url, connections = self.start_raw_server()
+        with closing(self.create_client(
+                max_idle_connections_per_host=2)) as client:
+            self.assertEqual(self.fetch_port(client, url), b"1")
+            # The request is retried on a new connection.
+            self.assertEqual(self.fetch_port(client, url), b"2")
+            self.assertEqual(len(connections), 2)
+
+    def test_server_close_seen_after_checkout(self):
+        # When the server's close is only noticed after the connection
+        # has left the pool, it is reported by on_connection_close
+        # rather than by a failed read; the request is retried anyway.
+        url, connections = self.start_raw_server()
+        with closing(self.create_client(
+                max_idle_connections_per_host=2)) as client:
+            self.assertEqual(self.fetch_port(client, url), b"1")
+            self.io_loop.remove_handler(connections[0])
+            connections[0].close()
+            get_idle_connection = client._get_idle_connection
+
+            def get_idle_connection_late(key):
+                stream = get_idle_connection(key)
+                if stream is not None:
+                    # Deliver the server's FIN now, before the request
+                    # is written.
+                    stream._handle_events(stream.fileno(), IOLoop.READ)
+                    self.assertTrue(stream.closed())
+                return stream
+            client._get_idle_connection = get_idle_connection_late
+            self.assertEqual(self.fetch_port(client, url), b"2")
+
+    def test_post_not_retried(self):
+        with closing(self.create_client(
+                max_idle_connections_per_host=2)) as client:
+            self.fetch_port(client)
+            for streams in client._idle_connections.values():
+                for stream, timeout in streams:
+                    stream.socket.shutdown(socket.SHUT_RDWR)
+            # A POST is not idempotent, so it must not be replayed on a
+            # new connection.
+            client.fetch(self.get_url("/echo_post"), self.stop,
+                         method="POST", body=b"hello")
+            response = self.wait()
+            self.assertEqual(response.code, 599)
+
+
 class HTTP100ContinueTestCase(AsyncHTTPTestCase):
     def respond_100(self, request):
         self.http1 = request.version.startswith('HTTP/1.')
@@ -118,6 +118,17 @@ class TCPClientTest(AsyncTestCase):
     def test_connect_unspec_dual(self):
         self.do_test_connect(socket.AF_UNSPEC, 'localhost')
 
+    @gen_test
+    def test_connect_timing(self):
+        port = self.start_server(socket.AF_INET)
+        timing = {}
+        start = self.io_loop.time()
+        stream = yield self.client.connect('127.0.0.1', port, timing=timing)
+        stream.close()
+        self.assertEqual(sorted(timing), ["connect", "namelookup"])
+        self.assertTrue(start <= timing["namelookup"] <= timing["connect"] <=
+                        self.io_loop.time(), (start, timing))
+
     @gen_test
     def test_refused_ipv4(self):
         cleanup_func, port = refusing_port()
@@ -7,6 +7,7 @@ from tornado.log import app_log
 from tornado.stack_context import NullContext
 from tornado.tcpserver import TCPServer
 from tornado.testing import AsyncTestCase, ExpectLog, bind_unused_port, gen_test
+from tornado.test.util import unittest
 
 
 class TCPServerTest(AsyncTestCase):
@@ -37,3 +38,58 @@ class TCPServerTest(AsyncTestCase):
                 server.stop()
             if client is not None:
                 client.close()
+
+    @unittest.skipIf(not hasattr(socket, "SO_REUSEPORT"),
+                     "SO_REUSEPORT not supported")
+    @gen_test
+    def test_bind_reuse_port(self):
+        # With reuse_port=True the listening socket is only created by
+        # start(), after any fork.
+        class TestServer(TCPServer):
+            def handle_stream(self, stream, address):
+                stream.write(b"hello", callback=stream.close)
+
+        sock, port = bind_unused_port()
+        sock.close()
+        server = client = None
+        try:
+            with NullContext():
+                server = TestServer()
+                server.bind(port, address="127.0.0.1", reuse_port=True)
+                self.assertEqual(server._sockets, {})
+                self.assertEqual(server._pending_sockets, [])
+                server.start()
+            self.assertEqual(len(server._sockets), 1)
+            sock = list(server._sockets.values())[0]
+            self.assertTrue(sock.getsockopt(socket.SOL_SOCKET,
+                                            socket.SO_REUSEPORT))
+            client = IOStream(socket.socket())
+            yield client.connect(("127.0.0.1", port))
+            data = yield client.read_until_close()
+            self.assertEqual(data, b"hello")
+        finally:
+            if server is not None:
+                server.stop()
+            if client is not None:
+                client.close()
+
+    @unittest.skipIf(not hasattr(socket, "SO_REUSEPORT"),
+                     "SO_REUSEPORT not supported")
+    def test_bind_reuse_port_zero(self):
+        server = TCPServer()
+        with self.assertRaises(ValueError):
+            server.bind(0, address="127.0.0.1", reuse_port=True)
+        self.assertEqual(server._pending_reuse_port, [])
+
+    @unittest.skipIf(not hasattr(socket, "SO_REUSEPORT"),
+                     "SO_REUSEPORT not supported")
+    def test_bind_reuse_port_in_use(self):
+        # The port is checked in bind(), not only after fork in start().
+        sock, port = bind_unused_port()
+        try:
+            server = TCPServer()
+            with self.assertRaises(socket.error):
+                server.bind(port, address="127.0.0.1", reuse_port=True)
+            self.assertEqual(server._pending_reuse_port, [])
+        finally:
+            sock.close()
@@ -12,7 +12,7 @@ from tornado.template import DictLoader
 from tornado.testing import AsyncHTTPTestCase, AsyncTestCase, ExpectLog, gen_test
 from tornado.test.util import unittest, skipBefore35, exec_test
 from tornado.util import u, ObjectDict, unicode_type, timedelta_to_seconds
-from tornado.web import RequestHandler, authenticated, Application, asynchronous, url, HTTPError, StaticFileHandler, _create_signature_v1, create_signed_value, decode_signed_value, ErrorHandler, UIModule, MissingArgumentError, stream_request_body, Finish, removeslash, addslash, RedirectHandler as WebRedirectHandler, get_signature_key_version, GZipContentEncoding
+from tornado.web import RequestHandler, authenticated, Application, asynchronous, url, HTTPError, StaticFileHandler, _create_signature_v1, create_signed_value, decode_signed_value, ErrorHandler, UIModule, MissingArgumentError, stream_request_body, Finish, removeslash, addslash, RedirectHandler as WebRedirectHandler, get_signature_key_version, GZipContentEncoding, _literal_prefix, _URLRouter, cache_response
 
 import binascii
 import contextlib
@@ -24,8 +24,11 @@ from io import BytesIO
 import itertools
 import logging
 import os
+import tempfile
 import re
+import shutil
 import socket
+import zlib
 
 try:
     import urllib.parse as urllib_parse  # py3
@@ -1244,6 +1247,147 @@ class StaticDefaultFilenameTest(WebTestCase):
         self.assertTrue(response.headers['Location'].endswith('/static/dir/'))
 
 
+class StaticFileNoSendfileTest(StaticFileTest):
+    # Repeat the StaticFileTest cases on the get_content code path.
+    def get_app_kwargs(self):
+        return dict(static_path=relpath('static'), static_sendfile=False)
+
+
+class StaticFileCompressedTest(WebTestCase):
+    def get_handlers(self):
+        return []
+
+    def get_app_kwargs(self):
+        return dict(static_path=relpath('static'), compress_response=True)
+
+    def test_compressed(self):
+        # Compressed responses can't be sent with sendfile.
+        response = self.fetch('/static/robots.txt')
+        self.assertEqual(
+            response.headers.get('X-Consumed-Content-Encoding'), 'gzip')
+        self.assertTrue(b"Disallow: /" in response.body)
+
+    def test_uncompressed(self):
+        response = self.fetch('/static/robots.txt', decompress_response=False)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.headers.get('Content-Length'), '26')
+        self.assertTrue(b"Disallow: /" in response.body)
+
+
+class StaticFilePrecompressedTest(WebTestCase):
+    def get_handlers(self):
+        return []
+
+    def get_app_kwargs(self):
+        return dict(static_path=relpath('static'),
+                    static_gzip_precompressed=True)
+
+    def test_precompressed(self):
+        with open(relpath('static/sample.xml.gz'), 'rb') as f:
+            compressed = f.read()
+        response = self.fetch('/static/sample.xml', decompress_response=False,
+                              headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        self.assertIn('xml', response.headers.get('Content-Type'))
+        self.assertEqual(response.headers.get('Vary'), 'Accept-Encoding')
+        self.assertEqual(response.body, compressed)
+
+        plain = self.fetch('/static/sample.xml', decompress_response=False)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(plain.headers.get('Vary'), 'Accept-Encoding')
+        self.assertTrue(plain.body.startswith(b'<?xml'))
+        self.assertNotEqual(plain.headers.get('Etag'),
+                            response.headers.get('Etag'))
+
+    def test_range(self):
+        with open(relpath('static/sample.xml.gz'), 'rb') as f:
+            compressed = f.read()
+        response = self.fetch('/static/sample.xml', decompress_response=False,
+                              headers={'Accept-Encoding': 'gzip',
+                                       'Range': 'bytes=0-9'})
+        self.assertEqual(response.code, 206)
+        self.assertEqual(response.body, compressed[:10])
+        self.assertEqual(response.headers.get('Content-Range'),
+                         'bytes 0-9/%d' % len(compressed))
+
+    def test_no_sibling(self):
+        response = self.fetch('/static/robots.txt', decompress_response=False,
+                              headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertTrue(b"Disallow: /" in response.body)
+
+
+class StaticFileGzipCacheTest(WebTestCase):
+    def setUp(self):
+        self.static_path = tempfile.mkdtemp()
+        self.text = utf8(''.join('line %d\n' % i for i in range(1000)))
+        with open(os.path.join(self.static_path, 'a.txt'), 'wb') as f:
+            f.write(self.text)
+        with open(os.path.join(self.static_path, 'a.bin'), 'wb') as f:
+            f.write(self.text)
+        super(StaticFileGzipCacheTest, self).setUp()
+
+    def tearDown(self):
+        super(StaticFileGzipCacheTest, self).tearDown()
+        StaticFileHandler.reset()
+        shutil.rmtree(self.static_path)
+
+    def get_handlers(self):
+        return []
+
+    def get_app_kwargs(self):
+        return dict(static_path=self.static_path, static_gzip_cache=True)
+
+    def fetch_gzip(self, path, **kwargs):
+        headers = {'Accept-Encoding': 'gzip'}
+        headers.update(kwargs.pop('headers', {}))
+        return self.fetch(path, decompress_response=False, headers=headers,
+                          **kwargs)
+
+    def test_cached(self):
+        response = self.fetch_gzip('/static/a.txt')
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        self.assertEqual(response.headers.get('Content-Type'), 'text/plain')
+        self.assertEqual(int(response.headers['Content-Length']),
+                         len(response.body))
+        self.assertEqual(gzip.GzipFile(fileobj=BytesIO(response.body)).read(),
+                         self.text)
+        self.assertEqual(len(StaticFileHandler._gzip_cache), 1)
+        # The same bytes are served from the cache the second time.
+        self.assertEqual(self.fetch_gzip('/static/a.txt').body, response.body)
+        self.assertEqual(len(StaticFileHandler._gzip_cache), 1)
+
+        # The two representations have different Etags, and each one
+        # matches its own.
+        plain = self.fetch('/static/a.txt', decompress_response=False)
+        self.assertEqual(plain.body, self.text)
+        self.assertNotEqual(plain.headers['Etag'], response.headers['Etag'])
+        response = self.fetch_gzip(
+            '/static/a.txt',
+            headers={'If-None-Match': response.headers['Etag']})
+        self.assertEqual(response.code, 304)
+
+    def test_range(self):
+        full = self.fetch_gzip('/static/a.txt').body
+        response = self.fetch_gzip('/static/a.txt',
+                                   headers={'Range': 'bytes=-10'})
+        self.assertEqual(response.code, 206)
+        self.assertEqual(response.body, full[-10:])
+
+    def test_not_compressible(self):
+        response = self.fetch_gzip('/static/a.bin')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.body, self.text)
+        self.assertEqual(len(StaticFileHandler._gzip_cache), 0)
+
+    def test_cache_size(self):
+        self.fetch_gzip('/static/a.txt')
+        size = StaticFileHandler._gzip_cache_size
+        self.assertEqual(size, len(list(StaticFileHandler._gzip_cache.values())[0]))
+        StaticFileHandler.reset()
+        self.assertEqual(StaticFileHandler._gzip_cache_size, 0)
+
+
 @wsgi_safe
 class StaticFileWithPathTest(WebTestCase):
     def get_app_kwargs(self):
@@ -1362,6 +1506,84 @@ class HostMatchingTest(WebTestCase):
         self.assertEqual(response.body, b"[2]")
 
 
+class URLRouterTest(unittest.TestCase):
+    def test_literal_prefix(self):
+        def prefix(pattern, flags=0):
+            return _literal_prefix(re.compile(pattern, flags))
+        self.assertEqual(prefix("/foo/bar$"), "/foo/bar")
+        self.assertEqual(prefix("^/foo/([0-9]+)$"), "/foo/")
+        self.assertEqual(prefix(r"/foo\.json"), "/foo.json")
+        self.assertEqual(prefix(r"/foo\d+"), "/foo")
+        self.assertEqual(prefix("/foos?/"), "/foo")
+        self.assertEqual(prefix("/fo{2}"), "/f")
+        self.assertEqual(prefix("/foo.*"), "/foo")
+        self.assertEqual(prefix("/foo|/bar"), "")
+        self.assertEqual(prefix("(?i)/foo"), "")
+        self.assertEqual(prefix("/foo", re.IGNORECASE), "")
+
+    def test_first_match_wins(self):
+        specs = [url("/(.*)/special$", RequestHandler, name="a"),
+                 url("/foo/bar$", RequestHandler, name="b"),
+                 url("/foo/(.*)$", RequestHandler, name="c"),
+                 url("/foo/bar/baz$", RequestHandler, name="d"),
+                 url("/fo+/other$", RequestHandler, name="e")]
+        router = _URLRouter(specs)
+
+        def find(path):
+            spec, match = router.find(path)
+            return spec and spec.name
+        self.assertEqual(find("/foo/bar"), "b")
+        self.assertEqual(find("/foo/x/special"), "a")
+        self.assertEqual(find("/foo/bar/baz"), "c")
+        self.assertEqual(find("/foooo/other"), "e")
+        self.assertEqual(find("/bar"), None)
+        self.assertEqual(find(""), None)
+
+
+@wsgi_safe
+class RouterTest(WebTestCase):
+    def get_handlers(self):
+        class EchoHandler(RequestHandler):
+            def initialize(self, name):
+                self.name = name
+
+            def get(self, *args, **kwargs):
+                self.write({"name": self.name, "args": args,
+                            "kwargs": kwargs})
+
+        return [url("/api/v1/users/(?P<id>[0-9]+)", EchoHandler,
+                    dict(name="user")),
+                url("/api/v1/(.*)/(.*)", EchoHandler, dict(name="generic")),
+                url("/api/v1/users/me", EchoHandler, dict(name="me")),
+                url("/api/v1", EchoHandler, dict(name="root")),
+                url(r"/[a-z]+\.txt", EchoHandler, dict(name="txt"))]
+
+    def fetch_json(self, path):
+        return json_decode(self.fetch(path).body)
+
+    def test_routing(self):
+        self.assertEqual(self.fetch_json("/api/v1/users/42"),
+                         {"name": "user", "args": [], "kwargs": {"id": "42"}})
+        # Declared after a pattern that also matches.
+        self.assertEqual(self.fetch_json("/api/v1/users/me")["name"],
+                         "generic")
+        self.assertEqual(self.fetch_json("/api/v1/a%20b/c"),
+                         {"name": "generic", "args": ["a b", "c"],
+                          "kwargs": {}})
+        self.assertEqual(self.fetch_json("/api/v1")["name"], "root")
+        self.assertEqual(self.fetch_json("/robots.txt")["name"], "txt")
+        self.assertEqual(self.fetch("/api/v2").code, 404)
+
+    def test_handlers_added_later(self):
+        self.app.handlers[-1][1].insert(0, url("/api/v1", RequestHandler))
+        self.assertEqual(self.fetch("/api/v1").code, 405)
+
+    def test_add_handlers_after_request(self):
+        self.assertEqual(self.fetch("/other").code, 404)
+        self.app.add_handlers(".*$", [("/other", RequestHandler)])
+        self.assertEqual(self.fetch("/other").code, 405)
+
+
 @wsgi_safe
 class NamedURLSpecGroupsTest(WebTestCase):
     def get_handlers(self):
@@ -1544,6 +1766,91 @@ class GzipTestCase(SimpleHandlerTestCase):
                          'Accept-Language, Accept-Encoding')
 
 
+class WriteWatermarksTest(WebTestCase):
+    class Handler(RequestHandler):
+        def get_write_watermarks(self):
+            return dict(high=16 * 1024)
+
+        @gen.coroutine
+        def get(self):
+            self.test.stream = self.request.connection.stream
+            for i in range(64):
+                self.write(utf8('%04d' % i) * 1024)
+                yield self.flush()
+                self.test.high_watermarks.add(
+                    self.test.stream._write_high_watermark)
+
+        def flush(self, include_footers=False, callback=None):
+            self.test.flushes.append(include_footers)
+            return super(WriteWatermarksTest.Handler, self).flush(
+                include_footers, callback)
+
+        def initialize(self, test):
+            self.test = test
+
+    def get_handlers(self):
+        self.high_watermarks = set()
+        self.flushes = []
+        return [('/', self.Handler, dict(test=self))]
+
+    def test_write_watermarks(self):
+        response = self.fetch('/')
+        self.assertEqual(response.body, b''.join(utf8('%04d' % i) * 1024
+                                                 for i in range(64)))
+        self.assertEqual(self.high_watermarks, set([16 * 1024]))
+        # The watermarks are removed when the request is finished.
+        self.assertIs(self.stream._write_high_watermark, None)
+        # finish() goes through the (overridden) public flush method.
+        self.assertEqual(self.flushes, [False] * 64 + [True])
+
+
+class WriteWatermarksDropTest(WebTestCase):
+    class Handler(RequestHandler):
+        def get_write_watermarks(self):
+            return dict(high=16 * 1024, overflow="drop")
+
+        def get(self):
+            self.write("hello")
+            self.flush()
+
+    def get_handlers(self):
+        return [('/', self.Handler)]
+
+    def test_drop_rejected(self):
+        # Dropping part of an HTTP response would corrupt its framing.
+        with ExpectLog(app_log, "Uncaught exception"):
+            response = self.fetch('/')
+        self.assertEqual(response.code, 500)
+
+
+class GzipFlushModeTest(WebTestCase):
+    class Handler(RequestHandler):
+        @gen.coroutine
+        def get(self):
+            for i in range(3):
+                self.write('chunk %d ' % i + ('!' * 100))
+                yield self.flush()
+
+    class NoFlushGZipContentEncoding(GZipContentEncoding):
+        FLUSH_MODE = zlib.Z_NO_FLUSH
+
+    def get_handlers(self):
+        return [('/', self.Handler)]
+
+    def get_app_kwargs(self):
+        return dict(transforms=[self.NoFlushGZipContentEncoding])
+
+    def test_no_flush(self):
+        chunks = []
+        response = self.fetch('/', decompress_response=False,
+                              headers={'Accept-Encoding': 'gzip'},
+                              streaming_callback=chunks.append)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        body = zlib.decompress(b''.join(chunks), 16 + zlib.MAX_WBITS)
+        self.assertEqual(body, b''.join(
+            utf8('chunk %d ' % i + ('!' * 100)) for i in range(3)))
+
+
 @wsgi_safe
 class PathArgsInPrepareTest(WebTestCase):
     class Handler(RequestHandler):
@@ -2667,6 +2974,121 @@ class DecoratorTest(WebTestCase):
         self.assertEqual(response.headers['Location'], "/addslash/?foo=bar")
 
 
+class CacheResponseTest(WebTestCase):
+    def get_handlers(self):
+        test = self
+        self.calls = 0
+        self.active = self.max_active = 0
+
+        class CountHandler(RequestHandler):
+            @cache_response(ttl=60, vary=["Accept-Language"])
+            def get(self):
+                test.calls += 1
+                self.write("%s %s %s" % (
+                    test.calls, self.get_argument("x", ""),
+                    self.request.headers.get("Accept-Language")))
+
+        class SlowHandler(RequestHandler):
+            @cache_response(ttl=60)
+            @gen.coroutine
+            def get(self):
+                test.calls += 1
+                yield gen.sleep(0.01)
+                self.write(str(test.calls))
+
+        class NotCachedHandler(RequestHandler):
+            @cache_response(ttl=60)
+            def get(self, kind):
+                test.calls += 1
+                if kind == "cookie":
+                    self.set_cookie("foo", "bar")
+                elif kind == "error":
+                    raise HTTPError(503)
+                elif kind == "large":
+                    self.write(b"x" * 2048)
+                self.write(str(test.calls))
+
+        class SlowCookieHandler(RequestHandler):
+            @cache_response(ttl=60)
+            @gen.coroutine
+            def get(self):
+                test.calls += 1
+                test.active += 1
+                test.max_active = max(test.max_active, test.active)
+                self.set_cookie("foo", "bar")
+                yield gen.sleep(0.01)
+                test.active -= 1
+                self.write(str(test.calls))
+
+        class ExpiredHandler(RequestHandler):
+            @cache_response(ttl=0)
+            def get(self):
+                test.calls += 1
+                self.write(str(test.calls))
+
+        return [("/count", CountHandler),
+                ("/slow", SlowHandler),
+                ("/not_cached/(.*)", NotCachedHandler),
+                ("/slow_cookie", SlowCookieHandler),
+                ("/expired", ExpiredHandler)]
+
+    def get_app_kwargs(self):
+        return dict(response_cache_size=1024)
+
+    def test_cache_hit(self):
+        response = self.fetch("/count")
+        self.assertEqual(response.body, b"1  None")
+        response = self.fetch("/count")
+        self.assertEqual(response.body, b"1  None")
+        self.assertIn("Etag", response.headers)
+        self.assertEqual(self.calls, 1)
+
+    def test_cache_key(self):
+        self.assertEqual(self.fetch("/count?x=a").body, b"1 a None")
+        self.assertEqual(self.fetch("/count?x=b").body, b"2 b None")
+        self.assertEqual(
+            self.fetch("/count?x=a",
+                       headers={"Accept-Language": "fr"}).body,
+            b"3 a fr")
+        self.assertEqual(self.fetch("/count?x=a").body, b"1 a None")
+        self.assertEqual(
+            self.fetch("/count?x=a",
+                       headers={"Accept-Language": "fr"}).body,
+            b"3 a fr")
+        self.assertEqual(self.calls, 3)
+
+    def test_etag(self):
+        etag = self.fetch("/count").headers["Etag"]
+        response = self.fetch("/count", headers={"If-None-Match": etag})
+        self.assertEqual(response.code, 304)
+        self.assertEqual(self.calls, 1)
+
+    @gen_test
+    def test_coalesce(self):
+        url = self.get_url("/slow")
+        responses = yield [self.http_client.fetch(url) for i in range(3)]
+        self.assertEqual([r.body for r in responses], [b"1"] * 3)
+        self.assertEqual(self.calls, 1)
+
+    @gen_test
+    def test_coalesce_not_cached(self):
+        # Requests waiting for a response that cannot be cached run
+        # the handler concurrently, not one after another.
+        url = self.get_url("/slow_cookie")
+        yield [self.http_client.fetch(url) for i in range(5)]
+        self.assertEqual(self.calls, 5)
+        # The first request runs alone, then the other four together.
+        self.assertEqual(self.max_active, 4)
+
+    def test_not_cached(self):
+        for kind in ["cookie", "error", "large"]:
+            self.fetch("/not_cached/" + kind)
+            self.fetch("/not_cached/" + kind)
+        self.fetch("/expired")
+        self.fetch("/expired")
+        self.assertEqual(self.calls, 8)
+
+
 @wsgi_safe
 class CacheTest(WebTestCase):
     def get_handlers(self):
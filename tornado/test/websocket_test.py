@@ -1,8 +1,10 @@
 from __future__ import absolute_import, division, print_function, with_statement
 
+import socket
 import traceback
 
 from tornado.concurrent import Future
+from tornado.escape import utf8
 from tornado import gen
 from tornado.httpclient import HTTPError, HTTPRequest
 from tornado.log import gen_log, app_log
@@ -13,7 +15,7 @@ from tornado.util import u
 
 try:
     import tornado.websocket  # noqa
-    from tornado.util import _websocket_mask_python
+    from tornado.util import _websocket_mask_python, _websocket_mask_into_python
 except ImportError:
     # The unittest module presents misleading errors on ImportError
     # (it acts as if websocket_test could not be found, hiding the underlying
@@ -88,6 +90,24 @@ class AsyncPrepareHandler(TestWebSocketHandler):
         self.write_message(message)
 
 
+class DropMessagesHandler(TestWebSocketHandler):
+    def get_write_watermarks(self):
+        return dict(high=64 * 1024, overflow="drop")
+
+    def open(self):
+        self.stream.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                                      4096)
+        self.flood()
+
+    @gen.coroutine
+    def flood(self):
+        for i in range(200):
+            future = self.write_message(utf8("%04d" % i) * 4096, binary=True)
+        yield future
+        self.ping(b"still here")
+        self.write_message("end")
+
+
 class WebSocketBaseTestCase(AsyncHTTPTestCase):
     @gen.coroutine
     def ws_connect(self, path, compression_options=None):
@@ -120,6 +140,8 @@ class WebSocketTest(WebSocketBaseTestCase):
              dict(close_future=self.close_future)),
             ('/async_prepare', AsyncPrepareHandler,
              dict(close_future=self.close_future)),
+            ('/drop_messages', DropMessagesHandler,
+             dict(close_future=self.close_future)),
         ])
 
     def test_http_request(self):
@@ -156,6 +178,56 @@ class WebSocketTest(WebSocketBaseTestCase):
         self.assertEqual(response, b'hello \xe9')
         yield self.close(ws)
 
+    @gen_test
+    def test_large_binary_message(self):
+        # Bigger than the stream's read_chunk_size in both directions,
+        # so the payload is received with read_into.
+        data = bytes(bytearray(range(256))) * 1024
+        ws = yield self.ws_connect('/echo')
+        ws.write_message(data, binary=True)
+        response = yield ws.read_message()
+        self.assertEqual(response, data)
+        yield self.close(ws)
+
+    @gen_test
+    def test_medium_binary_message(self):
+        # Uses a 16-bit length but still fits in one read.
+        data = b'x' * 1000
+        ws = yield self.ws_connect('/echo')
+        ws.write_message(data, binary=True)
+        response = yield ws.read_message()
+        self.assertEqual(response, data)
+        yield self.close(ws)
+
+    @gen_test
+    def test_several_frames_in_one_write(self):
+        ws = yield self.ws_connect('/echo')
+        protocol = ws.protocol
+        frames = [protocol._build_frame(True, 0x1, utf8('message %d' % i))
+                  for i in range(5)]
+        # The last message is fragmented, with a ping in the middle.
+        frames.append(protocol._build_frame(False, 0x1, b'frag'))
+        frames.append(protocol._build_frame(True, 0x9, b'ping'))
+        frames.append(protocol._build_frame(True, 0x0, b'ment'))
+        ws.stream.write(b''.join(frames))
+        for i in range(5):
+            response = yield ws.read_message()
+            self.assertEqual(response, 'message %d' % i)
+        response = yield ws.read_message()
+        self.assertEqual(response, 'fragment')
+        yield self.close(ws)
+
+    @gen_test
+    def test_frame_split_across_writes(self):
+        ws = yield self.ws_connect('/echo')
+        frame = ws.protocol._build_frame(True, 0x1, b'x' * 300)
+        for i in range(0, len(frame), 3):
+            ws.stream.write(frame[i:i + 3])
+            yield gen.moment
+        response = yield ws.read_message()
+        self.assertEqual(response, 'x' * 300)
+        yield self.close(ws)
+
     @gen_test
     def test_unicode_message(self):
         ws = yield self.ws_connect('/echo')
@@ -247,6 +319,23 @@ class WebSocketTest(WebSocketBaseTestCase):
         res = yield ws.read_message()
         self.assertEqual(res, 'hello')
 
+    @gen_test
+    def test_write_watermarks_drop_messages(self):
+        ws = yield self.ws_connect('/drop_messages')
+        messages = []
+        while True:
+            message = yield ws.read_message()
+            if message == 'end':
+                break
+            messages.append(message)
+        # Some messages were dropped, but only whole ones.
+        self.assertTrue(0 < len(messages) < 200, len(messages))
+        for message in messages:
+            self.assertEqual(len(message), 4 * 4096)
+            self.assertEqual(message, message[:4] * 4096)
+        self.assertEqual(messages[0], b'0000' * 4096)
+        yield self.close(ws)
+
     @gen_test
     def test_check_origin_valid_no_path(self):
         port = self.get_http_port()
@@ -390,6 +479,109 @@ class DefaultCompressionTest(CompressionTestMixin, WebSocketBaseTestCase):
         self.assertEqual(bytes_out, bytes_in + 12)
 
 
+class BroadcastHandler(WebSocketHandler):
+    def initialize(self, handlers):
+        self.handlers = handlers
+        self.close_future = Future()
+
+    def get_compression_options(self):
+        return {}
+
+    def open(self):
+        self.handlers.append(self)
+
+    def on_close(self):
+        self.close_future.set_result(None)
+
+
+class DropBroadcastHandler(BroadcastHandler):
+    def get_write_watermarks(self):
+        return dict(high=64 * 1024, overflow="drop")
+
+    def open(self):
+        self.stream.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                                      4096)
+        super(DropBroadcastHandler, self).open()
+
+
+class BroadcastTest(WebSocketBaseTestCase):
+    def get_app(self):
+        self.handlers = []
+        return Application([
+            ('/broadcast', BroadcastHandler, dict(handlers=self.handlers)),
+            ('/drop_broadcast', DropBroadcastHandler,
+             dict(handlers=self.handlers)),
+        ])
+
+    @gen_test
+    def test_broadcast_drop_messages(self):
+        ws = yield self.ws_connect('/drop_broadcast')
+        handler = self.handlers[0]
+        # The client can't read while the messages are broadcast, so
+        # the server's write buffer fills up and later messages are
+        # dropped instead of buffered.
+        for i in range(200):
+            WebSocketHandler.broadcast(self.handlers,
+                                       utf8("%04d" % i) * 4096, binary=True)
+            self.assertLess(handler.stream._write_buffer_size,
+                            64 * 1024 + 5 * 4096)
+        yield handler.stream.wait_for_drain()
+        WebSocketHandler.broadcast(self.handlers, "end")
+        messages = []
+        while True:
+            message = yield ws.read_message()
+            if message == 'end':
+                break
+            messages.append(message)
+        self.assertTrue(0 < len(messages) < 200, len(messages))
+        for message in messages:
+            self.assertEqual(message, message[:4] * 4096)
+        self.assertEqual(messages[0], b'0000' * 4096)
+        ws.close()
+        yield handler.close_future
+
+    @gen_test
+    def test_broadcast(self):
+        plain = []
+        for i in range(3):
+            ws = yield self.ws_connect('/broadcast')
+            plain.append(ws)
+        compressed = yield self.ws_connect('/broadcast',
+                                           compression_options={})
+        self.assertEqual(len(self.handlers), 4)
+        # The server closes the last uncompressed connection; it is
+        # skipped from now on.
+        self.handlers[2].close()
+        yield plain[2].read_message()
+        yield self.handlers[2].close_future
+
+        WebSocketHandler.broadcast(self.handlers, u('hello \u00e9'))
+        for ws in plain[:2] + [compressed]:
+            response = yield ws.read_message()
+            self.assertEqual(response, u('hello \u00e9'))
+        WebSocketHandler.broadcast(self.handlers, b'\xff\x00', binary=True)
+        WebSocketHandler.broadcast(self.handlers, {'a': 1})
+        for ws in plain[:2] + [compressed]:
+            response = yield ws.read_message()
+            self.assertEqual(response, b'\xff\x00')
+            response = yield ws.read_message()
+            self.assertEqual(response, '{"a": 1}')
+
+        # Uncompressed connections share a single frame.
+        frames = {}
+        for handler in self.handlers[:2]:
+            handler.ws_connection.write_shared_message(b'x', False, frames)
+        self.assertEqual(list(frames.keys()), [None])
+        for ws in plain[:2]:
+            response = yield ws.read_message()
+            self.assertEqual(response, 'x')
+
+        for ws in plain[:2] + [compressed]:
+            ws.close()
+        for handler in self.handlers:
+            yield handler.close_future
+
+
 class MaskFunctionMixin(object):
     # Subclasses should define self.mask(mask, data)
     def test_mask(self):
@@ -407,13 +599,34 @@ class MaskFunctionMixin(object):
                                    b'\x00\x01\x02\x03\x04\x05'),
                          b'\xff\xfa\xff\xff\xfb\xfe')
 
+    def test_mask_long(self):
+        # Long enough to go through the word-at-a-time code, with an
+        # odd-sized tail and leading zero bytes.
+        data = b'\x00\x00' + bytes(bytearray(range(256))) * 3 + b'xyz'
+        mask = b'\x0f\xf0\x55\xaa'
+        expected = bytes(bytearray(
+            b ^ m for b, m in zip(bytearray(data), bytearray(mask) * len(data))))
+        self.assertEqual(self.mask(mask, data), expected)
+        buf = bytearray(data)
+        self.mask_into(mask, buf)
+        self.assertEqual(bytes(buf), expected)
+        # Masking again restores the original data.
+        self.mask_into(mask, memoryview(buf)[:])
+        self.assertEqual(bytes(buf), data)
+
 
 class PythonMaskFunctionTest(MaskFunctionMixin, unittest.TestCase):
     def mask(self, mask, data):
         return _websocket_mask_python(mask, data)
 
+    def mask_into(self, mask, buf):
+        return _websocket_mask_into_python(mask, buf)
+
 
 @unittest.skipIf(speedups is None, "tornado.speedups module not present")
 class CythonMaskFunctionTest(MaskFunctionMixin, unittest.TestCase):
     def mask(self, mask, data):
         return speedups.websocket_mask(mask, data)
+
+    def mask_into(self, mask, buf):
+        return speedups.websocket_mask_into(mask, buf)
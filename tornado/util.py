@@ -12,7 +12,7 @@ and `.Resolver`.
 
 from __future__ import absolute_import, division, print_function, with_statement
 
-import array
+import binascii
 import os
 import sys
 import zlib
@@ -356,30 +356,50 @@ def _websocket_mask_python(mask, data):
 
     This pure-python implementation may be replaced by an optimized version when available.
     """
-    mask = array.array("B", mask)
-    unmasked = array.array("B", data)
-    for i in xrange(len(data)):
-        unmasked[i] = unmasked[i] ^ mask[i % 4]
-    if hasattr(unmasked, 'tobytes'):
-        # tostring was deprecated in py32.  It hasn't been removed,
-        # but since we turn on deprecation warnings in our tests
-        # we need to use the right one.
-        return unmasked.tobytes()
+    # XOR the whole payload at once as one big integer with the mask
+    # repeated to the same length.
+    length = len(data)
+    if not length:
+        return b""
+    mask = (bytes(mask) * (length // 4 + 1))[:length]
+    if hasattr(int, "from_bytes"):
+        return (int.from_bytes(data, "big") ^
+                int.from_bytes(mask, "big")).to_bytes(length, "big")
     else:
-        return unmasked.tostring()
+        # py2: go through hex strings instead.
+        result = (int(binascii.hexlify(data), 16) ^
+                  int(binascii.hexlify(mask), 16))
+        return binascii.unhexlify("%0*x" % (length * 2, result))
+
+
+def _websocket_mask_into_python(mask, buf):
+    """Applies the websocket mask to the writable buffer ``buf`` in place.
+
+    This pure-python implementation may be replaced by an optimized version when available.
+    """
+    if isinstance(buf, memoryview):
+        # On Python 2, bytes(memoryview) returns its repr.
+        data = buf.tobytes()
+    else:
+        data = bytes(buf)
+    buf[:] = _websocket_mask_python(mask, data)
+
 
 if (os.environ.get('TORNADO_NO_EXTENSION') or
         os.environ.get('TORNADO_EXTENSION') == '0'):
     # These environment variables exist to make it easier to do performance
     # comparisons; they are not guaranteed to remain supported in the future.
     _websocket_mask = _websocket_mask_python
+    _websocket_mask_into = _websocket_mask_into_python
 else:
     try:
         from tornado.speedups import websocket_mask as _websocket_mask
+        from tornado.speedups import websocket_mask_into as _websocket_mask_into
     except ImportError:
         if os.environ.get('TORNADO_EXTENSION') == '1':
             raise
         _websocket_mask = _websocket_mask_python
+        _websocket_mask_into = _websocket_mask_into_python
 
 
 def doctests():
@@ -58,10 +58,10 @@ from __future__ import absolute_import, division, print_function, with_statement
 
 import base64
 import binascii
+import collections
 import datetime
 import email.utils
 import functools
-import gzip
 import hashlib
 import hmac
 import mimetypes
@@ -75,7 +75,7 @@ import time
 import tornado
 import traceback
 import types
-from io import BytesIO
+import zlib
 
 from tornado.concurrent import Future
 from tornado import escape
@@ -163,6 +163,9 @@ class RequestHandler(object):
         self._auto_finish = True
         self._transforms = None  # will be set in _execute
         self._prepared_future = None
+        # Set by the cache_response decorator.
+        self._response_cache_fill = None
+        self._response_capture = None
         self.path_args = None
         self.path_kwargs = None
         self.ui = ObjectDict((n, self._ui_method(m)) for n, m in
@@ -264,13 +267,18 @@ class RequestHandler(object):
             if not self.request.body.done():
                 self.request.body.set_exception(iostream.StreamClosedError())
                 self.request.body.exception()
+        if self._response_cache_fill is not None:
+            # Let requests waiting for this response run the handler
+            # themselves.
+            self._response_capture = None
+            self._fill_response_cache()
 
     def clear(self):
         """重置这个响应的所有头部和内容."""
         self._headers = httputil.HTTPHeaders({
             "Server": "TornadoServer/%s" % tornado.version,
             "Content-Type": "text/html; charset=UTF-8",
-            "Date": httputil.format_timestamp(time.time()),
+            "Date": httputil._format_current_timestamp(),
         })
         self.set_default_headers()
         self._write_buffer = []
@@ -829,11 +837,69 @@ class RequestHandler(object):
         一个flush在前一个flush的callback运行之前发生, 那么前一个callback
         将会被丢弃.
 
+        如果 `get_write_watermarks` 返回了水位线, callback(或返回的
+        `.Future`)会在连接的写缓冲区低于水位线时运行(见
+        `.BaseIOStream.wait_for_drain`), 而不是等到所有数据都被写出.
+
         .. versionchanged:: 4.0
            现在如果没有给定callback, 会返回一个 `.Future` 对象.
+
+        .. versionchanged:: 4.4
+           支持 `get_write_watermarks`.
+        """
+        stream = self._get_watermark_stream()
+        if stream is not None and not include_footers:
+            future = self._flush(include_footers)
+            if stream.closed():
+                return future
+            return stream.wait_for_drain(callback)
+        # The final flush from finish() has nothing left to pace (the
+        # watermarks are removed once the request is finished).
+        return self._flush(include_footers, callback)
+
+    def get_write_watermarks(self):
+        """复写这个方法来为这个请求的连接设置写缓冲区水位线.
+
+        返回 ``None`` (默认) 或者一个字典, 包含
+        `.BaseIOStream.set_write_watermarks` 的关键字参数 (``high``,
+        ``low``, ``overflow``). 设置后, `flush` (以及
+        `.WebSocketHandler.write_message`) 返回的 `.Future` 只在连接的
+        写缓冲区超过高水位线时才需要等待, 这样在慢客户端上写入大量数据
+        (e.g. 长轮询或websocket连接)时不会无限制地占用内存.
+
+        ``overflow="drop"`` 只被 `.WebSocketHandler` 支持 (丢弃整个消息);
+        普通的 HTTP 响应丢弃数据会破坏 ``Content-Length`` 或分块编码,
+        所以会抛出 `ValueError`.
+
+        .. versionadded:: 4.4
         """
+        return None
+
+    def _get_watermark_stream(self):
+        # Returns the connection's stream if get_write_watermarks was
+        # used to configure it.
+        if not hasattr(self, "_watermark_stream"):
+            self._watermark_stream = None
+            watermarks = self.get_write_watermarks()
+            stream = getattr(self.request.connection, "stream", None)
+            if watermarks is not None and watermarks.get("overflow") == "drop":
+                raise ValueError("overflow='drop' is only supported "
+                                 "by WebSocketHandler")
+            if watermarks is not None and stream is not None:
+                stream.set_write_watermarks(**watermarks)
+                self._watermark_stream = stream
+        return self._watermark_stream
+
+    def _flush(self, include_footers=False, callback=None):
         chunk = b"".join(self._write_buffer)
         self._write_buffer = []
+        if self._response_capture is not None:
+            if not self._headers_written:
+                # Keep the headers as they are before the transforms
+                # and cookies are applied.
+                self._response_capture.append(
+                    (self._status_code, self._reason, self._headers.copy()))
+            self._response_capture.append(chunk)
         if not self._headers_written:
             self._headers_written = True
             for transform in self._transforms:
@@ -901,6 +967,11 @@ class RequestHandler(object):
             self.request.connection.set_close_callback(None)
 
         self.flush(include_footers=True)
+        if self._response_cache_fill is not None:
+            self._fill_response_cache()
+        if getattr(self, "_watermark_stream", None) is not None:
+            # The connection may be kept alive for other requests.
+            self._watermark_stream.set_write_watermarks(None)
         self.request.finish()
         self._log()
         self._finished = True
@@ -909,6 +980,28 @@ class RequestHandler(object):
         # _ui_module closures to allow for faster GC on CPython.
         self.ui = None
 
+    def _fill_response_cache(self):
+        cache, key, ttl = self._response_cache_fill
+        capture = self._response_capture
+        self._response_cache_fill = self._response_capture = None
+        entry = None
+        if capture:
+            status_code, reason, headers = capture[0]
+            if status_code == 200 and not hasattr(self, "_new_cookie"):
+                entry = (time.time() + ttl, status_code, reason, headers,
+                         b"".join(capture[1:]))
+        cache.finish_fill(key, entry)
+
+    def _write_cached_response(self, entry):
+        expires, self._status_code, self._reason, headers, body = entry
+        self._headers = headers.copy()
+        self._headers["Date"] = httputil._format_current_timestamp()
+        self._write_buffer = [body]
+        if self.check_etag_header():
+            self._write_buffer = []
+            self.set_status(304)
+        self.finish()
+
     def send_error(self, status_code=500, **kwargs):
         """给浏览器发送给定的HTTP 错误码.
 
@@ -1432,6 +1525,8 @@ class RequestHandler(object):
             if not self._finished:
                 self.finish(*e.args)
             return
+        # Never cache a response that was interrupted by an error.
+        self._response_capture = None
         try:
             self.log_exception(*sys.exc_info())
         except Exception:
@@ -1647,6 +1742,77 @@ def addslash(method):
     return wrapper
 
 
+def cache_response(ttl, vary=None):
+    """缓存被装饰的 ``get`` 方法产生的响应 ``ttl`` 秒.
+
+    缓存在进程内存中(每个 `Application` 一个), 以请求的方法, 主机,
+    路径和查询字符串为键, 还有 ``vary`` 中列出的请求头的值(e.g.
+    ``vary=["Accept-Language"]``). 缓存命中时处理程序方法不会被调用;
+    保存的状态码, 头部和body会被直接写出, 但仍然经过
+    `OutputTransform` (e.g. gzip)和 ``If-None-Match`` 检查.
+
+    同一个键的并发请求会被合并: 只有第一个请求运行处理程序方法,
+    其他请求等待它完成后使用它的响应. 只有状态码为200并且没有设置
+    cookie的响应才会被缓存; 如果响应没有被缓存, 等待的请求会同时
+    各自运行处理程序方法.
+
+    缓存按最近最少使用(LRU)的顺序淘汰条目, 总大小由
+    ``response_cache_size`` 应用设置限制(单位字节, 默认16MB).
+
+    例如::
+
+        class FrontPageHandler(RequestHandler):
+            @cache_response(ttl=5, vary=["Accept-Language"])
+            @gen.coroutine
+            def get(self):
+                ...
+
+    这个装饰器只应该用于响应只依赖于上面这些键的处理程序(例如,
+    不依赖 ``current_user``).
+
+    .. versionadded:: 4.4
+    """
+    vary = tuple(vary or ())
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.request.method not in ("GET", "HEAD"):
+                return method(self, *args, **kwargs)
+            request = self.request
+            cache = self.application._response_cache
+            key = (request.method, request.host, request.path,
+                   request.query, vary,
+                   tuple(request.headers.get(name) for name in vary))
+            entry = cache.get(key)
+            if entry is not None:
+                self._write_cached_response(entry)
+                return None
+            pending = cache.get_pending(key)
+            if pending is None:
+                cache.start_fill(key)
+                self._response_cache_fill = (cache, key, ttl)
+                self._response_capture = []
+                return method(self, *args, **kwargs)
+
+            @gen.coroutine
+            def wait_for_fill():
+                yield pending
+                entry = cache.get(key)
+                if entry is not None:
+                    self._write_cached_response(entry)
+                    return
+                # The response could not be cached (or the handler
+                # filling the cache failed), so every waiter runs the
+                # handler itself, concurrently.
+                result = method(self, *args, **kwargs)
+                if result is not None:
+                    yield result
+            return wait_for_fill()
+        return wrapper
+    return decorator
+
+
 class Application(httputil.HTTPServerConnectionDelegate):
     """组成一个web应用程序的请求处理程序的集合.
 
@@ -1701,8 +1867,11 @@ class Application(httputil.HTTPServerConnectionDelegate):
             self.transforms = transforms
         self.handlers = []
         self.named_handlers = {}
+        self._routers = {}  # id(handlers) -> (handlers, _URLRouter)
         self.default_host = default_host
         self.settings = settings
+        self._response_cache = _ResponseCache(
+            settings.get("response_cache_size", 16 * 1024 * 1024))
         self.ui_modules = {'linkify': _linkify,
                            'xsrf_form_html': _xsrf_form_html,
                            'Template': TemplateModule,
@@ -1767,6 +1936,9 @@ class Application(httputil.HTTPServerConnectionDelegate):
 
         Host 模式将按照它们的添加顺序进行处理.
         所有匹配模式将被考虑.
+
+        每组处理程序的路由表在这里被构建一次, 所以已经添加的处理程序
+        列表不应该被直接修改.
         """
         if not host_pattern.endswith("$"):
             host_pattern += "$"
@@ -1792,6 +1964,7 @@ class Application(httputil.HTTPServerConnectionDelegate):
                         "Multiple handlers named %s; replacing previous value",
                         spec.name)
                 self.named_handlers[spec.name] = spec
+        self._routers[id(handlers)] = (handlers, _URLRouter(handlers))
 
     def add_transform(self, transform_class):
         self.transforms.append(transform_class)
@@ -1801,14 +1974,25 @@ class Application(httputil.HTTPServerConnectionDelegate):
         matches = []
         for pattern, handlers in self.handlers:
             if pattern.match(host):
-                matches.extend(handlers)
+                matches.append(self._get_router(handlers))
         # Look for default host if not behind load balancer (for debugging)
         if not matches and "X-Real-Ip" not in request.headers:
             for pattern, handlers in self.handlers:
                 if pattern.match(self.default_host):
-                    matches.extend(handlers)
+                    matches.append(self._get_router(handlers))
         return matches or None
 
+    def _get_router(self, handlers):
+        # Routers are built by add_handlers and found by the identity of
+        # the list (which each entry keeps alive, so its id is never
+        # reused).  Lists that gained or lost specs without going
+        # through add_handlers get a new router.
+        entry = self._routers.get(id(handlers))
+        if entry is None or entry[1].spec_count != len(handlers):
+            entry = self._routers[id(handlers)] = (handlers,
+                                                   _URLRouter(handlers))
+        return entry[1]
+
     def _load_ui_methods(self, methods):
         if isinstance(methods, types.ModuleType):
             self._load_ui_methods(dict((n, getattr(methods, n))
@@ -1917,8 +2101,8 @@ class _RequestDispatcher(httputil.HTTPMessageDelegate):
                                        % (self.request.protocol,
                                           app.default_host))
             return
-        for spec in handlers:
-            match = spec.regex.match(self.request.path)
+        for router in handlers:
+            spec, match = router.find(self.request.path)
             if match:
                 self.handler_class = spec.handler_class
                 self.handler_kwargs = spec.kwargs
@@ -2158,13 +2342,48 @@ class StaticFileHandler(RequestHandler):
     复写 `get_content`, `get_content_size`, `get_modified_time`,
     `get_absolute_path`, 和 `validate_absolute_path`.
 
+    在非SSL连接上, 如果 `os.sendfile` 可用, 文件内容(包括请求的字节范围)
+    将通过 ``os.sendfile`` 直接由内核发送, 而不是被读入Python中.
+    对于SSL连接, 被gzip压缩的响应, 或复写了 `get_content` 的子类,
+    将使用普通的分块读取方式. 设置 ``static_sendfile=False`` 可以
+    关闭这个功能.
+
+    如果客户端接受gzip编码, 下面两个设置可以避免在每次请求时重新
+    压缩相同的文件. 设置 ``static_gzip_precompressed=True`` 后, 如果
+    被请求文件旁边存在一个预先压缩好的 ``.gz`` 文件(e.g.
+    ``app.js.gz``), 将直接提供它的内容(这个文件需要和原文件保持同步).
+    设置 ``static_gzip_cache=True`` 后, 可压缩类型的文件将被压缩一次,
+    并按照文件的内容版本hash缓存在内存中(见 ``GZIP_CACHE_SIZE``,
+    ``GZIP_CACHE_MAX_FILE_SIZE`` 和 ``GZIP_CACHE_LEVEL``).
+    两种情况下请求的字节范围都是针对压缩后的内容的.
+
     .. versionchanged:: 3.1
        一些为子类设计的方法在Tornado 3.1 被添加.
+
+    .. versionchanged:: 4.4
+       如果可能的话使用 ``os.sendfile`` 发送文件内容.
+
+    .. versionadded:: 4.4
+       ``static_gzip_precompressed`` 和 ``static_gzip_cache`` 设置.
     """
     CACHE_MAX_AGE = 86400 * 365 * 10  # 10 years
 
+    # Limits for the static_gzip_cache setting: total bytes of
+    # compressed content kept in memory, and the largest (uncompressed)
+    # file that will be cached.  Files are compressed only once, so
+    # they use the highest compression level.
+    GZIP_CACHE_SIZE = 32 * 1024 * 1024
+    GZIP_CACHE_MAX_FILE_SIZE = 1024 * 1024
+    GZIP_CACHE_LEVEL = 9
+
     _static_hashes = {}
-    _lock = threading.Lock()  # protects _static_hashes
+    _gzip_cache = collections.OrderedDict()
+    _gzip_cache_size = 0
+    _lock = threading.Lock()  # protects _static_hashes and _gzip_cache
+
+    # Set by _select_encoding when a gzipped representation is served.
+    _precompressed = False
+    _gzip_content = None
 
     def initialize(self, path, default_filename=None):
         self.root = path
@@ -2174,6 +2393,8 @@ class StaticFileHandler(RequestHandler):
     def reset(cls):
         with cls._lock:
             cls._static_hashes = {}
+            StaticFileHandler._gzip_cache.clear()
+            StaticFileHandler._gzip_cache_size = 0
 
     def head(self, path):
         return self.get(path, include_body=False)
@@ -2188,9 +2409,12 @@ class StaticFileHandler(RequestHandler):
             self.root, absolute_path)
         if self.absolute_path is None:
             return
+        self._select_encoding()
 
         self.modified = self.get_modified_time()
         self.set_headers()
+        if self._precompressed or self._gzip_content is not None:
+            self.set_header("Content-Encoding", "gzip")
 
         if self.should_return_304():
             self.set_status(304)
@@ -2203,7 +2427,10 @@ class StaticFileHandler(RequestHandler):
             # the request will be treated as if the header didn't exist.
             request_range = httputil._parse_request_range(range_header)
 
-        size = self.get_content_size()
+        if self._gzip_content is not None:
+            size = len(self._gzip_content)
+        else:
+            size = self.get_content_size()
         if request_range:
             start, end = request_range
             if (start is not None and start >= size) or end == 0:
@@ -2242,7 +2469,16 @@ class StaticFileHandler(RequestHandler):
         self.set_header("Content-Length", content_length)
 
         if include_body:
-            content = self.get_content(self.absolute_path, start, end)
+            if self._gzip_content is not None:
+                content = self._gzip_content[start:end]
+            else:
+                try:
+                    sent = yield self._sendfile(start, content_length)
+                except iostream.StreamClosedError:
+                    return
+                if sent:
+                    return
+                content = self.get_content(self.absolute_path, start, end)
             if isinstance(content, bytes):
                 content = [content]
             for chunk in content:
@@ -2254,6 +2490,94 @@ class StaticFileHandler(RequestHandler):
         else:
             assert self.request.method == "HEAD"
 
+    @gen.coroutine
+    def _sendfile(self, start, content_length):
+        # Sends the body with os.sendfile when nothing needs to see the
+        # bytes on their way out; returns False if the caller should
+        # fall back to get_content.
+        connection = self.request.connection
+        stream = getattr(connection, "stream", None)
+        if not (content_length and
+                self.settings.get("static_sendfile", True) and
+                hasattr(os, "sendfile") and
+                hasattr(connection, "write_file") and
+                isinstance(stream, iostream.IOStream) and
+                not isinstance(stream, iostream.SSLIOStream) and
+                type(self).get_content.__func__ is
+                StaticFileHandler.get_content.__func__):
+            raise gen.Return(False)
+        # Flush the headers first: that is when the transforms decide
+        # whether they will change the body.
+        yield self.flush()
+        for transform in self._transforms:
+            if not (isinstance(transform, GZipContentEncoding) and
+                    not transform._gzipping):
+                raise gen.Return(False)
+        with open(self.absolute_path, "rb") as file:
+            yield connection.write_file(file.fileno(), start or 0,
+                                        content_length)
+        raise gen.Return(True)
+
+    def _select_encoding(self):
+        # Switches to a gzipped representation of the file (a .gz
+        # sibling or a cached compressed copy) if the application
+        # allows it and the client accepts gzip.
+        precompressed = self.settings.get("static_gzip_precompressed")
+        cache = self.settings.get("static_gzip_cache")
+        if not (precompressed or cache):
+            return
+        self.add_header("Vary", "Accept-Encoding")
+        if "gzip" not in self.request.headers.get("Accept-Encoding", ""):
+            return
+        if precompressed:
+            gzip_path = self.absolute_path + ".gz"
+            if os.path.isfile(gzip_path):
+                self.absolute_path = gzip_path
+                self._precompressed = True
+                if hasattr(self, "_stat_result"):
+                    del self._stat_result
+                return
+        if cache:
+            if not GZipContentEncoding._compressible_type(
+                    self.get_content_type()):
+                return
+            size = self.get_content_size()
+            if not (GZipContentEncoding.MIN_LENGTH <= size <=
+                    self.GZIP_CACHE_MAX_FILE_SIZE):
+                return
+            version_hash = self._get_cached_version(self.absolute_path)
+            if version_hash:
+                self._gzip_content = self._get_gzip_content(
+                    self.absolute_path, version_hash)
+
+    @classmethod
+    def _get_gzip_content(cls, abspath, version_hash):
+        key = (abspath, version_hash)
+        with cls._lock:
+            content = cls._gzip_cache.pop(key, None)
+            if content is not None:
+                # Move to the most recently used end.
+                cls._gzip_cache[key] = content
+                return content
+        # Compress without holding the lock; if another thread does the
+        # same file at the same time only one copy is kept.
+        compressor = _gzip_compressobj(cls.GZIP_CACHE_LEVEL)
+        data = cls.get_content(abspath)
+        if isinstance(data, bytes):
+            data = [data]
+        chunks = [compressor.compress(chunk) for chunk in data]
+        chunks.append(compressor.flush())
+        content = b"".join(chunks)
+        with cls._lock:
+            cache = StaticFileHandler._gzip_cache
+            if key not in cache:
+                cache[key] = content
+                StaticFileHandler._gzip_cache_size += len(content)
+                while StaticFileHandler._gzip_cache_size > cls.GZIP_CACHE_SIZE:
+                    old_key, old_content = cache.popitem(last=False)
+                    StaticFileHandler._gzip_cache_size -= len(old_content)
+        return content
+
     def compute_etag(self):
         """设置 ``Etag`` 头基于static url版本.
 
@@ -2266,6 +2590,9 @@ class StaticFileHandler(RequestHandler):
         version_hash = self._get_cached_version(self.absolute_path)
         if not version_hash:
             return None
+        if self._gzip_content is not None:
+            # The compressed representation needs its own entity tag.
+            return '"%s-gzip"' % (version_hash, )
         return '"%s"' % (version_hash, )
 
     def set_headers(self):
@@ -2466,7 +2793,11 @@ class StaticFileHandler(RequestHandler):
 
         .. versionadded:: 3.1
         """
-        mime_type, encoding = mimetypes.guess_type(self.absolute_path)
+        path = self.absolute_path
+        if self._precompressed:
+            # Use the type of the file the .gz sibling was made from.
+            path = path[:-len(".gz")]
+        mime_type, encoding = mimetypes.guess_type(path)
         # per RFC 6713, use the appropriate type for a gzip compressed file
         if encoding == "gzip":
             return "application/gzip"
@@ -2611,6 +2942,12 @@ class GZipContentEncoding(OutputTransform):
     .. versionchanged:: 4.0
         现在压缩所有mime类型以 ``text/`` 开头, 而不只是一个白名单.
         (白名单仍用于某些非文本(non-text)mime类型).
+
+    .. versionchanged:: 4.4
+        直接使用 ``zlib.compressobj`` 压缩. 压缩级别和非最后一块数据
+        使用的flush模式可以通过在子类中复写 ``GZIP_LEVEL`` 和
+        ``FLUSH_MODE`` 来改变(使用 `Application` 的 ``transforms``
+        参数来安装子类).
     """
     # Whitelist of compressible mime types (in addition to any types
     # beginning with "text/").
@@ -2621,6 +2958,12 @@ class GZipContentEncoding(OutputTransform):
     # tools (including gzip itself) default to 6, which is probably a
     # better CPU/size tradeoff.
     GZIP_LEVEL = 6
+    # zlib flush mode used after every chunk but the last.  Z_SYNC_FLUSH
+    # (which is what GzipFile.flush uses) lets the client decompress
+    # each chunk as soon as it arrives; Z_NO_FLUSH compresses better
+    # when a response is written in many small chunks, but may hold
+    # data back until a later chunk or the end of the response.
+    FLUSH_MODE = zlib.Z_SYNC_FLUSH
     # Responses that are too short are unlikely to benefit from gzipping
     # after considering the "Content-Encoding: gzip" header and the header
     # inside the gzip encoding.
@@ -2631,12 +2974,14 @@ class GZipContentEncoding(OutputTransform):
     def __init__(self, request):
         self._gzipping = "gzip" in request.headers.get("Accept-Encoding", "")
 
-    def _compressible_type(self, ctype):
-        return ctype.startswith('text/') or ctype in self.CONTENT_TYPES
+    @classmethod
+    def _compressible_type(cls, ctype):
+        return ctype.startswith('text/') or ctype in cls.CONTENT_TYPES
 
     def transform_first_chunk(self, status_code, headers, chunk, finishing):
         if 'Vary' in headers:
-            headers['Vary'] += b', Accept-Encoding'
+            if b'Accept-Encoding' not in utf8(headers['Vary']):
+                headers['Vary'] += b', Accept-Encoding'
         else:
             headers['Vary'] = b'Accept-Encoding'
         if self._gzipping:
@@ -2646,9 +2991,7 @@ class GZipContentEncoding(OutputTransform):
                 ("Content-Encoding" not in headers)
         if self._gzipping:
             headers["Content-Encoding"] = "gzip"
-            self._gzip_value = BytesIO()
-            self._gzip_file = gzip.GzipFile(mode="w", fileobj=self._gzip_value,
-                                            compresslevel=self.GZIP_LEVEL)
+            self._compressor = _gzip_compressobj(self.GZIP_LEVEL)
             chunk = self.transform_chunk(chunk, finishing)
             if "Content-Length" in headers:
                 # The original content length is no longer correct.
@@ -2663,17 +3006,20 @@ class GZipContentEncoding(OutputTransform):
 
     def transform_chunk(self, chunk, finishing):
         if self._gzipping:
-            self._gzip_file.write(chunk)
+            chunk = self._compressor.compress(chunk)
             if finishing:
-                self._gzip_file.close()
+                chunk += self._compressor.flush()
             else:
-                self._gzip_file.flush()
-            chunk = self._gzip_value.getvalue()
-            self._gzip_value.truncate(0)
-            self._gzip_value.seek(0)
+                chunk += self._compressor.flush(self.FLUSH_MODE)
         return chunk
 
 
+def _gzip_compressobj(level):
+    # A wbits value of 16 + MAX_WBITS makes zlib write the gzip header
+    # and trailer itself.
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
 def authenticated(method):
     """使用这个装饰的方法要求用户必须登陆.
 
@@ -2856,6 +3202,54 @@ class _UIModuleNamespace(object):
             raise AttributeError(str(e))
 
 
+class _ResponseCache(object):
+    """The in-memory LRU cache used by `cache_response`."""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        # key -> (expires, status_code, reason, headers, body)
+        self._entries = collections.OrderedDict()
+        # key -> Future resolved when the handler filling it finishes.
+        self._pending = {}
+
+    def get(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self.size -= self._entry_size(entry)
+            return None
+        # Move to the most recently used end.
+        self._entries[key] = entry
+        return entry
+
+    def get_pending(self, key):
+        return self._pending.get(key)
+
+    def start_fill(self, key):
+        self._pending[key] = Future()
+
+    def finish_fill(self, key, entry):
+        if entry is not None and self._entry_size(entry) <= self.max_size:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self.size -= self._entry_size(old_entry)
+            self._entries[key] = entry
+            self.size += self._entry_size(entry)
+            while self.size > self.max_size:
+                old_key, old_entry = self._entries.popitem(last=False)
+                self.size -= self._entry_size(old_entry)
+        future = self._pending.pop(key, None)
+        if future is not None:
+            future.set_result(None)
+
+    @staticmethod
+    def _entry_size(entry):
+        headers, body = entry[3], entry[4]
+        return len(body) + sum(len(name) + len(value)
+                               for name, value in headers.get_all())
+
+
 class URLSpec(object):
     """指定URL和处理程序之间的映射."""
     def __init__(self, pattern, handler, kwargs=None, name=None):
@@ -2939,6 +3333,91 @@ class URLSpec(object):
 url = URLSpec
 
 
+_REGEX_SPECIAL_CHARS = frozenset(".^$*+?{}[]()|\\")
+
+
+def _literal_prefix(regex):
+    """Returns a string that every match of ``regex`` must start with.
+
+    This is the run of plain characters at the start of the pattern;
+    it may be shorter than the real prefix (or empty) for patterns
+    that are too complicated to analyze.
+    """
+    pattern = regex.pattern
+    if regex.flags & (re.IGNORECASE | re.VERBOSE) or "|" in pattern:
+        return ""
+    if pattern.startswith("^"):
+        pattern = pattern[1:]
+    prefix = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            if i + 1 == len(pattern) or pattern[i + 1].isalnum():
+                # A character class, anchor or backreference.
+                break
+            char = pattern[i + 1]
+            i += 2
+        elif char in _REGEX_SPECIAL_CHARS:
+            break
+        else:
+            i += 1
+        if i < len(pattern) and pattern[i] in "*+?{":
+            # The character is repeated or optional.
+            break
+        prefix.append(char)
+    return "".join(prefix)
+
+
+class _RouterNode(object):
+    __slots__ = ("children", "indices")
+
+    def __init__(self):
+        self.children = {}
+        self.indices = []
+
+
+class _URLRouter(object):
+    """Finds the first `URLSpec` in a list that matches a path.
+
+    The specs are stored in a character trie keyed by the literal
+    prefix of their patterns, so only the regexes of specs whose prefix
+    matches the path are tried.  Candidates are tried in their original
+    order, so the result is the same as trying every spec in turn.
+    """
+    def __init__(self, specs):
+        self._specs = list(specs)
+        self.spec_count = len(self._specs)
+        self._root = _RouterNode()
+        for index, spec in enumerate(self._specs):
+            node = self._root
+            for char in _literal_prefix(spec.regex):
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _RouterNode()
+                node = child
+            node.indices.append(index)
+
+    def find(self, path):
+        """Returns ``(spec, match)`` for the first match, or ``(None, None)``."""
+        candidates = []
+        node = self._root
+        for char in path:
+            candidates.extend(node.indices)
+            node = node.children.get(char)
+            if node is None:
+                break
+        else:
+            candidates.extend(node.indices)
+        candidates.sort()
+        for index in candidates:
+            spec = self._specs[index]
+            match = spec.regex.match(path)
+            if match:
+                return spec, match
+        return None, None
+
+
 if hasattr(hmac, 'compare_digest'):  # python 3.3
     _time_independent_equals = hmac.compare_digest
 else:
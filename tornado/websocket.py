@@ -33,7 +33,7 @@ from tornado.iostream import StreamClosedError
 from tornado.log import gen_log, app_log
 from tornado import simple_httpclient
 from tornado.tcpclient import TCPClient
-from tornado.util import _websocket_mask
+from tornado.util import _websocket_mask, _websocket_mask_into
 
 try:
     from urllib.parse import urlparse  # py2
@@ -122,6 +122,8 @@ class WebSocketHandler(tornado.web.RequestHandler):
         self.close_reason = None
         self.stream = None
         self._on_close_called = False
+        self._write_watermarks = None
+        self._drop_messages = False
 
     @tornado.web.asynchronous
     def get(self, *args, **kwargs):
@@ -170,6 +172,15 @@ class WebSocketHandler(tornado.web.RequestHandler):
 
         self.stream = self.request.connection.detach()
         self.stream.set_close_callback(self.on_connection_close)
+        self._write_watermarks = self.get_write_watermarks()
+        if self._write_watermarks is not None:
+            watermarks = dict(self._write_watermarks)
+            # The stream can't drop bytes without corrupting the frames,
+            # so whole messages are dropped in write_message instead.
+            self._drop_messages = watermarks.get("overflow") == "drop"
+            if self._drop_messages:
+                watermarks["overflow"] = None
+            self.stream.set_write_watermarks(**watermarks)
 
         self.ws_connection = self.get_websocket_protocol()
         if self.ws_connection:
@@ -195,12 +206,57 @@ class WebSocketHandler(tornado.web.RequestHandler):
 
         .. versionchanged:: 4.3
            返回能够被用于 flow control 的 `.Future`.
+
+        .. versionchanged:: 4.4
+           如果 `~.RequestHandler.get_write_watermarks` 返回了水位线, 返回
+           的 `.Future` 在写缓冲区低于水位线时就会完成
+           (见 `.BaseIOStream.wait_for_drain`).  如果水位线的 ``overflow``
+           是 ``"drop"``, 写缓冲区已经达到高水位线时整个消息将被丢弃
+           (控制帧, 例如 ping 和 close, 总是会被发送).
         """
         if self.ws_connection is None:
             raise WebSocketClosedError()
         if isinstance(message, dict):
             message = tornado.escape.json_encode(message)
-        return self.ws_connection.write_message(message, binary=binary)
+        if self._drop_message():
+            return self.stream.wait_for_drain()
+        future = self.ws_connection.write_message(message, binary=binary)
+        if self._write_watermarks is None:
+            return future
+        if self.stream.closed():
+            raise WebSocketClosedError()
+        return self.stream.wait_for_drain()
+
+    def _drop_message(self):
+        # True if the next message should be dropped because of the
+        # "drop" overflow policy (see write_message).
+        return (self._drop_messages and not self.stream.closed() and
+                self.stream._write_buffer_size >=
+                self._write_watermarks["high"])
+
+    @classmethod
+    def broadcast(cls, handlers, message, binary=False):
+        """将给出的 message 发送到 ``handlers`` 中的每一个客户端
+
+        ``message`` 和 ``binary`` 与 `write_message` 中的含义相同.
+        与对每个 handler 调用 `write_message` 不同, message 只会被编码一次,
+        并且每种压缩设置只会构造一次 frame, 然后把同一个 buffer 写入每个
+        连接. 使用 context takeover 压缩的连接(每个连接都有自己的压缩状态)
+        仍然会单独压缩. 已经关闭的连接会被跳过, 与 `write_message`
+        一样, 使用 ``overflow="drop"`` 水位线并且写缓冲区已满的连接
+        会丢弃这个消息.
+
+        .. versionadded:: 4.4
+        """
+        if isinstance(message, dict):
+            message = tornado.escape.json_encode(message)
+        message = tornado.escape.utf8(message)
+        frames = {}
+        for handler in handlers:
+            conn = handler.ws_connection
+            if conn is None or conn.server_terminated or conn.stream.closed():
+                continue
+            conn.write_shared_message(message, binary, frames)
 
     def select_subprotocol(self, subprotocols):
         """当一个新的 WebSocket 请求特定子协议(subprotocols)时调用
@@ -412,6 +468,7 @@ class _PerMessageDeflateCompressor(object):
             raise ValueError("Invalid max_wbits value %r; allowed range 8-%d",
                              max_wbits, zlib.MAX_WBITS)
         self._max_wbits = max_wbits
+        self.persistent = persistent
         if persistent:
             self._compressor = self._create_compressor()
         else:
@@ -470,9 +527,8 @@ class WebSocketProtocol13(WebSocketProtocol):
         self.mask_outgoing = mask_outgoing
         self._final_frame = False
         self._frame_opcode = None
-        self._masked_frame = None
-        self._frame_mask = None
-        self._frame_length = None
+        # Bytes of a frame that has not been received completely.
+        self._frame_buffer = b""
         self._fragmented_message_buffer = None
         self._fragmented_message_opcode = None
         self._waiting = None
@@ -623,6 +679,10 @@ class WebSocketProtocol13(WebSocketProtocol):
             **self._get_compressor_options(other_side, agreed_parameters))
 
     def _write_frame(self, fin, opcode, data, flags=0):
+        return self._write_raw_frame(
+            self._build_frame(fin, opcode, data, flags))
+
+    def _build_frame(self, fin, opcode, data, flags=0):
         if fin:
             finbit = self.FIN
         else:
@@ -643,6 +703,9 @@ class WebSocketProtocol13(WebSocketProtocol):
             mask = os.urandom(4)
             data = mask + _websocket_mask(mask, data)
         frame += data
+        return frame
+
+    def _write_raw_frame(self, frame):
         self._wire_bytes_out += len(frame)
         try:
             return self.stream.write(frame)
@@ -664,87 +727,146 @@ class WebSocketProtocol13(WebSocketProtocol):
             flags |= self.RSV1
         return self._write_frame(True, opcode, message, flags=flags)
 
+    def write_shared_message(self, message, binary, frames):
+        """Sends a utf8-encoded message that is also sent to other clients.
+
+        ``frames`` maps compression settings to the frames already built
+        for this message, and is updated when a new frame is needed.
+        The message is dropped if the handler's ``overflow="drop"``
+        write watermark has been reached, as in
+        `WebSocketHandler.write_message`.
+        """
+        if self.handler._drop_message():
+            return None
+        if self.mask_outgoing or (self._compressor and
+                                  self._compressor.persistent):
+            # Every frame is unique (a random mask, or compressed
+            # against this connection's own history).
+            return self.write_message(message, binary=binary)
+        key = self._compressor._max_wbits if self._compressor else None
+        frame = frames.get(key)
+        if frame is None:
+            opcode = 0x2 if binary else 0x1
+            if self._compressor:
+                frame = self._build_frame(
+                    True, opcode, self._compressor.compress(message),
+                    flags=self.RSV1)
+            else:
+                frame = self._build_frame(True, opcode, message)
+            frames[key] = frame
+        self._message_bytes_out += len(message)
+        return self._write_raw_frame(frame)
+
     def write_ping(self, data):
         """Send ping frame."""
         assert isinstance(data, bytes)
         self._write_frame(True, 0x9, data)
 
     def _receive_frame(self):
+        # Read whatever is available (up to read_chunk_size) and parse
+        # every complete frame in it at once, instead of issuing
+        # separate reads for each part of each frame.
         try:
-            self.stream.read_bytes(2, self._on_frame_start)
+            self.stream.read_bytes(self.stream.read_chunk_size,
+                                   self._on_frame_bytes, partial=True)
         except StreamClosedError:
             self._abort()
 
-    def _on_frame_start(self, data):
-        self._wire_bytes_in += len(data)
-        header, payloadlen = struct.unpack("BB", data)
-        self._final_frame = header & self.FIN
-        reserved_bits = header & self.RSV_MASK
-        self._frame_opcode = header & self.OPCODE_MASK
-        self._frame_opcode_is_control = self._frame_opcode & 0x8
-        if self._decompressor is not None and self._frame_opcode != 0:
-            self._frame_compressed = bool(reserved_bits & self.RSV1)
-            reserved_bits &= ~self.RSV1
-        if reserved_bits:
-            # client is using as-yet-undefined extensions; abort
-            self._abort()
-            return
-        self._masked_frame = bool(payloadlen & 0x80)
-        payloadlen = payloadlen & 0x7f
-        if self._frame_opcode_is_control and payloadlen >= 126:
-            # control frames must have payload < 126
-            self._abort()
-            return
-        try:
-            if payloadlen < 126:
-                self._frame_length = payloadlen
-                if self._masked_frame:
-                    self.stream.read_bytes(4, self._on_masking_key)
-                else:
-                    self.stream.read_bytes(self._frame_length,
-                                           self._on_frame_data)
-            elif payloadlen == 126:
-                self.stream.read_bytes(2, self._on_frame_length_16)
+    def _on_frame_bytes(self, data):
+        if self._frame_buffer:
+            data = self._frame_buffer + data
+            self._frame_buffer = b""
+        pos = 0
+        while not self.client_terminated:
+            available = len(data) - pos
+            if available < 2:
+                break
+            header, payloadlen = struct.unpack_from("BB", data, pos)
+            self._final_frame = header & self.FIN
+            reserved_bits = header & self.RSV_MASK
+            self._frame_opcode = header & self.OPCODE_MASK
+            self._frame_opcode_is_control = self._frame_opcode & 0x8
+            if self._decompressor is not None and self._frame_opcode != 0:
+                self._frame_compressed = bool(reserved_bits & self.RSV1)
+                reserved_bits &= ~self.RSV1
+            if reserved_bits:
+                # client is using as-yet-undefined extensions; abort
+                self._abort()
+                return
+            masked = bool(payloadlen & 0x80)
+            payloadlen = payloadlen & 0x7f
+            if self._frame_opcode_is_control and payloadlen >= 126:
+                # control frames must have payload < 126
+                self._abort()
+                return
+            header_length = 2
+            if payloadlen == 126:
+                header_length += 2
             elif payloadlen == 127:
-                self.stream.read_bytes(8, self._on_frame_length_64)
-        except StreamClosedError:
-            self._abort()
-
-    def _on_frame_length_16(self, data):
-        self._wire_bytes_in += len(data)
-        self._frame_length = struct.unpack("!H", data)[0]
-        try:
-            if self._masked_frame:
-                self.stream.read_bytes(4, self._on_masking_key)
-            else:
-                self.stream.read_bytes(self._frame_length, self._on_frame_data)
-        except StreamClosedError:
-            self._abort()
-
-    def _on_frame_length_64(self, data):
-        self._wire_bytes_in += len(data)
-        self._frame_length = struct.unpack("!Q", data)[0]
-        try:
-            if self._masked_frame:
-                self.stream.read_bytes(4, self._on_masking_key)
-            else:
-                self.stream.read_bytes(self._frame_length, self._on_frame_data)
-        except StreamClosedError:
-            self._abort()
+                header_length += 8
+            if masked:
+                header_length += 4
+            if available < header_length:
+                break
+            if payloadlen == 126:
+                payloadlen = struct.unpack_from("!H", data, pos + 2)[0]
+            elif payloadlen == 127:
+                payloadlen = struct.unpack_from("!Q", data, pos + 2)[0]
+            mask = None
+            if masked:
+                mask = data[pos + header_length - 4:pos + header_length]
+            if available - header_length < payloadlen:
+                if header_length + payloadlen <= self.stream.read_chunk_size:
+                    # A small frame; wait for the rest of it.
+                    break
+                # A large frame; read the rest of its payload separately.
+                self._wire_bytes_in += header_length
+                self._read_frame_payload(payloadlen, mask,
+                                         data[pos + header_length:])
+                return
+            self._wire_bytes_in += header_length
+            pos += header_length
+            payload = data[pos:pos + payloadlen]
+            pos += payloadlen
+            if mask is not None:
+                payload = _websocket_mask(mask, payload)
+            self._on_frame_data(payload)
+        if self.client_terminated:
+            return
+        self._frame_buffer = data[pos:]
+        self._receive_frame()
 
-    def _on_masking_key(self, data):
-        self._wire_bytes_in += len(data)
-        self._frame_mask = data
+    def _read_frame_payload(self, length, mask, prefix):
+        # ``prefix`` is the start of the payload, which was read along
+        # with the frame header.
+        def on_payload(data, masked=mask is not None):
+            if masked:
+                data = _websocket_mask(mask, data)
+            self._on_frame_data(data)
+            if not self.client_terminated:
+                self._receive_frame()
+
+        def on_buffer(n):
+            if mask is not None:
+                _websocket_mask_into(mask, buf)
+            on_payload(bytes(buf), masked=False)
+        remaining = length - len(prefix)
         try:
-            self.stream.read_bytes(self._frame_length,
-                                   self._on_masked_frame_data)
+            if (remaining <= self.stream.read_chunk_size or
+                    remaining > self.stream.max_buffer_size):
+                # Oversized frames go through read_bytes too, so they hit
+                # the usual max_buffer_size error instead of being
+                # allocated.
+                self.stream.read_bytes(
+                    remaining, lambda data: on_payload(prefix + data))
+                return
+            # Receive large payloads straight into one preallocated buffer.
+            buf = bytearray(length)
+            buf[:len(prefix)] = prefix
+            self.stream.read_into(memoryview(buf)[len(prefix):], on_buffer)
         except StreamClosedError:
             self._abort()
 
-    def _on_masked_frame_data(self, data):
-        # Don't touch _wire_bytes_in; we'll do it in _on_frame_data.
-        self._on_frame_data(_websocket_mask(self._frame_mask, data))
-
     def _on_frame_data(self, data):
         self._wire_bytes_in += len(data)
         if self._frame_opcode_is_control:
@@ -780,9 +902,6 @@ class WebSocketProtocol13(WebSocketProtocol):
         if self._final_frame:
             self._handle_message(opcode, data)
 
-        if not self.client_terminated:
-            self._receive_frame()
-
     def _handle_message(self, opcode, data):
         if self.client_terminated:
             return